@@ -1,19 +1,46 @@
-import os
+import hashlib
 from functools import lru_cache
-from typing import Annotated, Optional, Any
+from typing import Annotated, Optional, Any, BinaryIO
 from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import RedirectResponse
 
 import config
-from helpers.classes import AnyChart, CoverageStatistics, Manifest
-from helpers.coverage import get_vatsim_statistics, get_stp_statistics, get_poscon_statistics
-from helpers.database import pool, __initialize_database, get_charts_by_icao_code, get_icao_codes, \
-    insert_or_update_chart, delete_charts_with_icao_code
-from fastapi import FastAPI, Path, HTTPException, Header, Depends
+from helpers.cache import chart_cache, CacheEntry, COMPRESSORS
+from helpers.classes import AnyChart, CoverageStatistics, Manifest, Providers, Airport, AirportsCharts, CoverageGaps, \
+    CoverageRanking, \
+    ManifestChanges, SearchResults, DatabaseHealth, ExportFormat, ExportCompression
+from helpers.coverage import open_client, close_client
+from helpers.database import pool, __initialize_database, get_icao_codes, apply_charts, apply_chart_batches, \
+    get_airports, get_airport_charts, get_airport_version, get_dataset_version, get_airports_charts, \
+    fetch_charts_by_procedure, search_charts, chart_loads, ping_database, fetch_chart_file
+from fastapi import FastAPI, Path, HTTPException, Header, Depends, Response, Query, Request
 from helpers.docs import CHARTS_INFORMATION, ICAO_CODE_CONSTRAINTS, CATEGORIZED_CHARTS_INFORMATION, CODES_INFORMATION, \
-    COVERAGE_INFORMATION
+    COVERAGE_INFORMATION, AIRPORTS_CHARTS_INFORMATION, ICAO_CODES_CONSTRAINTS, \
+    STREAMED_UPDATE_INFORMATION, RUNWAY_CHARTS_INFORMATION, RUNWAY_CONSTRAINTS, PROCEDURE_CHARTS_INFORMATION, \
+    PROCEDURE_CONSTRAINTS, SEARCH_INFORMATION, COALESCING_INFORMATION, \
+    METRICS_INFORMATION, DATABASE_HEALTH_INFORMATION, CHART_FILE_INFORMATION, EXPORT_INFORMATION, \
+    COVERAGE_GAPS_INFORMATION, COVERAGE_TOP_INFORMATION, HISTORY_WINDOW_CONSTRAINTS
+import orjson
+import psycopg
 import sentry_sdk
+from prometheus_client import REGISTRY, CONTENT_TYPE_LATEST, generate_latest
+from psycopg_pool import PoolTimeout
 
+from helpers.exceptions import NoChartFile, RangeNotSatisfiable
+from helpers.export import exports
 from helpers.factories import chart_factory
+from helpers.files import chart_files, chart_file_store, chart_file_url
+from helpers.serialization import serialize_charts
+from helpers.http import etag, is_not_modified, not_modified, parse_range, negotiate_encoding, FileRangeResponse
+from helpers.invalidation import invalidation_bus
+from helpers.metrics import MetricsMiddleware, PoolCollector, ChartCacheCollector, SingleFlightCollector, \
+    ChartFileStoreCollector, CoverageSchedulerCollector
+from helpers.history import coverage_history
+from helpers.lookup import charts_for_runway
+from helpers.manifest import read_chart_batches, manifest_encoding
+from helpers.poller import coverage_poller, CoverageSnapshot
+from helpers.scheduler import coverage_scheduler
+from helpers.search import encode_cursor, decode_cursor
 
 api = FastAPI(
     redoc_url='/',
@@ -28,11 +55,7 @@ api.add_middleware(
     allow_headers=["Token"],
 )
 
-sentry_sdk.init(
-    dsn=os.getenv('SENTRY_URI'),
-    traces_sample_rate=1.0,
-    profiles_sample_rate=0.1,
-)
+api.add_middleware(MetricsMiddleware)
 
 
 @lru_cache()
@@ -40,72 +63,353 @@ def get_settings():
     return config.Settings()
 
 
+# @NOTE(Mauro): Sentry is set up on import, before the required settings are validated, so it reads its own settings
+#               which all have defaults
+sentry_settings = config.SentrySettings()
+sentry_sdk.init(
+    dsn=sentry_settings.sentry_uri,
+    traces_sample_rate=sentry_settings.sentry_traces_sample_rate,
+    profiles_sample_rate=sentry_settings.sentry_profiles_sample_rate,
+)
+
+REGISTRY.register(PoolCollector(pool))
+REGISTRY.register(ChartCacheCollector(chart_cache))
+REGISTRY.register(ChartFileStoreCollector(chart_file_store))
+REGISTRY.register(CoverageSchedulerCollector(coverage_scheduler))
+SINGLE_FLIGHT_GROUPS = [chart_loads, chart_files.flights, exports.flights, coverage_poller.flights,
+                        coverage_scheduler.flights, coverage_history.flights]
+
+REGISTRY.register(SingleFlightCollector(SINGLE_FLIGHT_GROUPS))
+
+
+def __representation_tag(version: str, coding: Optional[str]) -> str:
+    """Returns the entity tag of a body in a content coding, every coding of a body needs its own strong tag"""
+    return etag(f'{version}-{coding}' if coding else version)
+
+
+async def __airport_charts(code: str, settings: config.Settings, if_none_match: Optional[str],
+                           compressed: bool = True) -> CacheEntry | Response:
+    """Returns the charts of an airport, or a 304 response when the client's copy is still current
+
+    The content version is checked before the charts are loaded so revalidations never load or serialize them. Pass
+    compressed=False for responses that are never compressed, only their uncompressed tag is then current.
+    """
+    if if_none_match:
+        version = await get_airport_version(code)
+        if version:
+            # @NOTE(Mauro): Which codings the body is stored in isn't known without loading it, so the client's copy
+            #               is current if it matches the version in any of them
+            for coding in [None, *COMPRESSORS] if compressed else [None]:
+                if is_not_modified(if_none_match, __representation_tag(version, coding)):
+                    response = not_modified(__representation_tag(version, coding), settings.charts_cache_control)
+                    if compressed:
+                        response.headers['Vary'] = 'Accept-Encoding'
+                    return response
+
+    return await get_airport_charts(code)
+
+
+def __charts_response(body: bytes, entry: CacheEntry, settings: config.Settings,
+                      compressed_bodies: Optional[dict[str, bytes]] = None,
+                      accept_encoding: Optional[str] = None) -> Response:
+    """Returns a pre-serialized chart body as is, skipping FastAPI's validation and encoding
+
+    If the body is stored compressed in a content coding the client accepts the compressed bytes are sent instead.
+    """
+    headers = {'Cache-Control': settings.charts_cache_control}
+    coding = None
+    if compressed_bodies is not None:
+        headers['Vary'] = 'Accept-Encoding'
+        coding = negotiate_encoding(accept_encoding, compressed_bodies)
+        if coding:
+            body = compressed_bodies[coding]
+            headers['Content-Encoding'] = coding
+    if entry.version:
+        headers['ETag'] = __representation_tag(entry.version, coding)
+    return Response(body, media_type='application/json', headers=headers)
+
+
+def __file_response(file: BinaryIO, size: int, media_type: str, tag: str, byte_range: Optional[str],
+                    if_range: Optional[str], headers: dict[str, str]) -> Response:
+    """Returns a response sending an open file, or the byte range of it the client asked for"""
+    try:
+        # @NOTE(Mauro): If-Range only applies the range if the client's partial copy is still current, otherwise the
+        #               whole file is sent. Only entity tags are compared, a date never matches
+        requested = parse_range(byte_range, size) if not if_range or if_range.strip() == tag else None
+    except RangeNotSatisfiable:
+        file.close()
+        raise
+    return FileRangeResponse(file, size, media_type, requested, headers={'ETag': tag, **headers})
+
+
+@api.get("/charts", **AIRPORTS_CHARTS_INFORMATION)
+async def charts_by_codes(
+        codes: Annotated[str, Query(title="Comma separated ICAO codes of the airports", **ICAO_CODES_CONSTRAINTS)],
+        settings: Annotated[config.Settings, Depends(get_settings)], categorized: bool = False,
+        if_none_match: Annotated[str | None, Header()] = None) -> AirportsCharts:
+    icao_codes = list(dict.fromkeys(codes.upper().split(',')))
+    found, missing = await get_airports_charts(icao_codes)
+
+    tag = etag(hashlib.md5(' '.join(f'{code}:{entry.version}' for code, entry in found.items()).encode()).hexdigest())
+    if is_not_modified(if_none_match, tag):
+        return not_modified(tag, settings.charts_cache_control)
+
+    # @NOTE(Mauro): Every airport body is already serialized so the response is stitched together instead of
+    #               serializing the charts again
+    body = [b'{"charts":{']
+    for index, (code, entry) in enumerate(found.items()):
+        body += [b',' if index else b'', orjson.dumps(code), b':',
+                 entry.categorized_body if categorized else entry.body]
+    body.append(b'},"missing":' + orjson.dumps(missing) + b'}')
+
+    return Response(b''.join(body), media_type='application/json',
+                    headers={'ETag': tag, 'Cache-Control': settings.charts_cache_control})
+
+
 @api.get("/charts/{code}", **CHARTS_INFORMATION)
-async def charts_by_code(code: Annotated[str, Path(title="The ICAO code of the airport", **ICAO_CODE_CONSTRAINTS)]) \
-        -> list[AnyChart]:
+async def charts_by_code(code: Annotated[str, Path(title="The ICAO code of the airport", **ICAO_CODE_CONSTRAINTS)],
+                         settings: Annotated[config.Settings, Depends(get_settings)],
+                         if_none_match: Annotated[str | None, Header()] = None,
+                         accept_encoding: Annotated[str | None, Header()] = None) -> list[AnyChart]:
     code = code.upper()
-    return await get_charts_by_icao_code(code)
+    entry = await __airport_charts(code, settings, if_none_match)
+    if isinstance(entry, Response):
+        return entry
+    return __charts_response(entry.body, entry, settings, entry.compressed_bodies, accept_encoding)
 
 
 @api.get("/charts/{code}/categorized", **CATEGORIZED_CHARTS_INFORMATION)
 async def categorized_charts_per_code(
-        code: Annotated[str, Path(title="The ICAO code of the airport", **ICAO_CODE_CONSTRAINTS)]) \
-        -> dict[str, list[AnyChart]]:
+        code: Annotated[str, Path(title="The ICAO code of the airport", **ICAO_CODE_CONSTRAINTS)],
+        settings: Annotated[config.Settings, Depends(get_settings)],
+        if_none_match: Annotated[str | None, Header()] = None,
+        accept_encoding: Annotated[str | None, Header()] = None) -> dict[str, list[AnyChart]]:
     code = code.upper()
-    charts = await get_charts_by_icao_code(code)
+    entry = await __airport_charts(code, settings, if_none_match)
+    if isinstance(entry, Response):
+        return entry
+    return __charts_response(entry.categorized_body, entry, settings, entry.compressed_categorized_bodies,
+                             accept_encoding)
+
+
+@api.get("/charts/{code}/runway/{runway}", **RUNWAY_CHARTS_INFORMATION)
+async def runway_charts_per_code(
+        code: Annotated[str, Path(title="The ICAO code of the airport", **ICAO_CODE_CONSTRAINTS)],
+        runway: Annotated[str, Path(title="The runway designator", **RUNWAY_CONSTRAINTS)],
+        settings: Annotated[config.Settings, Depends(get_settings)], type: Optional[str] = None,
+        if_none_match: Annotated[str | None, Header()] = None) -> list[AnyChart]:
+    code = code.upper()
+    entry = await __airport_charts(code, settings, if_none_match, compressed=False)
+    if isinstance(entry, Response):
+        return entry
+    return __charts_response(serialize_charts(charts_for_runway(entry.charts, runway, type)), entry, settings)
+
 
-    # @NOTE(Mauro): There are more "pythonic" and code golfy style ways of doing this but this is O(n) whereas most of
-    #               those are O(n^2) or require iterating twice
+@api.get("/charts/{code}/{filename}/file", **CHART_FILE_INFORMATION)
+async def chart_file(code: Annotated[str, Path(title="The ICAO code of the airport", **ICAO_CODE_CONSTRAINTS)],
+                     filename: Annotated[str, Path(title="Filename of the chart")],
+                     settings: Annotated[config.Settings, Depends(get_settings)],
+                     if_none_match: Annotated[str | None, Header()] = None,
+                     byte_range: Annotated[str | None, Header(alias='Range')] = None,
+                     if_range: Annotated[str | None, Header()] = None) -> Response:
+    chart = await fetch_chart_file(code.upper(), filename)
+    if chart is None:
+        raise NoChartFile(code.upper(), filename)
+    if not chart.source.cached:
+        return RedirectResponse(chart_file_url(chart), status_code=307)
 
-    d: dict[str, list[AnyChart]] = {}
+    if chart.digest and is_not_modified(if_none_match, etag(chart.digest)):
+        return not_modified(etag(chart.digest), settings.charts_cache_control)
 
-    for chart in charts:
-        if chart.type in d.keys():
-            d[chart.type] += [chart]
-        else:
-            d[chart.type] = [chart]
+    stored, file = await chart_files.open(chart)
+    return __file_response(file, stored.size, chart.filetype, etag(stored.digest), byte_range, if_range,
+                           {'Cache-Control': settings.charts_cache_control})
 
-    return d
+
+@api.get("/procedures/{name}", **PROCEDURE_CHARTS_INFORMATION)
+async def procedure_charts(name: Annotated[str, Path(title="The name of the SID or STAR", **PROCEDURE_CONSTRAINTS)],
+                           settings: Annotated[config.Settings, Depends(get_settings)],
+                           if_none_match: Annotated[str | None, Header()] = None) -> list[AnyChart]:
+    tag = etag(str(await get_dataset_version()))
+    if is_not_modified(if_none_match, tag):
+        return not_modified(tag, settings.charts_cache_control)
+
+    return Response(serialize_charts(await fetch_charts_by_procedure(name.upper())), media_type='application/json',
+                    headers={'ETag': tag, 'Cache-Control': settings.charts_cache_control})
+
+
+@api.get("/search", **SEARCH_INFORMATION)
+async def search(q: Annotated[str, Query(title="Text to search for", min_length=2, max_length=64)],
+                 settings: Annotated[config.Settings, Depends(get_settings)],
+                 limit: Annotated[int, Query(ge=1, le=100)] = 20, cursor: Optional[str] = None) -> SearchResults:
+    results = await search_charts(q, limit, decode_cursor(cursor), settings.search_timeout_ms)
+    next_cursor = encode_cursor(results[-1][1], results[-1][0].filename) if len(results) == limit else None
+    return SearchResults(charts=[chart for chart, _ in results], next=next_cursor)
 
 
 @api.post("/update")
 async def update_charts(manifest: dict[str, list[dict[str, Any]]], settings: Annotated[config.Settings, Depends(get_settings)],
-                        token: Annotated[str | None, Header()] = None) -> Optional[dict[str, set[str]]]:
+                        token: Annotated[str | None, Header()] = None) -> Optional[ManifestChanges]:
     if token:
         if token == settings.update_token:
             manifest_charts = [chart_factory(item) for item in manifest.get('charts')]
-            icao_codes = set([chart.icao_code for chart in manifest_charts])
-            system_icao_codes = await get_icao_codes()
-            for code in system_icao_codes.intersection(icao_codes):
-                await delete_charts_with_icao_code(code)
-            for chart in manifest_charts:
-                await insert_or_update_chart(chart)
-            return {'codes': icao_codes}
+            changes = await apply_charts(manifest_charts)
+            chart_cache.invalidate(changes.airports)
+            if settings.chart_files_prefetch:
+                chart_files.prefetch(changes.inserted.filenames + changes.updated.filenames)
+            return changes
+    raise HTTPException(401)
+
+
+@api.post("/update/stream", **STREAMED_UPDATE_INFORMATION)
+async def update_charts_stream(request: Request, settings: Annotated[config.Settings, Depends(get_settings)],
+                               token: Annotated[str | None, Header()] = None,
+                               content_encoding: Annotated[str | None, Header()] = None) -> ManifestChanges:
+    if token and token == settings.update_token:
+        # @NOTE(Mauro): The whole upload runs in one transaction on one pooled connection, so the encoding is checked
+        #               before one is taken and a client that stalls mid-upload is cut off after the read timeout
+        encoding = manifest_encoding(content_encoding)
+        batches = read_chart_batches(request.stream(), settings.manifest_batch_size, encoding,
+                                     settings.manifest_read_timeout)
+        changes = await apply_chart_batches(batches)
+        chart_cache.invalidate(changes.airports)
+        if settings.chart_files_prefetch:
+            chart_files.prefetch(changes.inserted.filenames + changes.updated.filenames)
+        return changes
     raise HTTPException(401)
 
 
+@api.get('/export', **EXPORT_INFORMATION)
+async def export(settings: Annotated[config.Settings, Depends(get_settings)],
+                 format: ExportFormat = ExportFormat.ndjson, compression: ExportCompression = ExportCompression.gzip,
+                 if_none_match: Annotated[str | None, Header()] = None,
+                 byte_range: Annotated[str | None, Header(alias='Range')] = None,
+                 if_range: Annotated[str | None, Header()] = None) -> Response:
+    # @NOTE(Mauro): Mirrors that are up to date are answered from the dataset version alone, the export isn't touched
+    version = await get_dataset_version()
+    if is_not_modified(if_none_match, etag(f'{version}-{format}-{compression}')):
+        return not_modified(etag(f'{version}-{format}-{compression}'), settings.charts_cache_control)
+
+    generated, file = await exports.open_export(version, format, compression)
+    return __file_response(file, generated.size, generated.media_type,
+                           etag(f'{generated.version}-{format}-{compression}'), byte_range, if_range,
+                           {'Cache-Control': settings.charts_cache_control,
+                            'Content-Disposition': f'attachment; filename="{generated.filename}"'})
+
+
 @api.get('/codes', **CODES_INFORMATION)
-async def codes() -> set[str]:
+async def codes(response: Response, settings: Annotated[config.Settings, Depends(get_settings)],
+                details: bool = False,
+                if_none_match: Annotated[str | None, Header()] = None) -> set[str] | list[Airport]:
+    # @NOTE(Mauro): The version is read before the codes, if an update lands in between the client gets newer codes
+    #               with an older tag and simply downloads them again on the next request
+    version = await get_dataset_version()
+    tag = etag(f'{version}-details' if details else str(version))
+    if is_not_modified(if_none_match, tag):
+        return not_modified(tag, settings.charts_cache_control)
+
+    response.headers['ETag'] = tag
+    response.headers['Cache-Control'] = settings.charts_cache_control
+    if details:
+        return await get_airports()
     return await get_icao_codes()
 
 
+def __provider(provider: str) -> Providers:
+    try:
+        return Providers(provider.lower())
+    except ValueError:
+        raise HTTPException(404, f'Unknown coverage provider {provider}')
+
+
+async def __coverage_snapshot(provider: str, response: Response) -> tuple[Providers, CoverageSnapshot]:
+    """Returns the latest snapshot of a provider, setting the response's caching headers from its age"""
+    provider = __provider(provider)
+    snapshot = await coverage_poller.get(provider)
+
+    response.headers['Age'] = str(int(snapshot.age))
+    response.headers['Cache-Control'] = f'max-age={max(0, int(coverage_poller.interval - snapshot.age))}'
+    return provider, snapshot
+
+
 @api.get('/coverage/{provider}', **COVERAGE_INFORMATION)
-async def coverage(provider: str) -> CoverageStatistics:
-    match provider.lower():
-        case "poscon":
-            return get_poscon_statistics()
-        case "vatsim":
-            return get_vatsim_statistics()
-        case "stp":
-            return get_stp_statistics()
+async def coverage(provider: str, response: Response) -> CoverageStatistics:
+    _, snapshot = await __coverage_snapshot(provider, response)
+    return snapshot.statistics
+
+
+@api.get('/coverage/{provider}/gaps', **COVERAGE_GAPS_INFORMATION)
+async def coverage_gaps(provider: str, response: Response) -> CoverageGaps:
+    provider, snapshot = await __coverage_snapshot(provider, response)
+    return await coverage_scheduler.gaps(provider, snapshot)
+
+
+@api.get('/coverage/{provider}/top', **COVERAGE_TOP_INFORMATION)
+async def coverage_top(provider: str, response: Response,
+                       window: Annotated[str, Query(title="Hours or days to count back",
+                                                    **HISTORY_WINDOW_CONSTRAINTS)] = '7d',
+                       limit: Annotated[int, Query(ge=1, le=500)] = 50) -> CoverageRanking:
+    response.headers['Cache-Control'] = f'max-age={int(coverage_history.interval)}'
+    return await coverage_history.top(__provider(provider), window, limit)
+
+
+@api.get('/coalescing', **COALESCING_INFORMATION)
+async def coalescing() -> dict[str, dict[str, int]]:
+    return {flights.name: {'originating': flights.originating, 'coalesced': flights.coalesced,
+                           'in_flight': len(flights)} for flights in SINGLE_FLIGHT_GROUPS}
+
+
+@api.get('/health/db', **DATABASE_HEALTH_INFORMATION)
+async def database_health(response: Response,
+                          settings: Annotated[config.Settings, Depends(get_settings)]) -> DatabaseHealth:
+    try:
+        latency_ms = await ping_database(settings.database_health_timeout) * 1000
+    except (psycopg.Error, PoolTimeout):
+        response.status_code = 503
+        return DatabaseHealth(status='down', pool=pool.get_stats())
+
+    status = 'ok' if latency_ms <= settings.database_health_max_latency_ms else 'degraded'
+    if status != 'ok':
+        response.status_code = 503
+    return DatabaseHealth(status=status, latency_ms=latency_ms, pool=pool.get_stats())
+
+
+@api.get('/metrics', **METRICS_INFORMATION)
+async def metrics() -> Response:
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
 
 
 @api.on_event("startup")
 async def open_pool():
-    await pool.open()
+    # @NOTE(Mauro): Waiting for the pool to fill up means the first requests don't pay for opening connections, and
+    #               a worker that can't reach the database fails on startup instead of on its first request
+    await pool.open(wait=True, timeout=get_settings().database_pool_open_timeout)
     await __initialize_database()
+    chart_cache.resize(get_settings().chart_cache_max_bytes)
+    chart_cache.compression_min_bytes = get_settings().charts_compression_min_bytes
+    await chart_file_store.open(get_settings().chart_files_directory, get_settings().chart_files_max_bytes)
+    chart_files.max_file_bytes = get_settings().chart_file_max_bytes
+    chart_files.timeout = get_settings().chart_file_fetch_timeout
+    chart_files.concurrency = get_settings().chart_files_prefetch_concurrency
+    exports.open(get_settings().exports_directory, get_settings().export_batch_size)
+    await open_client()
+    coverage_poller.interval = get_settings().coverage_poll_interval
+    coverage_scheduler.budget = get_settings().coverage_prewarm_budget
+    coverage_history.interval = get_settings().coverage_history_interval
+    coverage_history.hourly_retention_hours = get_settings().coverage_history_hourly_retention_hours
+    coverage_history.daily_retention_days = get_settings().coverage_history_daily_retention_days
+    await coverage_poller.start()
+    invalidation_bus.interval = get_settings().invalidation_poll_interval
+    await invalidation_bus.start()
 
 
 @api.on_event("shutdown")
 async def close_pool():
+    await coverage_poller.stop()
+    await coverage_scheduler.stop()
+    await coverage_history.stop()
+    await invalidation_bus.stop()
+    await chart_files.stop()
+    await exports.stop()
     await pool.close()
+    await close_client()
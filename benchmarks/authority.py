@@ -0,0 +1,89 @@
+"""Stub chart authority serving deterministic chart files over HTTP
+
+Point the URL of a chart's source at it to exercise the chart file store without hitting a real authority. Every path
+gets its own file, always with the same contents, and the requests each path got are counted so deduplicated fetches
+can be checked.
+
+Usage: python -m benchmarks.authority [--port PORT] [--size BYTES] [--latency SECONDS]
+"""
+import argparse
+import hashlib
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+
+class AuthorityStub:
+    """
+    Serves a chart file for every path from a background thread, paths in missing answer with a 404
+
+    Attributes:
+        size (int): Size of every file in bytes
+        latency (float): Seconds to wait before answering each request
+        requests (Counter[str]): Requests each path got
+        missing (set[str]): Paths answered with a 404
+    """
+
+    def __init__(self, port: int = 0, size: int = 256 * 1024, latency: float = 0.0):
+        self.size = size
+        self.latency = latency
+        self.requests: Counter[str] = Counter()
+        self.missing: set[str] = set()
+        self.__server = ThreadingHTTPServer(('127.0.0.1', port), self.__handler())
+        self.__thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self.__server.server_address[1]}'
+
+    def body(self, path: str) -> bytes:
+        """Returns the file served for a path"""
+        block = hashlib.sha256(path.encode()).digest() * 64
+        return (b'%PDF-1.4\n' + block * (self.size // len(block) + 1))[:self.size]
+
+    def __enter__(self) -> 'AuthorityStub':
+        self.__thread = threading.Thread(target=self.__server.serve_forever, daemon=True)
+        self.__thread.start()
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.__server.shutdown()
+        self.__server.server_close()
+
+    def __handler(self) -> type[BaseHTTPRequestHandler]:
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                stub.requests[self.path] += 1
+                time.sleep(stub.latency)
+                if self.path in stub.missing:
+                    self.send_error(404)
+                    return
+                body = stub.body(self.path)
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/pdf')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *_) -> None:
+                pass
+
+        return Handler
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--size', type=int, default=256 * 1024)
+    parser.add_argument('--latency', type=float, default=0.0)
+    arguments = parser.parse_args()
+    with AuthorityStub(arguments.port, arguments.size, arguments.latency) as authority:
+        print(f'Serving chart files on {authority.url}')
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,40 @@
+"""Synthetic charts for the benchmarks"""
+import random
+from typing import Any
+
+from helpers.classes import AnyChart
+from helpers.factories import chart_factory
+
+TYPES = ['approach', 'departure', 'arrival', 'ground', 'general']
+SOURCES = [
+    {'name': 'NAV Portugal', 'url': 'https://ais.nav.pt', 'contributor': 'librecharts', 'cached': True},
+    {'name': 'DFS', 'url': 'https://aip.dfs.de', 'contributor': 'librecharts', 'cached': False},
+]
+
+
+def synthetic_chart(icao_code: str, index: int, rng: random.Random) -> dict[str, Any]:
+    chart_type = TYPES[index % len(TYPES)]
+    runways = rng.sample(['03', '21', '17', '35', '08L', '26R'], k=2) if rng.random() < 0.9 else ['*']
+    chart = {
+        'title': f'{icao_code} {chart_type.upper()} CHART {index} - RWY {runways[0]} ÁREA',
+        'type': chart_type,
+        'filename': f'{icao_code}_{chart_type}_{index}.pdf',
+        'filetype': 'application/pdf',
+        'source': rng.choice(SOURCES),
+        'icao_code': icao_code,
+    }
+    if chart_type in ['approach', 'departure', 'arrival']:
+        chart['runways'] = runways
+        chart['subtype'] = rng.choice(['ILS', 'RNP', 'VOR', None])
+    if chart_type == 'ground':
+        chart['subtype'] = rng.choice(['parking', 'taxi', None])
+    if chart_type == 'departure':
+        chart['sids'] = [f'{icao_code[1:]}{rng.randint(1, 9)}{rng.choice("ABCDNS")}' for _ in range(3)]
+    if chart_type == 'arrival':
+        chart['stars'] = [f'{icao_code[1:]}{rng.randint(1, 9)}{rng.choice("ABCDNS")}' for _ in range(3)]
+    return chart
+
+
+def synthetic_charts(count: int, icao_code: str = 'LPPT', seed: int = 0) -> list[AnyChart]:
+    rng = random.Random(seed)
+    return [chart_factory(synthetic_chart(icao_code, index, rng)) for index in range(count)]
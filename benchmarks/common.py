@@ -0,0 +1,71 @@
+"""Shared measuring and reporting helpers for the benchmarks
+
+Every benchmark reports a JSON document with the same envelope so runs can be compared across commits with
+python -m benchmarks.compare
+"""
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+
+def measure(function: Callable[[], Any], repeat: int) -> dict[str, float]:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return {'best_ms': min(timings) * 1000, 'mean_ms': sum(timings) / len(timings) * 1000}
+
+
+def latency_summary(latencies: list[float], elapsed: float, errors: int = 0) -> dict[str, float]:
+    """Summarizes the latencies, in seconds, of requests made over elapsed seconds"""
+    if not latencies:
+        return {'requests': 0, 'errors': errors, 'rps': 0.0}
+    latencies = sorted(latencies)
+    quantiles = statistics.quantiles(latencies, n=100, method='inclusive') if len(latencies) > 1 else latencies * 99
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': len(latencies) / elapsed,
+        'p50_ms': quantiles[49] * 1000,
+        'p90_ms': quantiles[89] * 1000,
+        'p99_ms': quantiles[98] * 1000,
+        'max_ms': latencies[-1] * 1000,
+    }
+
+
+def __commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=Path(__file__).parent).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def add_output_argument(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument('--output', type=Path, help='Also write the results to this file')
+
+
+def report(benchmark: str, parameters: dict[str, Any], results: dict[str, Any], output: Optional[Path] = None) -> dict:
+    """Prints the results of a benchmark, and writes them to output, wrapped in the common envelope"""
+    document = {
+        'benchmark': benchmark,
+        'commit': __commit(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'parameters': parameters,
+        'results': results,
+    }
+    text = json.dumps(document, indent=2)
+    print(text)
+    if output:
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(text)
+    return document
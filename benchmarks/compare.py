@@ -0,0 +1,40 @@
+"""Compares two benchmark result files, e.g. from two commits
+
+Prints every measurement present in both with its relative change, for timings lower is better, for rps higher is.
+
+Usage: python -m benchmarks.compare BASELINE CANDIDATE
+"""
+import argparse
+import json
+from pathlib import Path
+from typing import Any, Iterator
+
+
+def measurements(results: Any, path: str = '') -> Iterator[tuple[str, float]]:
+    if isinstance(results, dict):
+        for key, value in results.items():
+            yield from measurements(value, f'{path}.{key}' if path else key)
+    elif isinstance(results, (int, float)) and not isinstance(results, bool):
+        yield path, float(results)
+
+
+def compare(baseline: dict, candidate: dict) -> list[tuple[str, float, float, float]]:
+    new = dict(measurements(candidate['results']))
+    return [(path, old, new[path], (new[path] - old) / old * 100 if old else 0.0)
+            for path, old in measurements(baseline['results']) if path in new]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('baseline', type=Path)
+    parser.add_argument('candidate', type=Path)
+    arguments = parser.parse_args()
+    baseline, candidate = json.loads(arguments.baseline.read_text()), json.loads(arguments.candidate.read_text())
+    if baseline['benchmark'] != candidate['benchmark']:
+        parser.error(f'Can\'t compare {baseline["benchmark"]} results with {candidate["benchmark"]} results')
+
+    print(f'{baseline["benchmark"]}: {baseline["commit"]} -> {candidate["commit"]}')
+    rows = compare(baseline, candidate)
+    width = max((len(path) for path, *_ in rows), default=0)
+    for path, old, new, change in rows:
+        print(f'{path:<{width}}  {old:>12.3f}  {new:>12.3f}  {change:>+8.1f}%')
@@ -0,0 +1,102 @@
+"""Compares the buffered and streaming coverage feed parsers
+
+Runs on the feeds recorded in benchmarks/fixtures, or on synthetic ones for the providers that haven't been recorded,
+see benchmarks.feeds. The buffered parsers are measured twice: with the standard library json module, which is what
+the fetchers use with streaming disabled, and with orjson, which is what they use for feeds under the streaming
+threshold. Against the standard library the VATSIM scanner is about as fast, what it saves is memory.
+
+Usage: python -m benchmarks.coverage_parsers [--repeat N] [--chunk-size BYTES] [--synthetic] [--output PATH]
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+import orjson
+
+from benchmarks.common import report, add_output_argument
+from benchmarks.feeds import load_feed, is_recorded
+from helpers.classes import Providers
+from helpers.coverage import parse_vatsim_json, parse_poscon_json, parse_stp_json, STREAMING_THRESHOLDS
+from helpers.feeds import VatsimFeedParser, PosconFeedParser, StpFeedParser
+
+BUFFERED = {
+    Providers.vatsim: parse_vatsim_json,
+    Providers.poscon: parse_poscon_json,
+    Providers.stp: parse_stp_json,
+}
+
+STREAMING = {
+    Providers.vatsim: VatsimFeedParser,
+    Providers.poscon: PosconFeedParser,
+    Providers.stp: StpFeedParser,
+}
+
+
+def buffered(provider: Providers, feed: bytes, chunk_size: int):
+    # @NOTE(Mauro): The fetchers join the chunks of a feed under the threshold before parsing it, do the same so both
+    #               sides pay for the body
+    chunks = [feed[i:i + chunk_size] for i in range(0, len(feed), chunk_size)]
+    return BUFFERED[provider](orjson.loads(b''.join(chunks)))
+
+
+def buffered_json(provider: Providers, feed: bytes, chunk_size: int):
+    # @NOTE(Mauro): Same as the fetchers with streaming disabled, httpx decodes the whole body with the json module
+    chunks = [feed[i:i + chunk_size] for i in range(0, len(feed), chunk_size)]
+    return BUFFERED[provider](json.loads(b''.join(chunks)))
+
+
+def streaming(provider: Providers, feed: bytes, chunk_size: int):
+    parser = STREAMING[provider]()
+    for i in range(0, len(feed), chunk_size):
+        parser.feed(feed[i:i + chunk_size])
+    return parser.close()
+
+
+def measure(function, provider: Providers, feed: bytes, chunk_size: int, repeat: int) -> dict[str, float]:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(provider, feed, chunk_size)
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    function(provider, feed, chunk_size)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {'best_ms': min(timings) * 1000, 'mean_ms': sum(timings) / len(timings) * 1000, 'peak_kib': peak / 1024}
+
+
+def run(repeat: int = 10, chunk_size: int = 65536, synthetic: bool = False) -> dict:
+    results = {}
+    for provider in Providers:
+        feed = load_feed(provider, synthetic)
+
+        expected = buffered(provider, feed, chunk_size)
+        actual = streaming(provider, feed, chunk_size)
+        for key in ['departure_airports', 'arrival_airports', 'alternate_airports']:
+            assert set(getattr(expected, key)) == set(getattr(actual, key)), f'{provider} {key} mismatch'
+
+        results[provider.value] = {
+            'feed': 'recorded' if is_recorded(provider) and not synthetic else 'synthetic',
+            'feed_bytes': len(feed),
+            'selected': 'streaming' if len(feed) > STREAMING_THRESHOLDS[provider] else 'buffered',
+            'buffered_json': measure(buffered_json, provider, feed, chunk_size, repeat),
+            'buffered_orjson': measure(buffered, provider, feed, chunk_size, repeat),
+            'streaming': measure(streaming, provider, feed, chunk_size, repeat),
+        }
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--chunk-size', type=int, default=65536)
+    parser.add_argument('--synthetic', action='store_true',
+                        help='Run on synthetic feeds even for the recorded providers')
+    add_output_argument(parser)
+    arguments = parser.parse_args()
+    report('coverage_parsers', {'repeat': arguments.repeat, 'chunk_size': arguments.chunk_size,
+                                'synthetic': arguments.synthetic},
+           run(arguments.repeat, arguments.chunk_size, arguments.synthetic), arguments.output)
@@ -0,0 +1,31 @@
+"""Compares validated and trusted construction of charts from database rows
+
+Usage: python -m benchmarks.factories [--charts N] [--repeat N] [--output PATH]
+"""
+import argparse
+
+from benchmarks.charts import synthetic_charts
+from benchmarks.common import measure, report, add_output_argument
+from helpers.factories import chart_factory, trusted_chart_factory, ROW_COLUMNS
+
+
+def run(count: int = 300, repeat: int = 50) -> dict:
+    rows = [tuple(chart.model_dump().get(column) for column in ROW_COLUMNS) for chart in synthetic_charts(count)]
+
+    assert [chart_factory(row) for row in rows] == [trusted_chart_factory(row) for row in rows]
+
+    return {
+        'charts': count,
+        'chart_factory': measure(lambda: [chart_factory(row) for row in rows], repeat),
+        'trusted_chart_factory': measure(lambda: [trusted_chart_factory(row) for row in rows], repeat),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--charts', type=int, default=300)
+    parser.add_argument('--repeat', type=int, default=50)
+    add_output_argument(parser)
+    arguments = parser.parse_args()
+    report('factories', {'charts': arguments.charts, 'repeat': arguments.repeat},
+           run(arguments.charts, arguments.repeat), arguments.output)
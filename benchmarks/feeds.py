@@ -0,0 +1,185 @@
+"""Coverage feed fixtures for the benchmarks
+
+Recorded feeds are read from benchmarks/fixtures/<provider>.json, run this module to record the live feeds there. The
+recordings are trimmed to a number of flights and stripped of names and member ids so they can be committed. Without a
+recording, or when asked for, seeded synthetic feeds with the same shape as the upstream ones are used instead, results
+say which kind of feed they were measured on since synthetic numbers say little about the real feeds.
+
+Usage: python -m benchmarks.feeds [--flights N] [--provider PROVIDER]...
+"""
+import argparse
+import asyncio
+import json
+import random
+import string
+from pathlib import Path
+from typing import Any
+
+from helpers.classes import Providers
+
+FIXTURES = Path(__file__).parent / 'fixtures'
+
+
+def airport_codes(count: int, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    return [''.join(rng.choices(string.ascii_uppercase, k=4)) for _ in range(count)]
+
+
+def __pick(rng: random.Random, codes: list[str]) -> str:
+    # @NOTE(Mauro): Traffic is heavily skewed towards a handful of hubs, so weigh the pick towards the first codes
+    return codes[min(int(rng.paretovariate(1.2)) - 1, len(codes) - 1)]
+
+
+def synthetic_vatsim_feed(pilots: int = 1500, seed: int = 0) -> bytes:
+    rng = random.Random(seed)
+    codes = airport_codes(2000, seed)
+    feed = {'general': {'version': 3, 'update_timestamp': '2023-09-01T00:00:00Z', 'connected_clients': pilots},
+            'pilots': [], 'controllers': [], 'atis': [], 'servers': [], 'prefiles': []}
+    for cid in range(pilots):
+        flight_plan = None
+        if rng.random() < 0.85:
+            flight_plan = {
+                'flight_rules': 'I', 'aircraft': 'B738/M-SDE2E3FGHIJ2J3J4J5M1RWXY/LB1', 'aircraft_faa': 'B738/L',
+                'aircraft_short': 'B738', 'departure': __pick(rng, codes), 'arrival': __pick(rng, codes),
+                'alternate': __pick(rng, codes) if rng.random() < 0.6 else 'NONE', 'cruise_tas': '450',
+                'altitude': '36000', 'deptime': '1200', 'enroute_time': '0230', 'fuel_time': '0400',
+                'remarks': 'PBN/A1B1C1D1O1S2 DOF/230901 REG/CSTNA EET/LPPC0012 RMK/TCAS /V/',
+                'route': ' '.join(rng.choices(['UN872', 'DCT', 'ERIGA', 'UM744', 'BUSEN', 'NATA', 'UL612'], k=12)),
+                'revision_id': 1, 'assigned_transponder': '2000'
+            }
+        feed['pilots'].append({
+            'cid': 1000000 + cid, 'name': f'Pilot {cid}', 'callsign': f'TAP{cid}', 'server': 'GERMANY',
+            'pilot_rating': 0, 'military_rating': 0, 'latitude': rng.uniform(-90, 90),
+            'longitude': rng.uniform(-180, 180), 'altitude': rng.randint(0, 41000), 'groundspeed': rng.randint(0, 500),
+            'transponder': '2000', 'heading': rng.randint(0, 359), 'qnh_i_hg': 29.92, 'qnh_mb': 1013,
+            'flight_plan': flight_plan, 'logon_time': '2023-09-01T00:00:00Z', 'last_updated': '2023-09-01T00:00:00Z'
+        })
+    return json.dumps(feed).encode()
+
+
+def synthetic_poscon_feed(flights: int = 150, seed: int = 0) -> bytes:
+    rng = random.Random(seed)
+    codes = airport_codes(2000, seed)
+    feed = {'lastUpdated': '2023-09-01T00:00:00Z', 'flights': [], 'atc': [], 'upcomingAtc': []}
+    for index in range(flights):
+        flight_plan = None
+        if rng.random() < 0.9:
+            flight_plan = {
+                'dep': __pick(rng, codes), 'dest': __pick(rng, codes),
+                'altnt': __pick(rng, codes) if rng.random() < 0.6 else None,
+                'altnt2': __pick(rng, codes) if rng.random() < 0.1 else None,
+                'route': 'DCT ERIGA UN872 BUSEN', 'ac_type': 'A320', 'flight_rules': 'I', 'cruise_spd': 450,
+                'cruise': 'F360', 'dep_time': '1200', 'eet': '0230', 'remarks': 'PBN/A1B1C1D1O1S2'
+            }
+        feed['flights'].append({
+            'callsign': f'TAP{index}', 'userId': str(index), 'ac_type': 'A320', 'login': '2023-09-01T00:00:00Z',
+            'position': {'lat': rng.uniform(-90, 90), 'long': rng.uniform(-180, 180), 'alt_amsl': 36000},
+            'flightplan': flight_plan
+        })
+    return json.dumps(feed).encode()
+
+
+def synthetic_stp_feed(flights: int = 400, seed: int = 0) -> bytes:
+    rng = random.Random(seed)
+    codes = airport_codes(2000, seed)
+    feed = {}
+    for index in range(flights):
+        feed[str(index)] = [str(index), f'Pilot {index}', f'TAP{index}', 'A320', rng.uniform(-90, 90),
+                            rng.uniform(-180, 180), rng.randint(0, 41000),
+                            __pick(rng, codes) if rng.random() < 0.9 else '-',
+                            __pick(rng, codes) if rng.random() < 0.9 else '-', rng.randint(0, 500)]
+    return json.dumps(feed).encode()
+
+
+SYNTHETIC = {
+    Providers.vatsim: synthetic_vatsim_feed,
+    Providers.poscon: synthetic_poscon_feed,
+    Providers.stp: synthetic_stp_feed,
+}
+
+
+# Keys holding a member's name or id, replaced when recording
+NAME_KEYS = {'name', 'realname'}
+ID_KEYS = {'cid', 'userId', 'user_id'}
+# Lists of a VATSIM feed trimmed when recording, the remaining sections are small and kept whole
+VATSIM_LISTS = ['pilots', 'controllers', 'atis', 'prefiles']
+
+
+def is_recorded(provider: Providers) -> bool:
+    return (FIXTURES / f'{provider}.json').exists()
+
+
+def load_feed(provider: Providers, synthetic: bool = False) -> bytes:
+    """Returns the recorded feed for a provider, or a synthetic one when asked for or when it hasn't been recorded"""
+    if synthetic or not is_recorded(provider):
+        return SYNTHETIC[provider]()
+    return (FIXTURES / f'{provider}.json').read_bytes()
+
+
+def __scrub(value: Any, index: int) -> Any:
+    if isinstance(value, dict):
+        scrubbed = dict(value)
+        for key in NAME_KEYS.intersection(value):
+            scrubbed[key] = f'Member {index}'
+        for key in ID_KEYS.intersection(value):
+            scrubbed[key] = str(index) if isinstance(value[key], str) else index
+        return scrubbed
+    if isinstance(value, list) and len(value) > 1:
+        # @NOTE(Mauro): SimToolkitPro flights are arrays that start with the member id and name
+        return [str(index), f'Member {index}', *value[2:]]
+    return value
+
+
+def trim_feed(provider: Providers, feed: bytes, flights: int) -> bytes:
+    """Keeps the first flights of a recorded feed and replaces the names and member ids in it
+
+    The whitespace of the upstream feed is kept, the VATSIM scanner's speed depends on it.
+    """
+    document = json.loads(feed)
+    if provider == Providers.vatsim:
+        for key in VATSIM_LISTS:
+            document[key] = [__scrub(item, index) for index, item in enumerate(document.get(key, [])[:flights])]
+    elif provider == Providers.poscon:
+        for key in ['flights', 'atc', 'upcomingAtc']:
+            if key in document:
+                document[key] = [__scrub(item, index) for index, item in enumerate(document[key][:flights])]
+    else:
+        document = {str(index): __scrub(flight, index)
+                    for index, flight in enumerate(list(document.values())[:flights])}
+    indent = 2 if b'\n ' in feed[:4096] else None
+    return json.dumps(document, indent=indent).encode()
+
+
+async def record(flights: int, providers: list[Providers]) -> None:
+    """Records the live feeds of the given providers into the fixtures directory, trimmed to a number of flights
+
+    A provider that can't be reached is reported and skipped, the benchmarks keep using its synthetic feed.
+    """
+    from helpers.coverage import VATSIM_STATUS_URL, POSCON_DATA_ENDPOINT, STP_DATA_ENDPOINT
+    import httpx
+
+    async with httpx.AsyncClient(follow_redirects=True, timeout=30) as client:
+        FIXTURES.mkdir(exist_ok=True)
+        for provider in providers:
+            try:
+                if provider == Providers.vatsim:
+                    url = (await client.get(VATSIM_STATUS_URL)).json()['data']['v3'][0]
+                else:
+                    url = POSCON_DATA_ENDPOINT if provider == Providers.poscon else STP_DATA_ENDPOINT
+                response = await client.get(url)
+                response.raise_for_status()
+            except httpx.HTTPError as e:
+                print(f'Skipped {provider}: {e!r}')
+                continue
+            feed = trim_feed(provider, response.content, flights)
+            (FIXTURES / f'{provider}.json').write_bytes(feed)
+            print(f'Recorded {provider} ({len(response.content)} bytes, {len(feed)} bytes trimmed)')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--flights', type=int, default=1000, help='Flights kept in each recording')
+    parser.add_argument('--provider', type=Providers, action='append', choices=list(Providers),
+                        help='Provider to record, every provider if not given')
+    arguments = parser.parse_args()
+    asyncio.run(record(arguments.flights, arguments.provider or list(Providers)))
@@ -0,0 +1,200 @@
+"""End-to-end throughput and latency of /update and the read endpoints against a locally started Postgres
+
+Starts the API with uvicorn in a subprocess, applies a synthetic manifest through /update/stream and /update, then
+hammers each read endpoint with concurrent keep-alive clients for a fixed duration. Airports are requested with the
+same skew their chart counts have. The manifest's charts are written to DATABASE_URL, point it at a scratch database.
+
+Usage: DATABASE_URL=postgresql://... python -m benchmarks.load [--size {1k,50k,500k}] [--concurrency N]
+       [--duration SECONDS] [--port PORT] [--output PATH]
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import secrets
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import AsyncIterator, Callable
+
+import httpx
+
+from benchmarks.common import latency_summary, report, add_output_argument
+from benchmarks.manifests import SIZES, manifest_airports, write_manifest
+
+ROOT = Path(__file__).parent.parent
+# /update buffers and validates the whole manifest before writing it, past this size only /update/stream is measured
+MAX_BUFFERED_UPDATE = 50_000
+# Airports whose ETag is collected for the revalidation scenario, the busiest ones
+REVALIDATED_AIRPORTS = 200
+
+
+@dataclass
+class Context:
+    codes: list[str]
+    weights: list[int]
+    etags: dict[str, str] = field(default_factory=dict)
+
+    def pick(self, rng: random.Random) -> str:
+        return rng.choices(self.codes, cum_weights=self.weights)[0]
+
+
+def charts(rng: random.Random, context: Context) -> tuple[str, dict]:
+    return f'/charts/{context.pick(rng)}', {}
+
+
+def charts_categorized(rng: random.Random, context: Context) -> tuple[str, dict]:
+    return f'/charts/{context.pick(rng)}/categorized', {}
+
+
+def charts_not_modified(rng: random.Random, context: Context) -> tuple[str, dict]:
+    code = rng.choice(list(context.etags))
+    return f'/charts/{code}', {'If-None-Match': context.etags[code]}
+
+
+def charts_batch(rng: random.Random, context: Context) -> tuple[str, dict]:
+    return f'/charts?codes={",".join({context.pick(rng) for _ in range(5)})}', {}
+
+
+def runway(rng: random.Random, context: Context) -> tuple[str, dict]:
+    return f'/charts/{context.pick(rng)}/runway/{rng.choice(["03", "21", "17", "35"])}', {}
+
+
+def codes(rng: random.Random, context: Context) -> tuple[str, dict]:
+    return '/codes', {}
+
+
+def search(rng: random.Random, context: Context) -> tuple[str, dict]:
+    return f'/search?q={rng.choice(["approach", "departure", "ground"])} {context.pick(rng)[:3]}', {}
+
+
+SCENARIOS: dict[str, Callable[[random.Random, Context], tuple[str, dict]]] = {
+    'charts': charts,
+    'charts_categorized': charts_categorized,
+    'charts_not_modified': charts_not_modified,
+    'charts_batch': charts_batch,
+    'runway': runway,
+    'codes': codes,
+    'search': search,
+}
+
+
+def start_server(port: int, token: str) -> subprocess.Popen:
+    environment = {'PASSWORD': 'benchmark', 'SENTRY_URI': '', **os.environ, 'UPDATE_TOKEN': token}
+    return subprocess.Popen([sys.executable, '-m', 'uvicorn', 'api:api', '--port', str(port), '--log-level',
+                             'warning', '--no-access-log'], cwd=ROOT, env=environment)
+
+
+async def wait_until_healthy(client: httpx.AsyncClient, server: subprocess.Popen, timeout: float = 60.0) -> None:
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f'The API exited with code {server.returncode}')
+        try:
+            if (await client.get('/health/db')).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError('The API did not become healthy in time')
+
+
+async def __chunks(path: Path, size: int = 1024 * 1024) -> AsyncIterator[bytes]:
+    with path.open('rb') as file:
+        while chunk := file.read(size):
+            yield chunk
+
+
+async def timed_update(client: httpx.AsyncClient, token: str, path: Path, streamed: bool) -> dict:
+    start = time.perf_counter()
+    if streamed:
+        response = await client.post('/update/stream', content=__chunks(path), headers={'token': token},
+                                     timeout=None)
+    else:
+        response = await client.post('/update', content=path.read_bytes(), timeout=None,
+                                     headers={'token': token, 'Content-Type': 'application/json'})
+    elapsed = time.perf_counter() - start
+    response.raise_for_status()
+    changes = response.json()
+    return {'seconds': elapsed, 'inserted': len(changes['inserted']['filenames']),
+            'updated': len(changes['updated']['filenames']), 'deleted': len(changes['deleted']['filenames'])}
+
+
+async def run_scenario(client: httpx.AsyncClient, scenario: Callable, context: Context, concurrency: int,
+                       duration: float) -> dict:
+    latencies: list[float] = []
+    errors = itertools.count()
+
+    async def worker(seed: int) -> None:
+        rng = random.Random(seed)
+        while time.perf_counter() < deadline:
+            path, headers = scenario(rng, context)
+            start = time.perf_counter()
+            try:
+                response = await client.get(path, headers=headers)
+                if response.status_code >= 400:
+                    raise httpx.HTTPStatusError('', request=response.request, response=response)
+            except httpx.HTTPError:
+                next(errors)
+                continue
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    deadline = start + duration
+    await asyncio.gather(*[worker(seed) for seed in range(concurrency)])
+    return latency_summary(latencies, time.perf_counter() - start, next(errors))
+
+
+async def run(size: str = '1k', concurrency: int = 32, duration: float = 10.0, port: int = 8765) -> dict:
+    token = secrets.token_hex(16)
+    airports = manifest_airports(SIZES[size])
+    context = Context([code for code, _ in airports], list(itertools.accumulate(count for _, count in airports)))
+
+    server = start_server(port, token)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    try:
+        async with httpx.AsyncClient(base_url=f'http://127.0.0.1:{port}', limits=limits, timeout=30) as client:
+            await wait_until_healthy(client, server)
+
+            results: dict = {'updates': {}, 'endpoints': {}}
+            with tempfile.TemporaryDirectory() as directory:
+                ndjson = Path(directory) / 'manifest.ndjson'
+                with ndjson.open('wb') as file:
+                    write_manifest(file, SIZES[size])
+                results['updates']['stream_initial'] = await timed_update(client, token, ndjson, True)
+                results['updates']['stream_unchanged'] = await timed_update(client, token, ndjson, True)
+
+                if SIZES[size] <= MAX_BUFFERED_UPDATE:
+                    document = Path(directory) / 'manifest.json'
+                    with document.open('wb') as file:
+                        write_manifest(file, SIZES[size], ndjson=False)
+                    results['updates']['buffered_unchanged'] = await timed_update(client, token, document, False)
+
+            for code in context.codes[:REVALIDATED_AIRPORTS]:
+                context.etags[code] = (await client.get(f'/charts/{code}')).headers['ETag']
+
+            for name, scenario in SCENARIOS.items():
+                results['endpoints'][name] = await run_scenario(client, scenario, context, concurrency, duration)
+            return results
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', choices=SIZES, default='1k')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--port', type=int, default=8765)
+    add_output_argument(parser)
+    arguments = parser.parse_args()
+    if not os.environ.get('DATABASE_URL'):
+        parser.error('DATABASE_URL must point at a scratch Postgres database')
+    parameters = {'size': arguments.size, 'concurrency': arguments.concurrency, 'duration': arguments.duration}
+    report('load', parameters, asyncio.run(run(arguments.size, arguments.concurrency, arguments.duration,
+                                                arguments.port)), arguments.output)
@@ -0,0 +1,89 @@
+"""Synthetic chart manifests with a realistic skew of charts per airport
+
+A few hubs have hundreds of charts while most airfields only have a handful, the same seed always produces the same
+manifest.
+
+Usage: python -m benchmarks.manifests {1k,50k,500k} [--format ndjson|json] [--output PATH]
+"""
+import argparse
+import random
+import string
+import sys
+from pathlib import Path
+from typing import Any, BinaryIO, Iterator
+
+import orjson
+
+from benchmarks.charts import synthetic_chart
+
+SIZES = {'1k': 1_000, '50k': 50_000, '500k': 500_000}
+
+# @NOTE(Mauro): Charts per airport follow a Pareto distribution, alpha 1.16 is the 80/20 rule, capped at the chart
+#               count of the biggest real airports
+PARETO_ALPHA = 1.16
+MIN_CHARTS = 3
+MAX_CHARTS = 400
+
+
+def manifest_airports(size: int, seed: int = 0) -> list[tuple[str, int]]:
+    """Returns the airports of a manifest and how many charts each of them has, busiest first
+
+    Args:
+        size: Total number of charts
+        seed: Random seed
+
+    Returns: list[tuple[str, int]]
+    """
+    rng = random.Random(seed)
+    airports: dict[str, int] = {}
+    total = 0
+    while total < size:
+        code = ''.join(rng.choices(string.ascii_uppercase, k=4))
+        if code in airports:
+            continue
+        count = min(MAX_CHARTS, int(MIN_CHARTS * rng.paretovariate(PARETO_ALPHA)), size - total)
+        airports[code] = count
+        total += count
+    return sorted(airports.items(), key=lambda airport: airport[1], reverse=True)
+
+
+def synthetic_manifest(size: int, seed: int = 0) -> Iterator[dict[str, Any]]:
+    """Yields the charts of a synthetic manifest one at a time, so even the biggest ones don't need to fit in memory
+
+    Args:
+        size: Total number of charts
+        seed: Random seed
+
+    Returns: Iterator[dict[str, Any]] of manifest charts
+    """
+    rng = random.Random(seed)
+    for code, count in manifest_airports(size, seed):
+        for index in range(count):
+            yield synthetic_chart(code, index, rng)
+
+
+def write_manifest(file: BinaryIO, size: int, seed: int = 0, ndjson: bool = True) -> None:
+    """Writes a synthetic manifest as NDJSON, for /update/stream, or as the JSON document /update takes"""
+    if ndjson:
+        for chart in synthetic_manifest(size, seed):
+            file.write(orjson.dumps(chart) + b'\n')
+        return
+
+    file.write(b'{"charts":[')
+    for index, chart in enumerate(synthetic_manifest(size, seed)):
+        file.write((b',' if index else b'') + orjson.dumps(chart))
+    file.write(b']}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('size', choices=SIZES)
+    parser.add_argument('--format', choices=['ndjson', 'json'], default='ndjson')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', type=Path)
+    arguments = parser.parse_args()
+    if arguments.output:
+        with arguments.output.open('wb') as output:
+            write_manifest(output, SIZES[arguments.size], arguments.seed, arguments.format == 'ndjson')
+    else:
+        write_manifest(sys.stdout.buffer, SIZES[arguments.size], arguments.seed, arguments.format == 'ndjson')
@@ -0,0 +1,41 @@
+"""Micro-benchmarks of the hot helpers: chart_factory, __clean_array and the categorization behind
+/charts/{code}/categorized
+
+Usage: python -m benchmarks.micro [--charts N] [--repeat N] [--output PATH]
+"""
+import argparse
+import random
+
+from benchmarks.charts import synthetic_chart
+from benchmarks.common import measure, report, add_output_argument
+from benchmarks.feeds import airport_codes
+from helpers.coverage import __clean_array as clean_array
+from helpers.factories import chart_factory
+from helpers.serialization import categorize_charts, serialize_categorized_charts
+
+
+def run(count: int = 300, repeat: int = 50) -> dict:
+    rng = random.Random(0)
+    manifest = [synthetic_chart('LPPT', index, rng) for index in range(count)]
+    charts = [chart_factory(chart) for chart in manifest]
+
+    # @NOTE(Mauro): Shaped like the airports of a busy feed, duplicates, empty values and the odd malformed code
+    codes = airport_codes(500)
+    airports = [rng.choice(codes) for _ in range(3000)] + [''] * 200 + ['NONE', 'X'] * 50
+
+    return {
+        'chart_factory': measure(lambda: [chart_factory(chart) for chart in manifest], repeat),
+        'clean_array': measure(lambda: clean_array(airports), repeat),
+        'categorize_charts': measure(lambda: categorize_charts(charts), repeat),
+        'serialize_categorized_charts': measure(lambda: serialize_categorized_charts(charts), repeat),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--charts', type=int, default=300)
+    parser.add_argument('--repeat', type=int, default=50)
+    add_output_argument(parser)
+    arguments = parser.parse_args()
+    report('micro', {'charts': arguments.charts, 'repeat': arguments.repeat},
+           run(arguments.charts, arguments.repeat), arguments.output)
@@ -0,0 +1,58 @@
+"""Compares FastAPI's response serialization of chart lists with the pre-serialized bodies
+
+Usage: python -m benchmarks.serialization [--charts N] [--repeat N] [--output PATH]
+
+Imports the API, so the app's required settings have to be set, in the environment or in .env
+"""
+import argparse
+import asyncio
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+
+import api
+from benchmarks.charts import synthetic_charts
+from benchmarks.common import measure, report, add_output_argument
+from helpers.cache import create_entry
+from helpers.serialization import categorize_charts
+
+
+def route_field(path: str):
+    return next(route for route in api.api.routes if getattr(route, 'path', None) == path).response_field
+
+
+async def fastapi_body(field, content) -> bytes:
+    return JSONResponse(await serialize_response(field=field, response_content=content)).body
+
+
+def run(count: int = 300, repeat: int = 50) -> dict:
+    charts = synthetic_charts(count)
+    flat_field = route_field('/charts/{code}')
+    categorized_field = route_field('/charts/{code}/categorized')
+    entry = create_entry(charts)
+    compressed = create_entry(charts, compression_min_bytes=0)
+
+    assert asyncio.run(fastapi_body(flat_field, charts)) == entry.body
+    assert asyncio.run(fastapi_body(categorized_field, categorize_charts(charts))) == entry.categorized_body
+
+    return {
+        'charts': count,
+        'body_bytes': len(entry.body),
+        'compressed_body_bytes': {coding: len(body) for coding, body in compressed.compressed_bodies.items()},
+        'fastapi': measure(lambda: asyncio.run(fastapi_body(flat_field, charts)), repeat),
+        'fastapi_categorized': measure(
+            lambda: asyncio.run(fastapi_body(categorized_field, categorize_charts(charts))), repeat),
+        'pre_serialized_cold': measure(lambda: create_entry(charts), repeat),
+        'pre_serialized_cold_compressed': measure(lambda: create_entry(charts, compression_min_bytes=0), repeat),
+        'pre_serialized_warm': measure(lambda: (entry.body, entry.categorized_body), repeat),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--charts', type=int, default=300)
+    parser.add_argument('--repeat', type=int, default=50)
+    add_output_argument(parser)
+    arguments = parser.parse_args()
+    report('serialization', {'charts': arguments.charts, 'repeat': arguments.repeat},
+           run(arguments.charts, arguments.repeat), arguments.output)
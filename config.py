@@ -1,9 +1,51 @@
+from typing import Optional
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
-class Settings(BaseSettings):
+class DatabaseSettings(BaseSettings):
+    database_url: Optional[str] = None
+    database_pool_min_size: int = 4
+    database_pool_max_size: Optional[int] = None
+    database_pool_max_idle: float = 10 * 60.0
+    database_pool_max_lifetime: float = 60 * 60.0
+    database_pool_open_timeout: float = 30.0
+    database_statement_timeout_ms: int = 0
+    database_health_timeout: float = 1.0
+    database_health_max_latency_ms: float = 250.0
+    model_config = SettingsConfigDict(env_file=".env")
+
+
+class SentrySettings(BaseSettings):
+    sentry_uri: Optional[str] = None
+    sentry_traces_sample_rate: float = 1.0
+    sentry_profiles_sample_rate: float = 0.1
+    model_config = SettingsConfigDict(env_file=".env")
+
+
+class Settings(DatabaseSettings, SentrySettings):
     app_name: str = "LibreCharts API"
     password: str
     update_token: str
     sentry_uri: str
+    chart_cache_max_bytes: int = 32 * 1024 * 1024
+    charts_cache_control: str = 'public, no-cache'
+    charts_compression_min_bytes: int = 1024
+    coverage_poll_interval: float = 60.0
+    coverage_prewarm_budget: int = 200
+    coverage_history_interval: float = 60.0
+    coverage_history_hourly_retention_hours: int = 48
+    coverage_history_daily_retention_days: int = 90
+    manifest_batch_size: int = 1000
+    manifest_read_timeout: float = 30.0
+    search_timeout_ms: int = 500
+    invalidation_poll_interval: float = 5.0
+    chart_files_directory: str = 'chart_files'
+    chart_files_max_bytes: int = 2 * 1024 * 1024 * 1024
+    chart_file_max_bytes: int = 64 * 1024 * 1024
+    chart_file_fetch_timeout: float = 30.0
+    chart_files_prefetch: bool = False
+    chart_files_prefetch_concurrency: int = 4
+    exports_directory: str = 'exports'
+    export_batch_size: int = 5000
     model_config = SettingsConfigDict(env_file=".env")
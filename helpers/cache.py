@@ -0,0 +1,224 @@
+import asyncio
+import gzip
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, Optional
+
+import brotli
+
+from helpers.classes import AnyChart
+from helpers.metrics import CHART_SERIALIZATION_DURATION, CHART_COMPRESSION_DURATION
+from helpers.serialization import serialize_charts, serialize_categorized_charts
+
+# @NOTE(Mauro): Rough per-object overheads used to estimate how much memory an airport's chart list takes up.
+#               Measuring the real size of a pydantic model is far more expensive than the lookup we're trying to
+#               save, so we only count payload bytes plus a fixed cost per chart and per entry.
+CHART_OVERHEAD = 1024
+ENTRY_OVERHEAD = 256
+
+# @NOTE(Mauro): Bodies are compressed once per cache fill, not per request, but a fill still happens on a request.
+#               Past these levels the bodies barely get smaller while compressing gets several times slower, brotli's
+#               maximum quality takes hundreds of milliseconds for a big airport
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 6
+
+# Content codings bodies are stored in, in order of preference when a client accepts several equally
+COMPRESSORS: dict[str, Callable[[bytes], bytes]] = {
+    'br': lambda body: brotli.compress(body, quality=BROTLI_QUALITY),
+    'gzip': lambda body: gzip.compress(body, GZIP_LEVEL, mtime=0),
+}
+
+
+@dataclass(slots=True)
+class CacheEntry:
+    """
+    Represents the cached charts for a given airport
+
+    Attributes:
+        charts (Optional[list[AnyChart]]): The airport's charts, None when the airport has no charts in the system
+        size (int): Estimated size of the entry in bytes
+        version (Optional[str]): Content version of the airport's charts
+        body (Optional[bytes]): The charts serialized to JSON
+        categorized_body (Optional[bytes]): The charts grouped by type serialized to JSON
+        compressed_bodies (dict[str, bytes]): body per content coding, empty when it's too small to be worth it
+        compressed_categorized_bodies (dict[str, bytes]): categorized_body per content coding, empty when it's too
+                                                          small to be worth it
+    """
+
+    charts: Optional[list[AnyChart]]
+    size: int
+    version: Optional[str] = None
+    body: Optional[bytes] = None
+    categorized_body: Optional[bytes] = None
+    compressed_bodies: dict[str, bytes] = field(default_factory=dict)
+    compressed_categorized_bodies: dict[str, bytes] = field(default_factory=dict)
+
+
+def compress_body(body: bytes, min_bytes: Optional[int]) -> dict[str, bytes]:
+    """Compresses a body with every stored content coding
+
+    Args:
+        body: The body to compress
+        min_bytes: Bodies smaller than this aren't compressed, None to never compress
+
+    Returns: dict[str, bytes] the body per content coding, empty when it isn't compressed
+    """
+    if min_bytes is None or len(body) < min_bytes:
+        return {}
+    with CHART_COMPRESSION_DURATION.time():
+        return {coding: compress(body) for coding, compress in COMPRESSORS.items()}
+
+
+def create_entry(charts: Optional[list[AnyChart]], version: Optional[str] = None,
+                 compression_min_bytes: Optional[int] = None) -> CacheEntry:
+    """Creates a cache entry, serializing the charts in both response shapes and compressing them if they're big enough
+
+    Args:
+        charts: List of charts, None for negative entries
+        version: Content version of the charts
+        compression_min_bytes: Bodies smaller than this aren't compressed, None to never compress
+
+    Returns: CacheEntry
+    """
+    if charts is None:
+        return CacheEntry(None, ENTRY_OVERHEAD, version)
+
+    with CHART_SERIALIZATION_DURATION.time():
+        body = serialize_charts(charts)
+        categorized_body = serialize_categorized_charts(charts)
+    compressed_bodies = compress_body(body, compression_min_bytes)
+    compressed_categorized_bodies = compress_body(categorized_body, compression_min_bytes)
+
+    # @NOTE(Mauro): The serialized body is a good proxy for the size of the strings held by the models
+    size = ENTRY_OVERHEAD + CHART_OVERHEAD * len(charts) + 2 * len(body) + len(categorized_body) + \
+        sum(map(len, compressed_bodies.values())) + sum(map(len, compressed_categorized_bodies.values()))
+    return CacheEntry(charts, size, version, body, categorized_body, compressed_bodies, compressed_categorized_bodies)
+
+
+class ChartCache:
+    """
+    Bounded LRU cache of charts keyed by ICAO code, holds both found and negative (no charts) results
+
+    Attributes:
+        max_bytes (int): Estimated memory cap, least recently used airports are evicted past this size
+        compression_min_bytes (Optional[int]): Bodies smaller than this aren't compressed, None to never compress
+        size (int): Estimated memory currently in use
+        hits (int): Number of lookups served from the cache
+        misses (int): Number of lookups that had to go to the database
+    """
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024, compression_min_bytes: Optional[int] = None):
+        self.max_bytes = max_bytes
+        self.compression_min_bytes = compression_min_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.generation = 0
+        self.__entries: OrderedDict[str, CacheEntry] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+    def __contains__(self, icao_code: str) -> bool:
+        return icao_code in self.__entries
+
+    def get(self, icao_code: str) -> Optional[CacheEntry]:
+        """Returns the cached entry for a given ICAO code and marks it as recently used
+
+        Args:
+            icao_code: The four letter ICAO code to search by
+
+        Returns: Optional[CacheEntry]
+        """
+        entry = self.__entries.get(icao_code)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.__entries.move_to_end(icao_code)
+        self.hits += 1
+        return entry
+
+    def put(self, icao_code: str, charts: Optional[list[AnyChart]], version: Optional[str] = None,
+            generation: Optional[int] = None) -> CacheEntry:
+        """Caches the charts for a given ICAO code, evicting the least recently used airports if needed
+
+        Args:
+            icao_code: The four letter ICAO code the charts belong to
+            charts: The airport's charts or None if the airport has no charts
+            version: Content version of the airport's charts
+            generation: Cache generation read before the charts were loaded, if the cache has been invalidated since
+                        then the charts may be stale and are not stored
+
+        Returns: CacheEntry whether it was stored or not
+        """
+        return self.__store(icao_code, create_entry(charts, version, self.compression_min_bytes), generation)
+
+    async def fill(self, airports: dict[str, tuple[Optional[list[AnyChart]], Optional[str]]],
+                   generation: Optional[int] = None) -> dict[str, CacheEntry]:
+        """Caches the charts of several airports like put, serializing and compressing them in a worker thread
+
+        Every entry is serialized in both response shapes and each is compressed with every encoding in COMPRESSORS,
+        gzip and Brotli release the GIL while they work so the thread runs alongside the requests being served.
+
+        Args:
+            airports: Charts, None if the airport has no charts, and content version per ICAO code
+            generation: Cache generation read before the charts were loaded, if the cache has been invalidated since
+                        then the charts may be stale and are not stored
+
+        Returns: dict[str, CacheEntry] per ICAO code whether they were stored or not
+        """
+        def create_entries() -> dict[str, CacheEntry]:
+            return {icao_code: create_entry(charts, version, self.compression_min_bytes)
+                    for icao_code, (charts, version) in airports.items()}
+
+        entries = await asyncio.to_thread(create_entries)
+        return {icao_code: self.__store(icao_code, entry, generation) for icao_code, entry in entries.items()}
+
+    def invalidate(self, icao_codes: Iterable[str]) -> None:
+        """Removes the given ICAO codes from the cache
+
+        Args:
+            icao_codes: ICAO codes whose charts have changed
+        """
+        self.generation += 1
+        for icao_code in icao_codes:
+            self.__remove(icao_code)
+
+    def clear(self) -> None:
+        """Removes every entry from the cache"""
+        self.generation += 1
+        self.__entries.clear()
+        self.size = 0
+
+    def resize(self, max_bytes: int) -> None:
+        """Changes the memory cap of the cache, evicting entries if needed
+
+        Args:
+            max_bytes: New estimated memory cap in bytes
+        """
+        self.max_bytes = max_bytes
+        while self.size > self.max_bytes:
+            _, evicted = self.__entries.popitem(last=False)
+            self.size -= evicted.size
+
+    def __store(self, icao_code: str, entry: CacheEntry, generation: Optional[int]) -> CacheEntry:
+        if (generation is not None and generation != self.generation) or entry.size > self.max_bytes:
+            return entry
+
+        self.__remove(icao_code)
+        self.__entries[icao_code] = entry
+        self.size += entry.size
+
+        while self.size > self.max_bytes:
+            _, evicted = self.__entries.popitem(last=False)
+            self.size -= evicted.size
+
+        return entry
+
+    def __remove(self, icao_code: str) -> None:
+        entry = self.__entries.pop(icao_code, None)
+        if entry is not None:
+            self.size -= entry.size
+
+
+chart_cache = ChartCache()
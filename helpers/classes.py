@@ -8,6 +8,7 @@ from enum import StrEnum
 # By downloading, executing or otherwise transferring the contents of this repository by any means you are legally
 # bound to the terms stipulated in the license.
 
+from datetime import datetime
 from typing import Union, Optional, Any
 from pydantic import BaseModel
 
@@ -113,6 +114,16 @@ class Providers(StrEnum):
     vatsim = 'vatsim'
 
 
+class ExportFormat(StrEnum):
+    ndjson = 'ndjson'
+    sqlite = 'sqlite'
+
+
+class ExportCompression(StrEnum):
+    gzip = 'gzip'
+    zstd = 'zstd'
+
+
 class CoverageStatistics(BaseModel):
     """
     Represents a coverage object for a given provider
@@ -127,10 +138,162 @@ class CoverageStatistics(BaseModel):
     alternate_airports: Optional[list[str]]
 
 
+class CoverageGaps(BaseModel):
+    """
+    Represents the airports active on a provider that have no charts in the system
+
+    Attributes:
+        provider (Providers): The coverage provider
+        active (int): Number of departure, arrival and alternate airports active on the provider
+        airports (list[str]): ICAO codes of the active airports without charts, sorted
+    """
+    provider: Providers
+    active: int
+    airports: list[str]
+
+
+class AirportActivity(BaseModel):
+    """
+    Represents how often an airport was active on a provider over a window of time
+
+    Attributes:
+        icao_code (str): ICAO code of the airport
+        samples (int): Number of coverage snapshots the airport was active in
+        share (float): Share of the window's snapshots the airport was active in, between 0 and 1
+    """
+    icao_code: str
+    samples: int
+    share: float
+
+
+class CoverageRanking(BaseModel):
+    """
+    Represents the busiest airports on a provider over a window of time
+
+    Attributes:
+        provider (Providers): The coverage provider
+        window (str): The window, e.g. 7d or 12h
+        polls (int): Number of coverage snapshots recorded in the window
+        airports (list[AirportActivity]): Busiest airports first
+    """
+    provider: Providers
+    window: str
+    polls: int
+    airports: list[AirportActivity]
+
+
+class Airport(BaseModel):
+    """
+    Represents an airport with charts in the system
+
+    Attributes:
+        icao_code (str): ICAO code of the airport
+        chart_count (int): Number of charts for the airport
+        updated_at (datetime): Last time the airport's charts were updated
+        version (str): Content version of the airport's charts, changes whenever any of them changes
+    """
+    icao_code: str
+    chart_count: int
+    updated_at: datetime
+    version: Optional[str] = None
+
+
 # Typing
 
 AnyChart = Union[Chart, ApproachChart, DepartureChart, ArrivalChart, GroundChart]
 
 
+class AirportsCharts(BaseModel):
+    """
+    Represents the charts of several airports
+
+    Attributes:
+        charts (dict): Charts per ICAO code, either as a list or categorized by type
+        missing (list[str]): Requested ICAO codes that don't have any charts in the system
+    """
+    charts: Union[dict[str, list[AnyChart]], dict[str, dict[str, list[AnyChart]]]]
+    missing: list[str]
+
+
+class DatabaseHealth(BaseModel):
+    """
+    Represents the health of the worker's database connection pool
+
+    Attributes:
+        status (str): ok, degraded when the database answers slower than allowed, or down when it doesn't answer
+        latency_ms (float): Time taken to get a connection and run a trivial query, None when down
+        pool (dict[str, int]): Pool statistics as reported by psycopg_pool
+    """
+    status: str
+    latency_ms: Optional[float] = None
+    pool: dict[str, int]
+
+
+class SearchResults(BaseModel):
+    """
+    Represents a page of search results
+
+    Attributes:
+        charts (list[AnyChart]): Matching charts, best matches first
+        next (str): Cursor of the next page, None on the last page
+    """
+    charts: list[AnyChart]
+    next: Optional[str] = None
+
+
+class ChartChanges(BaseModel):
+    """
+    Represents one kind of change applied to the charts by a manifest
+
+    Attributes:
+        filenames (list[str]): Filenames of the changed charts
+        airports (set[str]): ICAO codes of the airports the changed charts belong to
+    """
+    filenames: list[str] = []
+    airports: set[str] = set()
+
+
+class ManifestChanges(BaseModel):
+    """
+    Represents the changes a manifest applied to the charts
+
+    Attributes:
+        codes (set[str]): ICAO codes present in the manifest
+        inserted (ChartChanges): Charts that didn't exist before
+        updated (ChartChanges): Charts whose contents changed, airports include the previous airport of moved charts
+        deleted (ChartChanges): Charts of the manifest's airports that are no longer in the manifest
+    """
+    codes: set[str] = set()
+    inserted: ChartChanges = ChartChanges()
+    updated: ChartChanges = ChartChanges()
+    deleted: ChartChanges = ChartChanges()
+
+    @property
+    def airports(self) -> set[str]:
+        return self.inserted.airports | self.updated.airports | self.deleted.airports
+
+
+class ChartFile(BaseModel):
+    """
+    Represents the file of a chart and the copy of it in the chart file store
+
+    Attributes:
+        filename (str): Filename of the chart file
+        icao_code (str): ICAO code of the airport the chart refers to
+        filetype (str): Mime-type of the chart file
+        source (Source): Source the file is fetched from
+        version (str): Content hash of the chart, the file is fetched again whenever it changes
+        digest (str): SHA-256 of the stored file, None when it hasn't been fetched for this version of the chart
+        size (int): Size of the stored file in bytes, None when it hasn't been fetched for this version of the chart
+    """
+    filename: str
+    icao_code: str
+    filetype: str
+    source: Source
+    version: str
+    digest: Optional[str] = None
+    size: Optional[int] = None
+
+
 class Manifest(BaseModel):
     charts: list[dict[str, Any]]
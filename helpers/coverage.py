@@ -1,14 +1,134 @@
 import random
-from typing import Optional, Any
+import time
+from typing import Callable, Optional, Any
 
-from fastapi import requests, HTTPException
-import requests
+import httpx
+import ijson
+import orjson
+from fastapi import HTTPException
 from helpers.classes import CoverageStatistics
+from helpers.feeds import FeedParser, VatsimFeedParser, PosconFeedParser, StpFeedParser
+from helpers.metrics import COVERAGE_FETCH_DURATION, COVERAGE_FETCH_BYTES
 
 VATSIM_STATUS_URL = 'https://status.vatsim.net/status.json'
 POSCON_DATA_ENDPOINT = 'https://hqapi.poscon.net/online.json'
 STP_DATA_ENDPOINT = 'https://simtoolkitpro.co.uk/api/flights.stkp'
 
+# @NOTE(Mauro): The VATSIM status file only lists the data feed mirrors, it changes very rarely so there's no need to
+#               fetch it before every data feed request
+VATSIM_STATUS_TTL = 3600
+
+TIMEOUTS = {
+    'vatsim': httpx.Timeout(10.0, connect=3.0),
+    'poscon': httpx.Timeout(5.0, connect=3.0),
+    'stp': httpx.Timeout(5.0, connect=3.0),
+}
+
+# @NOTE(Mauro): Feeds up to this many bytes are buffered and parsed whole, for the small POSCON and SimToolkitPro
+#               feeds that's several times faster than the incremental parsers and costs little memory at their
+#               size. The VATSIM feed is always streamed for memory, its scanner takes about as long as a whole
+#               parse with the standard library but peaks at a fraction of the memory
+STREAMING_THRESHOLDS = {
+    'vatsim': 0,
+    'poscon': 1024 * 1024,
+    'stp': 1024 * 1024,
+}
+
+client: Optional[httpx.AsyncClient] = None
+
+__vatsim_data_urls: list[str] = []
+__vatsim_data_urls_expiry: float = 0.0
+
+
+async def open_client() -> httpx.AsyncClient:
+    """Opens the shared keep-alive HTTP client used by every provider fetcher
+
+    Returns: httpx.AsyncClient
+    """
+    global client
+    if client is None:
+        client = httpx.AsyncClient(limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+                                   follow_redirects=True)
+    return client
+
+
+async def close_client() -> None:
+    """Closes the shared HTTP client"""
+    global client
+    if client is not None:
+        await client.aclose()
+        client = None
+
+
+async def __get(url: str, provider: str, detail: str) -> httpx.Response:
+    """Performs a GET request on the shared client, converting upstream failures into HTTP exceptions
+
+    Args:
+        url: URL to fetch
+        provider: Provider name used to pick the request timeout
+        detail: Error message returned to the client on failure
+
+    Returns: httpx.Response
+    Raises:
+        HTTPException: When the upstream can't be reached or doesn't answer with a 200
+    """
+    http = await open_client()
+    start = time.perf_counter()
+    try:
+        response = await http.get(url, timeout=TIMEOUTS[provider])
+    except httpx.HTTPError:
+        raise HTTPException(status_code=502, detail=detail)
+    finally:
+        COVERAGE_FETCH_DURATION.labels(provider).observe(time.perf_counter() - start)
+    COVERAGE_FETCH_BYTES.labels(provider).observe(len(response.content))
+
+    if response.status_code != 200:
+        raise HTTPException(status_code=response.status_code, detail=detail)
+
+    return response
+
+
+async def __stream(url: str, provider: str, detail: str, parser: FeedParser,
+                   parse: Callable[[Any], CoverageStatistics]) -> CoverageStatistics:
+    """Streams a feed on the shared client, only buffering the response body while it's under the provider's
+    streaming threshold
+
+    Args:
+        url: URL to fetch
+        provider: Provider name used to pick the request timeout and streaming threshold
+        detail: Error message returned to the client on failure
+        parser: Parser the response body is fed to once it's over the threshold
+        parse: Builds the statistics from the whole document when the body ends under the threshold
+
+    Returns: CoverageStatistics
+    Raises:
+        HTTPException: When the upstream can't be reached, doesn't answer with a 200 or sends malformed JSON
+    """
+    http = await open_client()
+    start = time.perf_counter()
+    size = 0
+    buffered: Optional[list[bytes]] = []
+    try:
+        async with http.stream('GET', url, timeout=TIMEOUTS[provider]) as response:
+            if response.status_code != 200:
+                raise HTTPException(status_code=response.status_code, detail=detail)
+            async for chunk in response.aiter_bytes():
+                size += len(chunk)
+                if buffered is not None:
+                    buffered.append(chunk)
+                    if size <= STREAMING_THRESHOLDS[provider]:
+                        continue
+                    chunk = b''.join(buffered)
+                    buffered = None
+                parser.feed(chunk)
+        statistics = parse(orjson.loads(b''.join(buffered))) if buffered is not None else parser.close()
+    except (httpx.HTTPError, ijson.JSONError, orjson.JSONDecodeError):
+        raise HTTPException(status_code=502, detail=detail)
+    finally:
+        COVERAGE_FETCH_DURATION.labels(provider).observe(time.perf_counter() - start)
+    COVERAGE_FETCH_BYTES.labels(provider).observe(size)
+    return statistics
+
 
 def __clean_array(a: list[str]) -> list[str]:
     """De-duplicates, ensures no empty values and that all array values have the length of 4
@@ -19,35 +139,50 @@ def __clean_array(a: list[str]) -> list[str]:
     return list(set([i for i in a if i and len(i) == 4]))
 
 
-def __get_vatsim_data_url() -> Optional[str]:
+async def __get_vatsim_data_url(status_url: str = VATSIM_STATUS_URL) -> Optional[str]:
     """Returns a valid random VATSIM data url
 
+    :param status_url: URL of the VATSIM status file
     :return: a valid VATSIM data URL
     """
 
     # @NOTE(Mauro): This is recommended practice as per the VATSIM developer information
     # ref: https://github.com/vatsimnetwork/developer-info/wiki/Data-Feeds
 
-    response = requests.get(VATSIM_STATUS_URL)
+    global __vatsim_data_urls, __vatsim_data_urls_expiry
 
-    if response.status_code != 200:
-        raise HTTPException(detail="Upstream failure fetching VATSIM data url", status_code=response.status_code)
+    if not __vatsim_data_urls or time.monotonic() >= __vatsim_data_urls_expiry:
+        response = await __get(status_url, 'vatsim', "Upstream failure fetching VATSIM data url")
+        __vatsim_data_urls = response.json()['data']['v3']
+        __vatsim_data_urls_expiry = time.monotonic() + VATSIM_STATUS_TTL
 
-    return random.choice(response.json()['data']['v3'])
+    return random.choice(__vatsim_data_urls)
 
 
-def get_vatsim_statistics() -> Optional[CoverageStatistics]:
+async def get_vatsim_statistics(status_url: str = VATSIM_STATUS_URL, streaming: bool = True) \
+        -> Optional[CoverageStatistics]:
     """Returns a valid statistics dict from VATSIM
 
+    :param status_url: URL of the VATSIM status file
+    :param streaming: Parse the feed incrementally instead of loading the whole document
     :return: A dict containing arrival, departure and alternate airport arrays
     """
 
-    response = requests.get(__get_vatsim_data_url())
+    url = await __get_vatsim_data_url(status_url)
+    detail = "Failure fetching VATSIM data JSON"
+
+    if streaming:
+        return await __stream(url, 'vatsim', detail, VatsimFeedParser(), parse_vatsim_json)
+
+    return parse_vatsim_json((await __get(url, 'vatsim', detail)).json())
 
-    if response.status_code != 200:
-        raise HTTPException(status_code=response.status_code, detail="Failure fetching VATSIM data JSON")
 
-    json = response.json()
+def parse_vatsim_json(json: dict[str, Any]) -> CoverageStatistics:
+    """Builds the VATSIM statistics from a fully loaded data feed
+
+    :param json: The VATSIM data feed
+    :return: A dict containing arrival, departure and alternate airport arrays
+    """
 
     departure_airports: list[str] = []
     arrival_airports: list[str] = []
@@ -72,18 +207,29 @@ def get_vatsim_statistics() -> Optional[CoverageStatistics]:
     })
 
 
-def get_poscon_statistics() -> Optional[CoverageStatistics]:
+async def get_poscon_statistics(url: str = POSCON_DATA_ENDPOINT, streaming: bool = True) \
+        -> Optional[CoverageStatistics]:
     """Returns a valid statistics dict from POSCON
 
+    :param url: URL of the POSCON data feed
+    :param streaming: Parse the feed incrementally instead of loading the whole document
     :return: A dict containing arrival, departure and alternate airport arrays
     """
 
-    response = requests.get(POSCON_DATA_ENDPOINT)
+    detail = "Failure fetching POSCON data JSON"
 
-    if response.status_code != 200:
-        raise HTTPException(status_code=response.status_code, detail="Failure fetching POSCON data JSON")
+    if streaming:
+        return await __stream(url, 'poscon', detail, PosconFeedParser(), parse_poscon_json)
+
+    return parse_poscon_json((await __get(url, 'poscon', detail)).json())
 
-    json = response.json()
+
+def parse_poscon_json(json: dict[str, Any]) -> CoverageStatistics:
+    """Builds the POSCON statistics from a fully loaded data feed
+
+    :param json: The POSCON data feed
+    :return: A dict containing arrival, departure and alternate airport arrays
+    """
 
     departure_airports: list[str] = []
     arrival_airports: list[str] = []
@@ -110,18 +256,28 @@ def get_poscon_statistics() -> Optional[CoverageStatistics]:
     })
 
 
-def get_stp_statistics() -> Optional[CoverageStatistics]:
+async def get_stp_statistics(url: str = STP_DATA_ENDPOINT, streaming: bool = True) -> Optional[CoverageStatistics]:
     """Returns a valid statistics dict from SimToolkitPro
 
+    :param url: URL of the SimToolkitPro data feed
+    :param streaming: Parse the feed incrementally instead of loading the whole document
     :return: A dict containing arrival, departure and alternate airport arrays
     """
 
-    response = requests.get(STP_DATA_ENDPOINT)
+    detail = "Failure fetching SimToolKitPro data JSON"
 
-    if response.status_code != 200:
-        raise HTTPException(status_code=response.status_code, detail="Failure fetching SimToolKitPro data JSON")
+    if streaming:
+        return await __stream(url, 'stp', detail, StpFeedParser(), parse_stp_json)
 
-    json: dict[str, list] = response.json()
+    return parse_stp_json((await __get(url, 'stp', detail)).json())
+
+
+def parse_stp_json(json: dict[str, list]) -> CoverageStatistics:
+    """Builds the SimToolkitPro statistics from a fully loaded data feed
+
+    :param json: The SimToolkitPro data feed
+    :return: A dict containing arrival, departure and alternate airport arrays
+    """
 
     departure_airports: list[str] = []
     arrival_airports: list[str] = []
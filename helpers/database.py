@@ -1,128 +1,754 @@
+import asyncio
 import json
-import os
-from typing import Any, Optional
+import re
+import time
+from contextlib import asynccontextmanager
+from datetime import timedelta
+from functools import partial
+from typing import AsyncIterator, Optional
 import psycopg
+from psycopg.types.json import Json
 from psycopg_pool import AsyncConnectionPool
-from helpers.classes import AnyChart
-from helpers.exceptions import NoChartsForAirport
-from helpers.factories import chart_factory
 
-DATABASE_URL = os.environ.get('DATABASE_URL')
+import config
+from helpers.cache import chart_cache, CacheEntry
+from helpers.classes import AnyChart, Airport, ChartChanges, ManifestChanges, ChartFile
+from helpers.exceptions import NoChartsForAirport, SearchTimedOut
+from helpers.factories import trusted_chart_factory, ROW_COLUMNS
+from helpers.metrics import DATABASE_FUNCTION_DURATION, POOL_WAIT, CHART_FACTORY_DURATION
+from helpers.migrations import migrate, enable_trigrams
+from helpers.singleflight import SingleFlight
 
-pool = AsyncConnectionPool(DATABASE_URL, open=False)
+# @NOTE(Mauro): The pool is created on import, before the app's settings are loaded, so it only reads the database
+#               settings which all have defaults
+database_settings = config.DatabaseSettings()
+
+DATABASE_URL = database_settings.database_url
+
+pool = AsyncConnectionPool(
+    DATABASE_URL,
+    open=False,
+    min_size=database_settings.database_pool_min_size,
+    max_size=database_settings.database_pool_max_size,
+    max_idle=database_settings.database_pool_max_idle,
+    max_lifetime=database_settings.database_pool_max_lifetime,
+    # The statement timeout is sent with the startup packet so it doesn't cost a round trip per connection
+    kwargs={'options': f'-c statement_timeout={database_settings.database_statement_timeout_ms}'}
+    if database_settings.database_statement_timeout_ms else None,
+)
+
+# @NOTE(Mauro): The hot read queries are executed with prepare=True so they're prepared on their first execution
+#               instead of psycopg's default of the fifth, every connection in the pool would plan them five times
+
+CHART_COLUMNS = ROW_COLUMNS
+
+# Channel every write to the charts is announced on, see helpers/invalidation.py
+INVALIDATION_CHANNEL = 'chart_invalidations'
+# @NOTE(Mauro): NOTIFY payloads must be under 8000 bytes, announcements with more codes than fit tell the listeners
+#               to drop everything instead
+MAX_NOTIFY_PAYLOAD = 7900
+
+chart_loads = SingleFlight('charts')
+
+# Whether pg_trgm is installed, set on startup, without it searches that match nothing aren't retried by similarity
+similarity_search = False
+
+
+def chart_hash(alias: str) -> str:
+    """Returns the SQL expression hashing the contents of a chart row
+
+    Must stay in sync with the "Hash chart contents" migration, rows hashed differently look changed to apply_charts.
+
+    Args:
+        alias: Table name or alias the columns belong to
+
+    Returns: str
+    """
+    columns = ', '.join(f'{alias}.{column}::text' if column == 'source' else f'{alias}.{column}'
+                        for column in CHART_COLUMNS)
+    return f'md5(ROW({columns})::text)'
 
 
 # Create decorators
 
-def database_function(func):
+def database_function(func=None, *, read_only: bool = False):
     """
     Decorator to handle connection pooling
+
+    Read only functions run in autocommit mode, which saves the BEGIN and COMMIT round trips, and must not rely on
+    anything that is scoped to a transaction.
     """
+    if func is None:
+        return partial(database_function, read_only=read_only)
+
+    duration = DATABASE_FUNCTION_DURATION.labels(func.__name__)
 
     async def decorate(*args, **kwargs):
-        async with pool.connection() as connection:
-            cursor = connection.cursor()
-            value = await func(cursor, *args, **kwargs)
-            await connection.commit()
-            await cursor.close()
-        return value
+        start = time.perf_counter()
+        try:
+            async with pool.connection() as connection:
+                POOL_WAIT.observe(time.perf_counter() - start)
+                if read_only:
+                    await connection.set_autocommit(True)
+                try:
+                    cursor = connection.cursor()
+                    value = await func(cursor, *args, **kwargs)
+                    await connection.commit()
+                    await cursor.close()
+                finally:
+                    if read_only and not connection.closed:
+                        await connection.set_autocommit(False)
+            return value
+        finally:
+            duration.observe(time.perf_counter() - start)
 
     return decorate
 
 
+async def ping_database(timeout: float) -> float:
+    """Measures how long it takes to get a connection from the pool and run a trivial query on it
+
+    Args:
+        timeout: Seconds to wait for a connection
+
+    Returns: float seconds
+    Raises:
+        psycopg_pool.PoolTimeout: When no connection is available within timeout
+        psycopg.Error: When the query fails
+    """
+    start = time.perf_counter()
+    async with pool.connection(timeout=timeout) as connection:
+        await connection.execute('SELECT 1', prepare=True)
+    return time.perf_counter() - start
+
+
 @database_function
 async def __initialize_database(cursor: psycopg.AsyncCursor) -> None:
-    await cursor.execute("""CREATE TABLE IF NOT EXISTS charts(
-                            title TEXT NOT NULL,
-                            type TEXT NOT NULL,
-                            filename TEXT NOT NULL UNIQUE,
-                            filetype TEXT NOT NULL,
-                            source JSON NOT NULL,
-                            icao_code TEXT NOT NULL,
-                            subtype TEXT,
-                            runways TEXT[],
-                            sids TEXT[],
-                            stars TEXT[])""")
+    global similarity_search
+    await migrate(cursor)
+    similarity_search = await enable_trigrams(cursor)
+
+
+async def __refresh_airports(cursor: psycopg.AsyncCursor, icao_codes: set[str]) -> None:
+    """Brings the airport registry up to date with the charts table for the given ICAO codes, bumps the dataset
+    version and announces the change to every worker
+
+    Args:
+        icao_codes: ICAO codes whose charts changed
+
+    """
+    codes = list(icao_codes)
+    await cursor.execute("DELETE FROM airports WHERE icao_code = ANY(%s) AND NOT EXISTS "
+                         "(SELECT 1 FROM charts WHERE charts.icao_code = airports.icao_code)", (codes,))
+    await cursor.execute("INSERT INTO airports(icao_code, chart_count, updated_at, version) "
+                         "SELECT icao_code, COUNT(*), now(), "
+                         "md5(string_agg(hash, ',' ORDER BY filename)) "
+                         "FROM charts WHERE icao_code = ANY(%s) GROUP BY icao_code ON CONFLICT (icao_code) DO UPDATE "
+                         "SET chart_count = EXCLUDED.chart_count, updated_at = EXCLUDED.updated_at, "
+                         "version = EXCLUDED.version", (codes,))
+    await cursor.execute("UPDATE dataset SET version = version + 1, updated_at = now() RETURNING version")
+    version = (await cursor.fetchone())[0]
+
+    # @NOTE(Mauro): Notifications are only delivered when the transaction commits, a rolled back write announces nothing
+    payload = json.dumps({'version': version, 'codes': sorted(icao_codes)})
+    if len(payload) > MAX_NOTIFY_PAYLOAD:
+        payload = json.dumps({'version': version, 'codes': None})
+    await cursor.execute("SELECT pg_notify(%s, %s)", (INVALIDATION_CHANNEL, payload))
 
 
 @database_function
-async def insert_or_update_chart(cursor: psycopg.AsyncCursor, chart: AnyChart) -> None:
-    """Duplicate-safe way of inserting and updating charts in the database if a chart exists it will be updated
+async def apply_charts(cursor: psycopg.AsyncCursor, charts: list[AnyChart]) -> ManifestChanges:
+    """Brings the charts of the airports present in charts up to date with them in a single transaction
 
-    Parameters
-    ----------
-    cursor : psycopg.AsyncCursor
-    chart : AnyChart
+    The charts are copied into a staging table and diffed against the stored ones by filename and content hash, only
+    the charts that were inserted, changed or removed from the manifest's airports are written. Readers either see the
+    previous charts or the new ones but never a partial state. If a filename appears more than once the last
+    occurrence wins.
 
-    Returns
-    -------
+    Args:
+        charts: Validated charts from the manifest
 
+    Returns: ManifestChanges the changed filenames and airports per kind of change
     """
+    await __create_staging(cursor)
+    await __stage_charts(cursor, charts)
+    return await __apply_staging(cursor)
 
-    def __clean_class_dump(dirty: AnyChart) -> dict[str, Any]:
-        dump = dirty.model_dump()
-        optional_keys = ['subtype', 'sids', 'stars', 'runways']
-        for key in optional_keys:
-            if key not in dump.keys():
-                dump[key] = None
-        dump['source'] = json.dumps(dump['source'])
-        return dump
 
-    clean_dump = __clean_class_dump(chart)
+@database_function
+async def apply_chart_batches(cursor: psycopg.AsyncCursor, batches: AsyncIterator[list[AnyChart]]) -> ManifestChanges:
+    """Same as apply_charts but for a manifest that arrives in batches, only one batch is held in memory at a time
+
+    Every batch is copied into the staging table as it arrives and the diff is applied once the last one is in, in
+    the same transaction. If reading a batch fails nothing is applied.
+
+    Args:
+        batches: Batches of validated charts from the manifest
 
-    await cursor.execute("SELECT COUNT(*) FROM charts WHERE filename=%s", (chart.filename,))
-    count = (await cursor.fetchone())[0]
-    if count == 1:  # Does the  chart already exist in the table?
+    Returns: ManifestChanges the changed filenames and airports per kind of change
+    """
+    await __create_staging(cursor)
+    async for batch in batches:
+        await __stage_charts(cursor, batch)
+    return await __apply_staging(cursor)
 
-        await cursor.execute("UPDATE charts SET title=%(title)s, type=%(type)s, filename=%(filename)s, filetype=%("
-                             "filetype)s, source=%(source)s, icao_code=%(icao_code)s, subtype=%(subtype)s, "
-                             "runways=%(runways)s, sids=%(sids)s, stars=%(stars)s WHERE filename=%(filename)s",
-                             clean_dump)
-    elif count > 1:  # Are there duplicates? If so remove and re-insert
-        await cursor.execute("DELETE FROM charts WHERE filename=%s", (chart.filename,))
-        await insert_or_update_chart(chart)
-    else:  # If the chart doesn't exist, insert it
-        await cursor.execute("INSERT INTO charts(title, type, filename, filetype, source, icao_code, subtype,"
-                             "runways, sids, stars) VALUES (%(title)s, %(type)s, %(filename)s, %(filetype)s,"
-                             " %(source)s, %(icao_code)s, %(subtype)s, %(runways)s, %(sids)s, %(stars)s)", clean_dump)
 
+async def __create_staging(cursor: psycopg.AsyncCursor) -> None:
+    # @NOTE(Mauro): The position keeps the order charts were staged in so the last occurrence of a filename wins
+    await cursor.execute("CREATE TEMPORARY TABLE charts_staging (LIKE charts, position BIGSERIAL) ON COMMIT DROP")
 
-@database_function
-async def get_charts_by_icao_code(cursor: psycopg.AsyncCursor, icao_code: str) -> list[AnyChart]:
-    """Returns a list of charts per ICAO code
+
+async def __stage_charts(cursor: psycopg.AsyncCursor, charts: list[AnyChart]) -> None:
+    async with cursor.copy(f"COPY charts_staging({', '.join(CHART_COLUMNS)}) FROM STDIN") as copy:
+        for chart in charts:
+            await copy.write_row(__chart_row(chart))
+
+
+async def __apply_staging(cursor: psycopg.AsyncCursor) -> ManifestChanges:
+    """Diffs the staged charts against the stored ones and writes the differences
+
+    Returns: ManifestChanges
+    """
+    await cursor.execute("DELETE FROM charts_staging duplicate USING charts_staging latest "
+                         "WHERE duplicate.filename = latest.filename AND duplicate.position < latest.position")
+    await cursor.execute("CREATE UNIQUE INDEX ON charts_staging (filename)")
+    await cursor.execute("ANALYZE charts_staging")
+    await cursor.execute("SELECT DISTINCT icao_code FROM charts_staging")
+    changes = ManifestChanges(codes={row[0] for row in await cursor.fetchall()})
+
+    columns = ', '.join(CHART_COLUMNS)
+
+    await cursor.execute("DELETE FROM charts WHERE icao_code = ANY(%s) AND NOT EXISTS "
+                         "(SELECT 1 FROM charts_staging WHERE charts_staging.filename = charts.filename) "
+                         "RETURNING filename, icao_code", (list(changes.codes),))
+    __record_changes(changes.deleted, await cursor.fetchall())
+
+    # @NOTE(Mauro): Charts may move between airports, the CTE still sees the rows before the update so the airport
+    #               a moved chart left is reported as changed too
+    assignments = ', '.join(f'{column} = charts_staging.{column}' for column in CHART_COLUMNS)
+    await cursor.execute(f"WITH changed AS (SELECT charts.filename, charts.icao_code FROM charts "
+                         f"JOIN charts_staging USING (filename) "
+                         f"WHERE charts.hash IS DISTINCT FROM {chart_hash('charts_staging')}) "
+                         f"UPDATE charts SET {assignments}, hash = {chart_hash('charts_staging')} "
+                         f"FROM charts_staging JOIN changed USING (filename) "
+                         f"WHERE charts.filename = charts_staging.filename "
+                         f"RETURNING charts.filename, charts.icao_code, changed.icao_code")
+    rows = await cursor.fetchall()
+    __record_changes(changes.updated, rows)
+    changes.updated.airports.update(row[2] for row in rows)
+
+    await cursor.execute(f"INSERT INTO charts({columns}, hash) SELECT {columns}, {chart_hash('charts_staging')} "
+                         f"FROM charts_staging WHERE NOT EXISTS "
+                         f"(SELECT 1 FROM charts WHERE charts.filename = charts_staging.filename) "
+                         f"RETURNING filename, icao_code")
+    __record_changes(changes.inserted, await cursor.fetchall())
+
+    if changes.airports:
+        await __refresh_airports(cursor, changes.airports)
+    return changes
+
+
+def __record_changes(changes: ChartChanges, rows: list[tuple]) -> None:
+    """Adds the filename and ICAO code of every returned row to changes
+
+    Args:
+        changes: Changes to add to
+        rows: Rows starting with the filename and ICAO code of a chart
+
+    """
+    for row in rows:
+        changes.filenames.append(row[0])
+        changes.airports.add(row[1])
+
+
+def __chart_row(chart: AnyChart) -> tuple:
+    """Converts a chart into a tuple ordered as CHART_COLUMNS, ready to be copied into the database
+
+    Args:
+        chart: The chart to convert
+
+    Returns: tuple
+    """
+    dump = chart.model_dump()
+    return tuple(Json(dump[column]) if column == 'source' else dump.get(column) for column in CHART_COLUMNS)
+
+
+@database_function(read_only=True)
+async def fetch_charts_by_icao_code(cursor: psycopg.AsyncCursor, icao_code: str) -> tuple[list[AnyChart], str]:
+    """Returns a list of charts per ICAO code and their content version straight from the database, bypassing the
+    chart cache
 
     Args:
         icao_code: The four letter ICAO code to search by
 
-    Returns: list[AnyChart]
+    Returns: tuple[list[AnyChart], str]
     Raises:
         NoChartsForAirport: When no charts are found for that ICAO code
 
     """
-    await cursor.execute('SELECT * FROM charts WHERE icao_code=%s', (icao_code,))
+    # @NOTE(Mauro): The version is read in the same statement as the charts so both come from the same snapshot
+    await cursor.execute(f'SELECT {", ".join(CHART_COLUMNS)}, (SELECT version FROM airports WHERE icao_code=%s) '
+                         f'FROM charts WHERE icao_code=%s', (icao_code, icao_code), prepare=True)
     result_set = await cursor.fetchall()
     if not result_set:
         raise NoChartsForAirport(icao_code)
 
-    return [chart_factory(data) for data in result_set]
+    with CHART_FACTORY_DURATION.time():
+        charts = [trusted_chart_factory(data) for data in result_set]
+    return charts, result_set[0][-1]
+
+
+async def get_airport_charts(icao_code: str) -> CacheEntry:
+    """Returns the charts of an airport and their content version, served from the chart cache when possible
+
+    Args:
+        icao_code: The four letter ICAO code to search by
+
+    Returns: CacheEntry
+    Raises:
+        NoChartsForAirport: When no charts are found for that ICAO code
+
+    """
+    entry = chart_cache.get(icao_code)
+    if entry is None:
+        # @NOTE(Mauro): Every request for an airport that isn't cached would otherwise take its own connection to
+        #               load the same charts, the first one loads them and the rest wait for it. Loads are keyed by
+        #               the cache generation too, a request that comes in after an invalidation must not get the charts
+        #               of a load that started before it
+        generation = chart_cache.generation
+        entry = await chart_loads.do((icao_code, generation), partial(__load_airport_charts, icao_code, generation))
+
+    if entry.charts is None:
+        raise NoChartsForAirport(icao_code)
+    return entry
+
+
+async def __load_airport_charts(icao_code: str, generation: int) -> CacheEntry:
+    """Loads the charts of an airport into the chart cache, airports without charts are cached too
+
+    Args:
+        icao_code: The four letter ICAO code to load
+        generation: Cache generation the load is keyed by, read when the load was requested rather than when its task
+                    first runs, an invalidation in between would otherwise go unnoticed
+
+    Returns: CacheEntry
+    """
+    try:
+        charts, version = await fetch_charts_by_icao_code(icao_code)
+    except NoChartsForAirport:
+        return chart_cache.put(icao_code, None, generation=generation)
+    return (await chart_cache.fill({icao_code: (charts, version)}, generation))[icao_code]
+
+
+@database_function(read_only=True)
+async def fetch_charts_by_procedure(cursor: psycopg.AsyncCursor, name: str) -> list[AnyChart]:
+    """Returns every chart that lists a SID or STAR, across all airports
+
+    Args:
+        name: Name of the SID or STAR, e.g. LISB5N
+
+    Returns: list[AnyChart] ordered by ICAO code and filename
+    """
+
+    # @NOTE(Mauro): Array containment is what the GIN indexes on sids and stars support, the two conditions are
+    #               combined with a bitmap OR instead of scanning the table
+    await cursor.execute(f'SELECT {", ".join(CHART_COLUMNS)} FROM charts '
+                         f'WHERE sids @> ARRAY[%(name)s]::TEXT[] OR stars @> ARRAY[%(name)s]::TEXT[] '
+                         f'ORDER BY icao_code, filename', {'name': name}, prepare=True)
+    return [trusted_chart_factory(row) for row in await cursor.fetchall()]
 
 
 @database_function
+async def search_charts(cursor: psycopg.AsyncCursor, query: str, limit: int, after: Optional[tuple[float, str]] = None,
+                        timeout_ms: int = 500) -> list[tuple[AnyChart, float]]:
+    """Returns the charts whose ICAO code, procedures, title or subtype match a query, best matches first
+
+    Every word of the query has to match the start of a word of the chart so partial words match as they're typed.
+    When nothing matches, and pg_trgm is installed, charts are ranked by trigram similarity to the query instead so
+    misspelled queries still find something. Ties are broken by filename which makes (score, filename) a stable keyset
+    to paginate on.
+
+    Args:
+        query: Text to search for
+        limit: Maximum number of charts to return
+        after: Score and filename of the last chart of the previous page
+        timeout_ms: Statement timeout of the search
+
+    Returns: list[tuple[AnyChart, float]] of charts and their score
+    Raises:
+        SearchTimedOut: When the search takes longer than timeout_ms
+    """
+    vector = 'chart_search_vector(title, icao_code, subtype, sids, stars)'
+    text = 'chart_search_text(title, icao_code, subtype, sids, stars)'
+    words = re.findall(r'[^\W_]+', query.lower())
+    if not words:
+        return []
+
+    # @NOTE(Mauro): The words only have letters and digits so they can't break the tsquery syntax
+    parameters = {'query': ' & '.join(f'{word}:*' for word in words), 'text': ' '.join(words), 'limit': limit}
+    keyset = ''
+    if after:
+        keyset = 'WHERE score < %(score)s OR (score = %(score)s AND filename > %(filename)s)'
+        parameters.update(score=after[0], filename=after[1])
+
+    await cursor.execute("SELECT set_config('statement_timeout', %s, true)", (str(timeout_ms),))
+    try:
+        # @NOTE(Mauro): The vector is spelled out like in charts_search_idx so the planner matches the index. ts_rank
+        #               is a real whose text form is rounded, as a double precision it survives the round trip through
+        #               the cursor and compares equal to itself on the next page
+        rows = await __search_page(cursor, f"ts_rank({vector}, to_tsquery('simple', %(query)s))::FLOAT8",
+                                   f"{vector} @@ to_tsquery('simple', %(query)s)", keyset, parameters)
+        # @NOTE(Mauro): An empty later page only means the prefix matches ran out, the similarity ranking is only used
+        #               when the query has no prefix matches at all so the pages of a search never mix the two
+        if not rows and similarity_search and (after is None or not await __has_row(
+                cursor, f"SELECT 1 FROM charts WHERE {vector} @@ to_tsquery('simple', %(query)s)", parameters)):
+            rows = await __search_page(cursor, f'word_similarity(%(text)s, {text})::FLOAT8', f'%(text)s <%% {text}',
+                                       keyset, parameters)
+    except psycopg.errors.QueryCanceled:
+        raise SearchTimedOut(timeout_ms)
+    return [(trusted_chart_factory(row), row[-1]) for row in rows]
+
+
+async def __search_page(cursor: psycopg.AsyncCursor, score: str, condition: str, keyset: str,
+                        parameters: dict) -> list[tuple]:
+    await cursor.execute(f'SELECT * FROM (SELECT {", ".join(CHART_COLUMNS)}, {score} AS score FROM charts '
+                         f'WHERE {condition}) matches {keyset} ORDER BY score DESC, filename LIMIT %(limit)s',
+                         parameters)
+    return await cursor.fetchall()
+
+
+async def __has_row(cursor: psycopg.AsyncCursor, query: str, parameters: dict) -> bool:
+    await cursor.execute(f'SELECT EXISTS ({query})', parameters)
+    return (await cursor.fetchone())[0]
+
+
+@database_function(read_only=True)
+async def fetch_charts_by_icao_codes(cursor: psycopg.AsyncCursor, icao_codes: list[str]) \
+        -> dict[str, tuple[list[AnyChart], str]]:
+    """Returns the charts and content version of several airports in a single query, bypassing the chart cache
+
+    Args:
+        icao_codes: The four letter ICAO codes to search by
+
+    Returns: dict[str, tuple[list[AnyChart], str]] airports without charts are left out
+    """
+    await cursor.execute(f'SELECT {", ".join(CHART_COLUMNS)}, (SELECT version FROM airports '
+                         f'WHERE airports.icao_code = charts.icao_code) FROM charts WHERE icao_code = ANY(%s)',
+                         (icao_codes,), prepare=True)
+
+    # @NOTE(Mauro): A request for many airports can bring back thousands of rows, building them in a worker thread
+    #               lets the loop keep answering the airports that are already cached
+    return await asyncio.to_thread(__group_charts, await cursor.fetchall())
+
+
+def __group_charts(rows: list[tuple]) -> dict[str, tuple[list[AnyChart], str]]:
+    """Builds the charts of several airports from rows ending in the airport's content version
+
+    Args:
+        rows: Rows of CHART_COLUMNS followed by the content version
+
+    Returns: dict[str, tuple[list[AnyChart], str]]
+    """
+    airports: dict[str, tuple[list[AnyChart], str]] = {}
+    with CHART_FACTORY_DURATION.time():
+        for data in rows:
+            chart = trusted_chart_factory(data)
+            if chart.icao_code in airports:
+                airports[chart.icao_code][0].append(chart)
+            else:
+                airports[chart.icao_code] = ([chart], data[-1])
+    return airports
+
+
+async def get_airports_charts(icao_codes: list[str]) -> tuple[dict[str, CacheEntry], list[str]]:
+    """Returns the charts of several airports, served from the chart cache when possible and otherwise loaded with a
+    single query
+
+    Args:
+        icao_codes: The four letter ICAO codes to search by
+
+    Returns: tuple[dict[str, CacheEntry], list[str]] the entries of the airports with charts, in the order they were
+             requested, and the ICAO codes without charts
+    """
+    entries = {icao_code: chart_cache.get(icao_code) for icao_code in icao_codes}
+
+    misses = [icao_code for icao_code, entry in entries.items() if entry is None]
+    if misses:
+        generation = chart_cache.generation
+        airports = await fetch_charts_by_icao_codes(misses)
+        loaded = {icao_code: airports.get(icao_code, (None, None)) for icao_code in misses}
+        entries.update(await chart_cache.fill(loaded, generation))
+
+    found = {icao_code: entry for icao_code, entry in entries.items() if entry.charts is not None}
+    return found, [icao_code for icao_code, entry in entries.items() if entry.charts is None]
+
+
+async def get_airport_version(icao_code: str) -> Optional[str]:
+    """Returns the content version of an airport's charts without loading them
+
+    Args:
+        icao_code: The four letter ICAO code to search by
+
+    Returns: Optional[str], None when the airport has no charts
+    """
+    entry = chart_cache.get(icao_code)
+    if entry is not None:
+        return entry.version
+    return await fetch_airport_version(icao_code)
+
+
+@database_function(read_only=True)
+async def fetch_airport_version(cursor: psycopg.AsyncCursor, icao_code: str) -> Optional[str]:
+    """Returns the content version of an airport's charts straight from the airport registry
+
+    Args:
+        icao_code: The four letter ICAO code to search by
+
+    Returns: Optional[str], None when the airport has no charts
+    """
+    await cursor.execute('SELECT version FROM airports WHERE icao_code=%s', (icao_code,), prepare=True)
+    row = await cursor.fetchone()
+    return row[0] if row else None
+
+
+@database_function(read_only=True)
+async def get_dataset_version(cursor: psycopg.AsyncCursor) -> int:
+    """Returns the dataset version, it changes every time charts are written
+
+    Returns: int
+    """
+    await cursor.execute('SELECT version FROM dataset', prepare=True)
+    return (await cursor.fetchone())[0]
+
+
+@asynccontextmanager
+async def chart_snapshot(batch_size: int) -> AsyncIterator[tuple[int, AsyncIterator[list[AnyChart]]]]:
+    """Reads every chart in batches from a consistent snapshot of the database, together with the dataset version of
+    that snapshot
+
+    The charts are read through a server-side cursor so only one batch is held in memory at a time. The connection is
+    held until the context exits.
+
+    Args:
+        batch_size: Number of charts read per round trip
+
+    Returns: AsyncIterator[tuple[int, AsyncIterator[list[AnyChart]]]] the dataset version and the batches of charts,
+             ordered by ICAO code and filename
+    """
+    duration = DATABASE_FUNCTION_DURATION.labels('chart_snapshot')
+    start = time.perf_counter()
+    try:
+        async with pool.connection() as connection:
+            POOL_WAIT.observe(time.perf_counter() - start)
+            # @NOTE(Mauro): Repeatable read makes the version and every batch come from the same snapshot even if an
+            #               update commits while the charts are being read
+            async with connection.transaction():
+                await connection.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY')
+                version = (await (await connection.execute('SELECT version FROM dataset')).fetchone())[0]
+                async with connection.cursor(name='chart_snapshot') as cursor:
+                    await cursor.execute(f'SELECT {", ".join(CHART_COLUMNS)} FROM charts ORDER BY icao_code, filename')
+
+                    async def batches() -> AsyncIterator[list[AnyChart]]:
+                        while rows := await cursor.fetchmany(batch_size):
+                            yield [trusted_chart_factory(row) for row in rows]
+
+                    yield version, batches()
+    finally:
+        duration.observe(time.perf_counter() - start)
+
+
+@database_function(read_only=True)
 async def get_icao_codes(cursor: psycopg.AsyncCursor) -> set[str]:
     """Returns a unique list of ICAO codes registered in the system
 
     Returns: set[str]
     """
-    await cursor.execute('SELECT icao_code FROM charts')
+    await cursor.execute('SELECT icao_code FROM airports')
     return set([i[0] for i in await cursor.fetchall()])
 
 
+@database_function(read_only=True)
+async def get_airports(cursor: psycopg.AsyncCursor) -> list[Airport]:
+    """Returns every airport registered in the system with its chart count and last update, sorted by ICAO code
+
+    Returns: list[Airport]
+    """
+    await cursor.execute('SELECT icao_code, chart_count, updated_at, version FROM airports ORDER BY icao_code')
+    return [Airport(icao_code=i[0], chart_count=i[1], updated_at=i[2], version=i[3]) for i in await cursor.fetchall()]
+
+
+CHART_FILE_COLUMNS = ('charts.filename, charts.icao_code, charts.filetype, charts.source, charts.hash, '
+                      'chart_files.digest, chart_files.size')
+# @NOTE(Mauro): The stored file is only joined if it was fetched for the current version of the chart, otherwise the
+#               chart comes back without a digest and its file is fetched again
+CHART_FILE_JOIN = ('charts LEFT JOIN chart_files ON chart_files.filename = charts.filename '
+                   'AND chart_files.version = charts.hash')
+
+
+def __chart_file(row: tuple) -> ChartFile:
+    return ChartFile(filename=row[0], icao_code=row[1], filetype=row[2], source=row[3], version=row[4],
+                     digest=row[5], size=row[6])
+
+
+@database_function(read_only=True)
+async def fetch_chart_file(cursor: psycopg.AsyncCursor, icao_code: str, filename: str) -> Optional[ChartFile]:
+    """Returns the file of an airport's chart and where it's stored, if it is
+
+    Args:
+        icao_code: The four letter ICAO code of the airport
+        filename: Filename of the chart
+
+    Returns: Optional[ChartFile], None when the airport has no chart with that filename
+    """
+    await cursor.execute(f'SELECT {CHART_FILE_COLUMNS} FROM {CHART_FILE_JOIN} '
+                         f'WHERE charts.filename=%s AND charts.icao_code=%s', (filename, icao_code), prepare=True)
+    row = await cursor.fetchone()
+    return __chart_file(row) if row else None
+
+
+@database_function(read_only=True)
+async def fetch_cached_chart_files(cursor: psycopg.AsyncCursor, filenames: list[str]) -> list[ChartFile]:
+    """Returns the files of the given charts whose source is cached by LibreCharts
+
+    Args:
+        filenames: Filenames of the charts
+
+    Returns: list[ChartFile] charts that don't exist or aren't cached are left out
+    """
+    await cursor.execute(f"SELECT {CHART_FILE_COLUMNS} FROM {CHART_FILE_JOIN} WHERE charts.filename = ANY(%s) "
+                         f"AND COALESCE((charts.source->>'cached')::BOOLEAN, TRUE)", (filenames,))
+    return [__chart_file(row) for row in await cursor.fetchall()]
+
+
 @database_function
-async def delete_charts_with_icao_code(cursor: psycopg.AsyncCursor, icao_code: str) -> None:
-    """Deletes all charstfor a given ICAO code
+async def save_chart_file(cursor: psycopg.AsyncCursor, filename: str, version: str, digest: str, size: int) -> bool:
+    """Records the stored file of a chart
+
+    Nothing is recorded if the chart changed or was removed while its file was being fetched.
 
     Args:
-        icao_code: The four letter ICAO code to search by
+        filename: Filename of the chart
+        version: Content hash of the chart the file was fetched for
+        digest: SHA-256 of the stored file
+        size: Size of the stored file in bytes
 
+    Returns: bool whether the file was recorded
     """
-    await cursor.execute('DELETE FROM charts WHERE icao_code=%s', (icao_code,))
+    await cursor.execute("INSERT INTO chart_files(filename, version, digest, size) "
+                         "SELECT filename, hash, %s, %s FROM charts WHERE filename=%s AND hash=%s "
+                         "ON CONFLICT (filename) DO UPDATE SET version = EXCLUDED.version, digest = EXCLUDED.digest, "
+                         "size = EXCLUDED.size, fetched_at = now()", (digest, size, filename, version))
+    return cursor.rowcount > 0
+
+
+# @NOTE(Mauro): Buckets are truncated in UTC so a day bucket is the same day for every worker whatever its time zone
+HOUR_BUCKET = "date_trunc('hour', to_timestamp(%(sampled_at)s), 'UTC')"
+
+
+@database_function
+async def record_coverage(cursor: psycopg.AsyncCursor, provider: str, sampled_at: float, slot: int,
+                          icao_codes: list[str], hourly_retention_hours: int, daily_retention_days: int) -> bool:
+    """Counts the airports active in a coverage snapshot into the hour it was taken in
+
+    Every worker polls the providers, only the first snapshot of each sampling slot is recorded so the history
+    doesn't depend on the number of workers. When an hour starts the hours past the hourly retention are rolled up
+    into days and the days past the daily retention are dropped.
+
+    Args:
+        provider: The coverage provider
+        sampled_at: Unix timestamp of when the snapshot was fetched
+        slot: Sampling slot the snapshot belongs to, increasing with time
+        icao_codes: ICAO codes of the active airports
+        hourly_retention_hours: Hours kept at an hourly resolution
+        daily_retention_days: Days kept at a daily resolution
+
+    Returns: bool whether the snapshot was recorded, False when its slot already was
+    """
+    parameters = {'provider': provider, 'sampled_at': sampled_at, 'slot': slot, 'codes': icao_codes}
+    await cursor.execute(f"INSERT INTO coverage_polls(provider, resolution, bucket, polls, last_slot) "
+                         f"VALUES (%(provider)s, 'hour', {HOUR_BUCKET}, 1, %(slot)s) "
+                         f"ON CONFLICT (provider, resolution, bucket) DO UPDATE "
+                         f"SET polls = coverage_polls.polls + 1, last_slot = EXCLUDED.last_slot "
+                         f"WHERE coverage_polls.last_slot < EXCLUDED.last_slot RETURNING polls", parameters)
+    row = await cursor.fetchone()
+    if row is None:
+        return False
+
+    # @NOTE(Mauro): Only the codes that aren't interned yet are inserted, a conflicting insert would still use up an
+    #               id of the sequence on every snapshot
+    await cursor.execute("INSERT INTO coverage_airports(icao_code) SELECT code FROM unnest(%(codes)s::TEXT[]) code "
+                         "WHERE NOT EXISTS (SELECT 1 FROM coverage_airports WHERE icao_code = code) "
+                         "ON CONFLICT DO NOTHING", parameters)
+    await cursor.execute(f"INSERT INTO coverage_history(provider, resolution, bucket, airport_id, samples) "
+                         f"SELECT %(provider)s, 'hour', {HOUR_BUCKET}, id, 1 FROM coverage_airports "
+                         f"WHERE icao_code = ANY(%(codes)s) ON CONFLICT (provider, resolution, bucket, airport_id) "
+                         f"DO UPDATE SET samples = coverage_history.samples + 1", parameters)
+
+    if row[0] == 1:
+        await __downsample_coverage(cursor, provider, sampled_at, hourly_retention_hours, daily_retention_days)
+    return True
+
+
+async def __downsample_coverage(cursor: psycopg.AsyncCursor, provider: str, sampled_at: float,
+                                hourly_retention_hours: int, daily_retention_days: int) -> None:
+    """Rolls the hours of a provider's coverage history past the hourly retention up into days and drops the days
+    past the daily retention
+
+    Args:
+        provider: The coverage provider
+        sampled_at: Unix timestamp the retentions are counted back from
+        hourly_retention_hours: Hours kept at an hourly resolution
+        daily_retention_days: Days kept at a daily resolution
+    """
+    parameters = {'provider': provider, 'sampled_at': sampled_at, 'hours': hourly_retention_hours,
+                  'days': daily_retention_days}
+    expired = "bucket < to_timestamp(%(sampled_at)s) - make_interval(hours => %(hours)s)"
+    day = "date_trunc('day', bucket, 'UTC')"
+
+    await cursor.execute(f"WITH expired AS (DELETE FROM coverage_history WHERE provider = %(provider)s "
+                         f"AND resolution = 'hour' AND {expired} RETURNING bucket, airport_id, samples) "
+                         f"INSERT INTO coverage_history(provider, resolution, bucket, airport_id, samples) "
+                         f"SELECT %(provider)s, 'day', {day}, airport_id, SUM(samples) FROM expired "
+                         f"GROUP BY {day}, airport_id ON CONFLICT (provider, resolution, bucket, airport_id) "
+                         f"DO UPDATE SET samples = coverage_history.samples + EXCLUDED.samples", parameters)
+    await cursor.execute(f"WITH expired AS (DELETE FROM coverage_polls WHERE provider = %(provider)s "
+                         f"AND resolution = 'hour' AND {expired} RETURNING bucket, polls) "
+                         f"INSERT INTO coverage_polls(provider, resolution, bucket, polls, last_slot) "
+                         f"SELECT %(provider)s, 'day', {day}, SUM(polls), 0 FROM expired GROUP BY {day} "
+                         f"ON CONFLICT (provider, resolution, bucket) "
+                         f"DO UPDATE SET polls = coverage_polls.polls + EXCLUDED.polls", parameters)
+
+    dropped = "resolution = 'day' AND bucket < to_timestamp(%(sampled_at)s) - make_interval(days => %(days)s)"
+    await cursor.execute(f"DELETE FROM coverage_history WHERE provider = %(provider)s AND {dropped}", parameters)
+    await cursor.execute(f"DELETE FROM coverage_polls WHERE provider = %(provider)s AND {dropped}", parameters)
+
+
+@database_function(read_only=True)
+async def fetch_coverage_ranking(cursor: psycopg.AsyncCursor, provider: str, window: timedelta,
+                                 limit: int) -> tuple[int, list[tuple[str, int]]]:
+    """Returns the airports that were active in the most coverage snapshots of a provider over a window of time
+
+    Hours still kept at an hourly resolution are counted from the start of the hour the window starts in, older
+    ones from the start of the day.
+
+    Args:
+        provider: The coverage provider
+        window: How far back to count from now
+        limit: Maximum number of airports to return
+
+    Returns: tuple[int, list[tuple[str, int]]] the snapshots in the window and the ICAO code and number of snapshots
+             of the busiest airports, busiest first
+    """
+    parameters = {'provider': provider, 'window': window, 'limit': limit}
+    within = ("provider = %(provider)s AND ((resolution = 'hour' "
+              "AND bucket >= date_trunc('hour', now() - %(window)s, 'UTC')) OR (resolution = 'day' "
+              "AND bucket >= date_trunc('day', now() - %(window)s, 'UTC')))")
+
+    await cursor.execute(f'SELECT COALESCE(SUM(polls), 0) FROM coverage_polls WHERE {within}', parameters,
+                         prepare=True)
+    polls = (await cursor.fetchone())[0]
+    await cursor.execute(f'SELECT icao_code, SUM(samples) AS samples FROM coverage_history '
+                         f'JOIN coverage_airports ON coverage_airports.id = coverage_history.airport_id '
+                         f'WHERE {within} GROUP BY icao_code ORDER BY samples DESC, icao_code LIMIT %(limit)s',
+                         parameters, prepare=True)
+    return polls, [(row[0], row[1]) for row in await cursor.fetchall()]
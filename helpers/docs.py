@@ -5,6 +5,13 @@ ICAO_CODE_CONSTRAINTS = {
     'examples': ['LPPT', 'eddm']
 }
 
+ICAO_CODES_CONSTRAINTS = {
+    'min_length': 4,
+    'max_length': 99,  # Up to 20 codes
+    'pattern': r'^[a-zA-Z]{4}(,[a-zA-Z]{4})*$',
+    'examples': ['LPPT,LEMD,LPPR']
+}
+
 CHARTS_INFORMATION = {
     "name": "Get Charts",
     "description": "Returns an array of all Chart objects associated with a given ICAO code",
@@ -12,6 +19,14 @@ CHARTS_INFORMATION = {
     "tags": ["Charts"]
 }
 
+AIRPORTS_CHARTS_INFORMATION = {
+    "name": "Get Charts for Several Airports",
+    "description": "Returns the Chart objects of each of the comma separated ICAO codes, as arrays or categorized by "
+                   "type, codes without charts are listed in missing instead of failing the request",
+    "response_description": "Chart objects per ICAO code",
+    "tags": ["Charts"]
+}
+
 CATEGORIZED_CHARTS_INFORMATION = {
     "name": "Get Categorized Charts",
     "description": "Returns an array of all Chart objects associated with a given ICAO code",
@@ -22,13 +37,34 @@ CATEGORIZED_CHARTS_INFORMATION = {
 
 CODES_INFORMATION = {
     "name": "Get ICAO codes",
-    "description": "Returns an array of all ICAO codes with charts in the system",
+    "description": "Returns an array of all ICAO codes with charts in the system, with details set it returns an "
+                   "array of Airport objects with the chart count and last update of each airport instead",
     "tags": ["Information"]
 }
 
 COVERAGE_INFORMATION = {
     "name": "Get Coverage",
-    "description": "Returns a CoverageStatistics for a given provider",
+    "description": "Returns the latest CoverageStatistics snapshot for a given provider, the Age header holds how "
+                   "many seconds ago the snapshot was fetched",
+    "tags": ["Internal"]
+}
+
+HISTORY_WINDOW_CONSTRAINTS = {
+    'pattern': r'^[1-9][0-9]{0,3}[hd]$',
+    'examples': ['7d', '12h']
+}
+
+COVERAGE_TOP_INFORMATION = {
+    "name": "Get Busiest Airports",
+    "description": "Returns the airports active in the most coverage snapshots of a given provider over a window of "
+                   "hours or days, busiest first, with the share of the window's snapshots each one was active in",
+    "tags": ["Internal"]
+}
+
+COVERAGE_GAPS_INFORMATION = {
+    "name": "Get Coverage Gaps",
+    "description": "Returns the departure, arrival and alternate airports active on a given provider that have no "
+                   "charts in the system, computed once per coverage snapshot",
     "tags": ["Internal"]
 }
 
@@ -36,4 +72,92 @@ UPDATE_INFORMATION = {
     "name": "Update ",
     "description": "Returns a CoverageStatistics for a given provider",
     "tags": ["Internal"]
-}
\ No newline at end of file
+}
+
+STREAMED_UPDATE_INFORMATION = {
+    "name": "Update from a Stream",
+    "description": "Applies a NDJSON manifest, one chart per line, optionally compressed with Content-Encoding gzip. "
+                   "Charts are validated and staged in batches as they arrive and applied in a single transaction, "
+                   "returns the changed filenames and airports per kind of change",
+    "tags": ["Internal"]
+}
+
+RUNWAY_CONSTRAINTS = {
+    'min_length': 1,
+    'max_length': 3,
+    'pattern': r'^[0-9]{1,2}[lcrLCR]?$',
+    'examples': ['03', '21L']
+}
+
+PROCEDURE_CONSTRAINTS = {
+    'min_length': 2,
+    'max_length': 7,
+    'pattern': r'^[a-zA-Z0-9]+$',
+    'examples': ['LISB5N', 'ABC1A']
+}
+
+RUNWAY_CHARTS_INFORMATION = {
+    "name": "Get Runway Charts",
+    "description": "Returns an array of the Chart objects of a given ICAO code for a runway, including the charts that "
+                   "apply to every runway, optionally only of a given type",
+    "response_description": "Array of Chart objects",
+    "tags": ["Charts"]
+}
+
+PROCEDURE_CHARTS_INFORMATION = {
+    "name": "Get Procedure Charts",
+    "description": "Returns an array of all Chart objects, from any airport, that list a given SID or STAR",
+    "response_description": "Array of Chart objects",
+    "tags": ["Charts"]
+}
+
+CHART_FILE_INFORMATION = {
+    "name": "Get Chart File",
+    "description": "Returns the file of a chart. Files of cached sources are served by LibreCharts and support byte "
+                   "ranges and revalidation with their ETag, files of other sources redirect to where the source "
+                   "publishes them",
+    "response_description": "The chart file",
+    "tags": ["Charts"]
+}
+
+EXPORT_INFORMATION = {
+    "name": "Export Charts",
+    "description": "Returns every chart in the system as compressed NDJSON, one Chart object per line, or as a SQLite "
+                   "database. The export is generated once per dataset version, mirrors should revalidate it with its "
+                   "ETag and resume interrupted downloads with byte ranges",
+    "response_description": "The compressed export",
+    "tags": ["Charts"]
+}
+
+SEARCH_INFORMATION = {
+    "name": "Search Charts",
+    "description": "Returns the Chart objects whose ICAO code, procedures, title or subtype match a query, best "
+                   "matches first. Every word of the query matches the start of a word so partial words match as "
+                   "they're typed, a query that matches nothing that way is ranked by similarity instead when the "
+                   "database has pg_trgm. Results are paginated, pass the next cursor of a page to get the one after "
+                   "it",
+    "response_description": "Page of Chart objects",
+    "tags": ["Charts"]
+}
+
+COALESCING_INFORMATION = {
+    "name": "Get Request Coalescing",
+    "description": "Returns, for the chart loads, chart file fetches, exports and the coverage refreshes, prewarms "
+                   "and history of this worker, how many requests started a computation, how many joined one already "
+                   "in flight and how many are in flight",
+    "tags": ["Internal"]
+}
+
+METRICS_INFORMATION = {
+    "name": "Get Metrics",
+    "description": "Returns this worker's request, database, pool, chart cache, chart file and coverage metrics in "
+                   "the Prometheus text format",
+    "tags": ["Internal"]
+}
+
+DATABASE_HEALTH_INFORMATION = {
+    "name": "Get Database Health",
+    "description": "Returns the latency of a trivial query and the connection pool statistics of this worker, answers "
+                   "with a 503 when the database is slower than allowed or unreachable",
+    "tags": ["Internal"]
+}
@@ -9,3 +9,84 @@ class NoChartsForAirport(HTTPException):
         self.icao_code = icao_code
         self.status_code = 404
         self.detail = f'No charts found for ICAO code {icao_code}'
+
+
+class InvalidManifestLine(HTTPException):
+    """
+    Raised when a line of a streamed manifest isn't a valid chart
+    """
+    def __init__(self, line: int, reason: str):
+        self.line = line
+        self.status_code = 422
+        self.detail = f'Invalid chart on line {line} of the manifest: {reason}'
+
+
+class InvalidManifestEncoding(HTTPException):
+    """
+    Raised when a compressed manifest is corrupt or ends before its compressed stream does
+    """
+    def __init__(self, reason: str):
+        self.status_code = 400
+        self.detail = f'Invalid compressed manifest: {reason}'
+
+
+class ManifestReadTimedOut(HTTPException):
+    """
+    Raised when the client stops sending a streamed manifest for longer than the read timeout
+    """
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self.status_code = 408
+        self.detail = f'No part of the manifest arrived in {timeout:g} seconds'
+
+
+class SearchTimedOut(HTTPException):
+    """
+    Raised when a search takes longer than its latency budget
+    """
+    def __init__(self, timeout_ms: int):
+        self.timeout_ms = timeout_ms
+        self.status_code = 503
+        self.detail = f'Search took longer than {timeout_ms}ms, try a more specific query'
+
+
+class NoChartFile(HTTPException):
+    """
+    Raised when an airport doesn't have a chart with a given filename
+    """
+    def __init__(self, icao_code: str, filename: str):
+        self.icao_code = icao_code
+        self.filename = filename
+        self.status_code = 404
+        self.detail = f'No chart {filename} found for ICAO code {icao_code}'
+
+
+class ChartFileUnavailable(HTTPException):
+    """
+    Raised when a chart file can't be fetched from its source
+    """
+    def __init__(self, filename: str, reason: str):
+        self.filename = filename
+        self.status_code = 502
+        self.detail = f'Failure fetching chart file {filename}: {reason}'
+
+
+class RangeNotSatisfiable(HTTPException):
+    """
+    Raised when a requested byte range starts past the end of the file
+    """
+    def __init__(self, size: int):
+        self.size = size
+        self.status_code = 416
+        self.detail = f'Range not satisfiable, the file is {size} bytes long'
+        self.headers = {'Content-Range': f'bytes */{size}'}
+
+
+class InvalidHistoryWindow(HTTPException):
+    """
+    Raised when a coverage history window is longer than the history is kept for
+    """
+    def __init__(self, window: str, max_days: int):
+        self.window = window
+        self.status_code = 422
+        self.detail = f'Window {window} is longer than the {max_days} days the coverage history is kept for'
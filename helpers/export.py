@@ -0,0 +1,242 @@
+import asyncio
+import gzip
+import os
+import sqlite3
+import tempfile
+from dataclasses import dataclass
+from functools import partial
+from pathlib import Path
+from typing import AsyncIterator, BinaryIO, Optional
+
+import orjson
+import zstandard
+
+from helpers.classes import AnyChart, ExportFormat, ExportCompression
+from helpers.database import chart_snapshot, CHART_COLUMNS
+from helpers.serialization import serialize_chart_lines
+from helpers.singleflight import SingleFlight
+
+EXTENSIONS = {
+    ExportFormat.ndjson: 'ndjson',
+    ExportFormat.sqlite: 'sqlite',
+    ExportCompression.gzip: 'gz',
+    ExportCompression.zstd: 'zst',
+}
+MEDIA_TYPES = {
+    ExportCompression.gzip: 'application/gzip',
+    ExportCompression.zstd: 'application/zstd',
+}
+
+# @NOTE(Mauro): An export is generated once per dataset version and downloaded many times, so it's worth compressing
+#               harder than a response compressed on the fly would be
+GZIP_LEVEL = 9
+ZSTD_LEVEL = 12
+
+SQLITE_SCHEMA = """
+PRAGMA journal_mode = OFF;
+PRAGMA synchronous = OFF;
+CREATE TABLE dataset(version INTEGER NOT NULL);
+CREATE TABLE charts(
+    title TEXT NOT NULL,
+    type TEXT NOT NULL,
+    filename TEXT PRIMARY KEY,
+    filetype TEXT NOT NULL,
+    source TEXT NOT NULL,
+    icao_code TEXT NOT NULL,
+    subtype TEXT,
+    runways TEXT,
+    sids TEXT,
+    stars TEXT);
+"""
+
+
+@dataclass(frozen=True, slots=True)
+class Export:
+    """
+    Represents a generated export of the whole dataset
+
+    Attributes:
+        path (Path): Where the export is stored
+        version (int): Dataset version the export was generated from
+        format (ExportFormat): Format of the export
+        compression (ExportCompression): Compression of the export
+        size (int): Size of the export in bytes
+    """
+
+    path: Path
+    version: int
+    format: ExportFormat
+    compression: ExportCompression
+    size: int
+
+    @property
+    def filename(self) -> str:
+        return f'librecharts-{self.version}.{EXTENSIONS[self.format]}.{EXTENSIONS[self.compression]}'
+
+    @property
+    def media_type(self) -> str:
+        return MEDIA_TYPES[self.compression]
+
+
+def sqlite_row(chart: AnyChart) -> tuple:
+    """Converts a chart into a tuple ordered as CHART_COLUMNS, ready to be inserted into the SQLite export. The source
+    and lists are stored as JSON
+
+    Args:
+        chart: The chart to convert
+
+    Returns: tuple
+    """
+    row = []
+    for column in CHART_COLUMNS:
+        value = chart.source.__dict__ if column == 'source' else getattr(chart, column, None)
+        row.append(orjson.dumps(value).decode() if isinstance(value, (list, dict)) else value)
+    return tuple(row)
+
+
+class ExportStore:
+    """
+    Generates exports of the whole dataset and keeps them on disk, each export is generated once per dataset version
+    no matter how many requests ask for it at the same time
+
+    Exports are written to a temporary name and renamed into place so readers never see a partial one, once a newer
+    version of an export is generated the older ones are removed.
+
+    Attributes:
+        directory (Path): Where the exports are stored
+        batch_size (int): Charts read from the database per round trip
+        flights (SingleFlight): Exports being generated, one per version, format and compression at most
+    """
+
+    def __init__(self, directory: str = 'exports', batch_size: int = 5000):
+        self.directory = Path(directory)
+        self.batch_size = batch_size
+        self.flights = SingleFlight('exports')
+
+    def open(self, directory: str, batch_size: int) -> None:
+        """Points the store at a directory, creating it if needed
+
+        Args:
+            directory: Where the exports are stored
+            batch_size: Charts read from the database per round trip
+        """
+        self.directory = Path(directory)
+        self.batch_size = batch_size
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    async def stop(self) -> None:
+        """Cancels every export being generated"""
+        await self.flights.cancel()
+
+    def path(self, version: int, format: ExportFormat, compression: ExportCompression) -> Path:
+        """Returns where an export is stored, whether it exists or not
+
+        Returns: Path
+        """
+        return self.directory / f'{version}.{EXTENSIONS[format]}.{EXTENSIONS[compression]}'
+
+    def find(self, version: int, format: ExportFormat, compression: ExportCompression) -> Optional[Export]:
+        """Returns an export if it has been generated
+
+        Returns: Optional[Export]
+        """
+        path = self.path(version, format, compression)
+        try:
+            return Export(path, version, format, compression, path.stat().st_size)
+        except FileNotFoundError:
+            return None
+
+    async def open_export(self, version: int, format: ExportFormat,
+                          compression: ExportCompression) -> tuple[Export, BinaryIO]:
+        """Returns an export opened for reading, generating it if it doesn't exist yet
+
+        The export may be of a newer version than requested if the dataset changed in the meantime, never of an older
+        one.
+
+        Args:
+            version: Current dataset version
+            format: Format of the export
+            compression: Compression of the export
+
+        Returns: tuple[Export, BinaryIO]
+        """
+        export = self.find(version, format, compression)
+        if export is None:
+            export = await self.flights.do((version, format, compression),
+                                           partial(self.__generate, format, compression))
+        try:
+            return export, export.path.open('rb')
+        except FileNotFoundError:
+            # @NOTE(Mauro): Removed by a newer export between being found and being opened
+            export = await self.flights.do((None, format, compression), partial(self.__generate, format, compression))
+            return export, export.path.open('rb')
+
+    async def __generate(self, format: ExportFormat, compression: ExportCompression) -> Export:
+        async with chart_snapshot(self.batch_size) as (version, batches):
+            export = self.find(version, format, compression)
+            if export is not None:
+                return export
+
+            incoming = tempfile.NamedTemporaryFile(dir=self.directory, prefix='.incoming-', delete=False)
+            try:
+                with incoming:
+                    if format == ExportFormat.sqlite:
+                        await self.__write_sqlite(incoming, compression, version, batches)
+                    else:
+                        await self.__write_ndjson(incoming, compression, batches)
+                os.replace(incoming.name, self.path(version, format, compression))
+            except BaseException:
+                Path(incoming.name).unlink(missing_ok=True)
+                raise
+
+        self.__remove_older(version)
+        return self.find(version, format, compression)
+
+    async def __write_ndjson(self, file: BinaryIO, compression: ExportCompression,
+                             batches: AsyncIterator[list[AnyChart]]) -> None:
+        with self.__compressor(file, compression) as compressor:
+            async for charts in batches:
+                # @NOTE(Mauro): The write serializes the batch, compresses it and writes the result to disk, the
+                #               thread keeps all three away from the requests the worker serves while exporting
+                await asyncio.to_thread(lambda: compressor.write(serialize_chart_lines(charts)))
+
+    async def __write_sqlite(self, file: BinaryIO, compression: ExportCompression, version: int,
+                             batches: AsyncIterator[list[AnyChart]]) -> None:
+        database = Path(f'{file.name}.sqlite')
+        connection = sqlite3.connect(database, check_same_thread=False)
+        try:
+            await asyncio.to_thread(connection.executescript, SQLITE_SCHEMA)
+            insert = (f'INSERT OR REPLACE INTO charts({", ".join(CHART_COLUMNS)}) '
+                      f'VALUES ({", ".join("?" * len(CHART_COLUMNS))})')
+            async for charts in batches:
+                await asyncio.to_thread(connection.executemany, insert, [sqlite_row(chart) for chart in charts])
+            await asyncio.to_thread(connection.executescript,
+                                    f'INSERT INTO dataset(version) VALUES ({int(version)});'
+                                    f'CREATE INDEX charts_icao_code_idx ON charts (icao_code);'
+                                    f'VACUUM;')
+            connection.close()
+            await asyncio.to_thread(self.__compress_file, database, file, compression)
+        finally:
+            connection.close()
+            database.unlink(missing_ok=True)
+
+    def __compress_file(self, source: Path, file: BinaryIO, compression: ExportCompression) -> None:
+        with source.open('rb') as reader, self.__compressor(file, compression) as compressor:
+            while chunk := reader.read(1024 * 1024):
+                compressor.write(chunk)
+
+    @staticmethod
+    def __compressor(file: BinaryIO, compression: ExportCompression):
+        if compression == ExportCompression.zstd:
+            return zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(file, closefd=False)
+        # The modification time is left out of the header so the same charts always compress to the same bytes
+        return gzip.GzipFile(fileobj=file, mode='wb', compresslevel=GZIP_LEVEL, mtime=0)
+
+    def __remove_older(self, version: int) -> None:
+        for path in self.directory.iterdir():
+            prefix = path.name.split('.', 1)[0]
+            if prefix.isdigit() and int(prefix) < version:
+                path.unlink(missing_ok=True)
+
+
+exports = ExportStore()
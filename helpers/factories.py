@@ -8,16 +8,39 @@
 # By downloading, executing or otherwise transferring the contents of this repository by any means you are legally
 # bound to the terms stipulated in the license.
 
+from functools import lru_cache
 from typing import Union, Any
 
+from pydantic import BaseModel
+
 from helpers.classes import (
     Chart,
     DepartureChart,
     ApproachChart,
     ArrivalChart,
     GroundChart,
+    Source,
 )
 
+ROW_COLUMNS = ('title', 'type', 'filename', 'filetype', 'source', 'icao_code', 'subtype', 'runways', 'sids', 'stars')
+
+CHART_CLASSES = {
+    'approach': ApproachChart,
+    'departure': DepartureChart,
+    'arrival': ArrivalChart,
+    'ground': GroundChart,
+}
+
+# Position in a database row of each field of each chart class, in the order the fields are declared
+ROW_MAPPINGS = {
+    cls: tuple((field, ROW_COLUMNS.index(field)) for field in cls.model_fields)
+    for cls in [Chart, *CHART_CLASSES.values()]
+}
+
+SOURCE_DEFAULTS = {name: field.default for name, field in Source.model_fields.items()}
+
+_object_setattr = object.__setattr__
+
 
 def __create_kwargs(tuple_: tuple[Union[str, dict[str, str], list[str]]]) -> dict[str, Any]:
     keys = ['title', 'type', 'filename', 'filetype', 'source', 'icao_code', 'subtype', 'runways', 'sids', 'stars']
@@ -60,3 +83,47 @@ def chart_factory(
         case _:
 
             return Chart(**content)
+
+
+def __trusted_model(cls: type[BaseModel], values: dict[str, Any]) -> BaseModel:
+    """Creates a model from already validated values without running validation
+
+    Args:
+        cls: Model class to create
+        values: Value of every field of the model, in declaration order
+
+    """
+
+    # @NOTE(Mauro): This is what BaseModel.model_construct does minus the per field default handling, which on
+    #               pydantic 2 makes model_construct slower than a full validation
+    model = cls.__new__(cls)
+    _object_setattr(model, '__dict__', values)
+    _object_setattr(model, '__pydantic_fields_set__', set(values))
+    _object_setattr(model, '__pydantic_extra__', None)
+    _object_setattr(model, '__pydantic_private__', None)
+    return model
+
+
+@lru_cache(maxsize=1024)
+def __trusted_source(name: str, url: str, contributor: str, cached: bool) -> Source:
+    """Returns a Source without validating it, there are only a handful of sources so they're shared between charts"""
+    return __trusted_model(Source, {'name': name, 'url': url, 'contributor': contributor, 'cached': cached})
+
+
+def trusted_chart_factory(row: tuple) -> Union[Chart, ApproachChart, DepartureChart, ArrivalChart]:
+    """
+    Converts a chart row read from the database to the proper python object without validating it, rows were
+    validated by chart_factory when they were ingested
+
+    Parameters
+    ----------
+    row: tuple
+        Chart row with the columns in ROW_COLUMNS order, any extra columns at the end are ignored
+    """
+
+    cls = CHART_CLASSES.get(row[1], Chart)
+    values = {field: row[index] for field, index in ROW_MAPPINGS[cls]}
+    source = values['source']
+    values['source'] = __trusted_source(source['name'], source['url'], source['contributor'],
+                                        source.get('cached', SOURCE_DEFAULTS['cached']))
+    return __trusted_model(cls, values)
@@ -0,0 +1,221 @@
+import re
+from abc import ABC, abstractmethod
+from typing import Any, Optional
+
+import ijson
+
+from helpers.classes import CoverageStatistics, Providers
+
+
+def is_airport_code(code: Any) -> bool:
+    """Checks if a feed value looks like an ICAO airport code
+
+    Args:
+        code: Value read from the feed
+
+    Returns: bool
+    """
+    return isinstance(code, str) and len(code) == 4
+
+
+class FeedParser(ABC):
+    """
+    Incrementally extracts departure, arrival and alternate airports from a coverage feed
+
+    Chunks of the response body are fed as they arrive and only the airport codes are kept, the parsed document is
+    never materialized.
+
+    Attributes:
+        provider (Providers): The provider the feed belongs to
+        departure_airports (set[str]): Departure airports found so far
+        arrival_airports (set[str]): Arrival airports found so far
+        alternate_airports (set[str]): Alternate airports found so far
+    """
+
+    provider: Providers
+
+    def __init__(self):
+        self.departure_airports: set[str] = set()
+        self.arrival_airports: set[str] = set()
+        self.alternate_airports: set[str] = set()
+
+    @abstractmethod
+    def feed(self, chunk: bytes) -> None:
+        """Parses the next chunk of the response body
+
+        Args:
+            chunk: Raw bytes of the response body
+        """
+
+    def close(self) -> CoverageStatistics:
+        """Finishes parsing the feed
+
+        Returns: CoverageStatistics
+        Raises:
+            ijson.JSONError: When the feed is malformed or was truncated
+        """
+        return CoverageStatistics(
+            provider=self.provider,
+            departure_airports=list(self.departure_airports),
+            arrival_airports=list(self.arrival_airports),
+            alternate_airports=list(self.alternate_airports)
+        )
+
+
+class EventFeedParser(FeedParser):
+    """
+    Feed parser built on an incremental JSON parser, only the values under prefix are built and handed to _handle
+
+    Attributes:
+        prefix (str): Path of the values to build, in ijson prefix notation
+        kvitems (bool): If the values under prefix are objects whose key value pairs should be built one by one
+    """
+
+    prefix: str = ''
+    kvitems: bool = False
+
+    def __init__(self):
+        super().__init__()
+        self.__items = ijson.sendable_list()
+        if self.kvitems:
+            self.__coroutine = ijson.kvitems_coro(self.__items, self.prefix)
+        else:
+            self.__coroutine = ijson.items_coro(self.__items, self.prefix)
+
+    def feed(self, chunk: bytes) -> None:
+        self.__coroutine.send(chunk)
+        self._handle(self.__items)
+        del self.__items[:]
+
+    def close(self) -> CoverageStatistics:
+        self.__coroutine.close()
+        self._handle(self.__items)
+        del self.__items[:]
+        return super().close()
+
+    @abstractmethod
+    def _handle(self, items: list[Any]) -> None:
+        """Collects the airports of the values built since the last chunk
+
+        Args:
+            items: Values built under prefix, key value pairs when kvitems is set
+        """
+
+
+class VatsimFeedParser(FeedParser):
+    """
+    Feed parser for the VATSIM data feed
+
+    The feed is several megabytes and even an incremental JSON parser spends most of its time building events for
+    fields we don't care about, so the raw bytes are scanned for the flight plan fields instead. The top-level keys
+    of the feed are tracked so only flight plans in the pilots array are counted (prefiles have flight plans too),
+    once the pilots array is over the rest of the feed is skipped.
+
+    A feed cut short before the end of the pilots array is rejected rather than counted, it would otherwise replace
+    the last snapshot with a partial one.
+    """
+
+    provider = Providers.vatsim
+
+    # @NOTE(Mauro): JSON strings can't contain an unescaped quote, so `"departure": "` can only ever be a key followed
+    #               by a string value. Both patterns are bounded so a match never spans more than OVERLAP bytes.
+    #               ref: https://github.com/vatsimnetwork/developer-info/wiki/Data-Feeds
+    FIELD = re.compile(rb'"(departure|arrival|alternate)"\s{0,8}:\s{0,8}"([^"\\]{0,16})"')
+    SECTION = re.compile(rb'"(general|pilots|controllers|atis|servers|prefiles|facilities|ratings|pilot_ratings|'
+                         rb'military_ratings)"\s{0,8}:')
+    OVERLAP = 64
+    END = re.compile(rb'\]\s*\}\s*$')
+
+    def __init__(self):
+        super().__init__()
+        self.__airports = {b'departure': self.departure_airports, b'arrival': self.arrival_airports,
+                           b'alternate': self.alternate_airports}
+        self.__section = None
+        self.__tail = b''
+        self.__done = False
+
+    def feed(self, chunk: bytes) -> None:
+        if self.__done:
+            return
+        buffer = self.__tail + chunk
+        cutoff = len(buffer) - self.OVERLAP
+        if cutoff > 0:
+            self.__scan(buffer, cutoff)
+            self.__tail = buffer[cutoff:]
+        else:
+            self.__tail = buffer
+
+    def close(self) -> CoverageStatistics:
+        if not self.__done:
+            self.__scan(self.__tail, len(self.__tail))
+            # @NOTE(Mauro): The pilots array is over once the next section starts, or when it's the last section of
+            #               the feed, once the feed ends right after it
+            if not self.__done and (self.__section != b'pilots' or not self.END.search(self.__tail)):
+                raise ijson.JSONError('VATSIM feed ended before the end of the pilots array')
+        self.__tail = b''
+        return super().close()
+
+    def __scan(self, buffer: bytes, cutoff: int) -> None:
+        """Scans the matches starting before cutoff, the rest of the buffer is scanned again with the next chunk"""
+        boundaries = []
+        for match in self.SECTION.finditer(buffer):
+            if match.start() >= cutoff:
+                break
+            boundaries.append((match.start(), match.group(1)))
+
+        if not boundaries and self.__section != b'pilots':
+            return
+
+        boundaries.reverse()
+        for match in self.FIELD.finditer(buffer):
+            start = match.start()
+            if start >= cutoff:
+                break
+            while boundaries and boundaries[-1][0] < start:
+                self.__enter(boundaries.pop()[1])
+            if self.__section == b'pilots':
+                code = match.group(2)
+                if len(code) == 4 and code != b'NONE':  # Some pilots file without an alternate
+                    self.__airports[match.group(1)].add(code.decode())
+
+        while boundaries:
+            self.__enter(boundaries.pop()[1])
+
+    def __enter(self, section: bytes) -> None:
+        if self.__section == b'pilots':
+            self.__done = True
+        self.__section = section
+
+
+class PosconFeedParser(EventFeedParser):
+    provider = Providers.poscon
+    prefix = 'flights.item.flightplan'
+
+    def _handle(self, items: list[Optional[dict[str, Any]]]) -> None:
+        for flight_plan in items:
+            if flight_plan:  # In certain cases flight_plan can be null
+                if is_airport_code(flight_plan.get('dep')):
+                    self.departure_airports.add(flight_plan['dep'])
+                if is_airport_code(flight_plan.get('dest')):
+                    self.arrival_airports.add(flight_plan['dest'])
+                for key in ['altnt', 'altnt2']:
+                    if is_airport_code(flight_plan.get(key)):
+                        self.alternate_airports.add(flight_plan[key])
+
+
+class StpFeedParser(EventFeedParser):
+    """
+    Feed parser for SimToolkitPro, the feed is an object of flights where each flight is an array and the departure
+    and arrival airports are at positions 7 and 8
+    """
+
+    provider = Providers.stp
+    kvitems = True
+
+    def _handle(self, items: list[tuple[str, list[Any]]]) -> None:
+        for _, flight in items:
+            if len(flight) > 8:
+                if flight[7] != '-' and is_airport_code(flight[7]):
+                    self.departure_airports.add(flight[7])
+                if flight[8] != '-' and is_airport_code(flight[8]):
+                    self.arrival_airports.add(flight[8])
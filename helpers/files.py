@@ -0,0 +1,341 @@
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+import time
+from dataclasses import dataclass
+from functools import partial
+from pathlib import Path
+from typing import AsyncIterator, BinaryIO, Optional
+from urllib.parse import quote
+
+import httpx
+
+from helpers.classes import ChartFile
+from helpers.coverage import open_client
+from helpers.database import fetch_cached_chart_files, save_chart_file
+from helpers.exceptions import ChartFileUnavailable
+from helpers.metrics import CHART_FILE_FETCH_DURATION, CHART_FILE_FETCH_BYTES
+from helpers.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# @NOTE(Mauro): Evicting down to a bit below the cap instead of to the cap itself means the store isn't scanned again
+#               on every file that's added once it's full
+EVICTION_TARGET = 0.9
+# Filenames looked up at once when prefetching the files of a manifest
+PREFETCH_BATCH_SIZE = 1000
+
+
+def chart_file_url(chart: ChartFile) -> str:
+    """Returns where the file of a chart is published, the filename under the URL of its source
+
+    Sources don't carry the URL of each file yet so this is a guess that doesn't hold for every authority, which is
+    why the files of a manifest are only prefetched when CHART_FILES_PREFETCH is set.
+
+    Args:
+        chart: The chart file
+
+    Returns: str
+    """
+    return f'{chart.source.url.rstrip("/")}/{quote(chart.filename)}'
+
+
+@dataclass(frozen=True, slots=True)
+class StoredChartFile:
+    """
+    Represents a chart file in the store
+
+    Attributes:
+        path (Path): Where the file is stored
+        digest (str): SHA-256 of the file, which is also its name in the store
+        size (int): Size of the file in bytes
+    """
+
+    path: Path
+    digest: str
+    size: int
+
+
+class ChartFileStore:
+    """
+    Content-addressed store of chart files on disk, least recently served files are evicted past the size cap
+
+    Files are named after the SHA-256 of their contents, charts sharing the same file store it once. The store can be
+    shared by every worker of a host, files are written to a temporary name and renamed into place so readers never
+    see a partial file. Writes and scans of the store run in worker threads, off the event loop.
+
+    Attributes:
+        directory (Path): Root directory of the store
+        max_bytes (int): Size cap of the store
+        size (int): Size of the files in the store as last counted
+        hits (int): Number of files served from the store
+        misses (int): Number of files that had to be fetched
+        evictions (int): Number of files evicted
+    """
+
+    def __init__(self, directory: str = 'chart_files', max_bytes: int = 2 * 1024 * 1024 * 1024):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.__evicting = False
+
+    async def open(self, directory: str, max_bytes: int) -> None:
+        """Points the store at a directory, creating it if needed, and counts the files already in it
+
+        Args:
+            directory: Root directory of the store
+            max_bytes: Size cap of the store
+        """
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        (self.directory / 'objects').mkdir(parents=True, exist_ok=True)
+        (self.directory / 'incoming').mkdir(exist_ok=True)
+        await self.evict(force=True)
+
+    def path(self, digest: str) -> Path:
+        """Returns where a file is stored, whether it exists or not
+
+        Args:
+            digest: SHA-256 of the file
+
+        Returns: Path
+        """
+        return self.directory / 'objects' / digest[:2] / digest
+
+    async def get(self, digest: str) -> Optional[Path]:
+        """Returns where a file is stored and marks it as recently used
+
+        Args:
+            digest: SHA-256 of the file
+
+        Returns: Optional[Path], None when the file isn't in the store
+        """
+        path = self.path(digest)
+        try:
+            # @NOTE(Mauro): The modification time doubles as the last time the file was served, it's what eviction
+            #               sorts by and unlike the access time it isn't affected by noatime mounts
+            await asyncio.to_thread(os.utime, path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    async def put(self, chunks: AsyncIterator[bytes]) -> StoredChartFile:
+        """Stores a file as it's downloaded, evicting the least recently used files if the store is over its cap
+
+        Args:
+            chunks: Contents of the file
+
+        Returns: StoredChartFile
+        """
+        hasher = hashlib.sha256()
+        size = 0
+
+        def write(chunk: bytes) -> None:
+            hasher.update(chunk)
+            incoming.write(chunk)
+
+        incoming = await asyncio.to_thread(tempfile.NamedTemporaryFile, dir=self.directory / 'incoming', delete=False)
+        try:
+            with incoming:
+                async for chunk in chunks:
+                    await asyncio.to_thread(write, chunk)
+                    size += len(chunk)
+
+            digest = hasher.hexdigest()
+            path = self.path(digest)
+            existed = await asyncio.to_thread(self.__place, incoming.name, path)
+        except BaseException:
+            Path(incoming.name).unlink(missing_ok=True)
+            raise
+
+        if not existed:
+            self.size += size
+            await self.evict()
+        return StoredChartFile(path, digest, size)
+
+    async def evict(self, force: bool = False) -> None:
+        """Removes the least recently used files until the store is under its cap
+
+        The store is only scanned when the size counted so far is over the cap, files added by other workers are
+        picked up by the scan. Files added while the store is being scanned don't start another scan.
+
+        Args:
+            force: Scan the store even if it doesn't look full
+        """
+        if self.__evicting or (not force and self.size <= self.max_bytes):
+            return
+
+        self.__evicting = True
+        try:
+            self.size, evictions = await asyncio.to_thread(self.__evict)
+            self.evictions += evictions
+        finally:
+            self.__evicting = False
+
+    @staticmethod
+    def __place(source: str, path: Path) -> bool:
+        """Renames a written file into place, returns whether the store already had it"""
+        path.parent.mkdir(exist_ok=True)
+        existed = path.exists()
+        os.replace(source, path)
+        return existed
+
+    def __evict(self) -> tuple[int, int]:
+        """Scans the store and removes the least recently used files if it's over its cap, runs in a worker thread
+
+        Returns: tuple[int, int] the size of the store and the number of files removed
+        """
+        files = []
+        for prefix in os.scandir(self.directory / 'objects'):
+            for entry in os.scandir(prefix.path):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+
+        size = sum(size for _, size, _ in files)
+        if size <= self.max_bytes:
+            return size, 0
+
+        # @NOTE(Mauro): A file that's being sent when it's evicted is still sent in full, the open descriptor keeps
+        #               it around until it's closed
+        files.sort()
+        evictions = 0
+        for _, file_size, path in files:
+            if size <= self.max_bytes * EVICTION_TARGET:
+                break
+            Path(path).unlink(missing_ok=True)
+            size -= file_size
+            evictions += 1
+        return size, evictions
+
+
+class ChartFiles:
+    """
+    Fetches chart files from their sources into the chart file store, each file is only fetched once no matter how
+    many requests or prefetches ask for it at the same time
+
+    Attributes:
+        store (ChartFileStore): Where the files are stored
+        flights (SingleFlight): Fetches in flight, one per version of a chart at most
+        max_file_bytes (int): Files bigger than this aren't stored
+        timeout (float): Seconds to wait for a source before giving up on a file
+        concurrency (int): Files fetched at the same time when prefetching
+    """
+
+    def __init__(self, store: ChartFileStore, max_file_bytes: int = 64 * 1024 * 1024, timeout: float = 30.0,
+                 concurrency: int = 4):
+        self.store = store
+        self.flights = SingleFlight('chart_files')
+        self.max_file_bytes = max_file_bytes
+        self.timeout = timeout
+        self.concurrency = concurrency
+        self.__prefetches: set[asyncio.Task] = set()
+
+    async def get(self, chart: ChartFile) -> StoredChartFile:
+        """Returns the stored file of a chart, fetching it from its source if it isn't stored yet
+
+        Args:
+            chart: The chart file
+
+        Returns: StoredChartFile
+        Raises:
+            ChartFileUnavailable: When the file isn't stored and can't be fetched
+        """
+        if chart.digest:
+            path = await self.store.get(chart.digest)
+            if path is not None:
+                self.store.hits += 1
+                return StoredChartFile(path, chart.digest, chart.size)
+        self.store.misses += 1
+        return await self.flights.do((chart.filename, chart.version), partial(self.__fetch, chart))
+
+    async def open(self, chart: ChartFile) -> tuple[StoredChartFile, BinaryIO]:
+        """Returns the stored file of a chart opened for reading, fetching it from its source if it isn't stored yet
+
+        Args:
+            chart: The chart file
+
+        Returns: tuple[StoredChartFile, BinaryIO]
+        Raises:
+            ChartFileUnavailable: When the file isn't stored and can't be fetched
+        """
+        stored = await self.get(chart)
+        try:
+            return stored, await asyncio.to_thread(stored.path.open, 'rb')
+        except FileNotFoundError:
+            # @NOTE(Mauro): Evicted between being found and being opened, which only happens on a full store
+            stored = await self.flights.do((chart.filename, chart.version), partial(self.__fetch, chart))
+            return stored, await asyncio.to_thread(stored.path.open, 'rb')
+
+    def prefetch(self, filenames: list[str]) -> Optional[asyncio.Task]:
+        """Fetches the files of the given charts in the background, charts whose source isn't cached are skipped
+
+        Args:
+            filenames: Filenames of the charts
+
+        Returns: Optional[asyncio.Task] of the prefetch, None when there's nothing to prefetch
+        """
+        if not filenames:
+            return None
+        task = asyncio.create_task(self.__prefetch(filenames))
+        self.__prefetches.add(task)
+        task.add_done_callback(self.__prefetches.discard)
+        return task
+
+    async def stop(self) -> None:
+        """Cancels every prefetch and fetch in flight"""
+        tasks = list(self.__prefetches)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self.flights.cancel()
+
+    async def __prefetch(self, filenames: list[str]) -> None:
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def fetch(chart: ChartFile) -> None:
+            async with semaphore:
+                try:
+                    await self.get(chart)
+                except Exception as exception:
+                    logger.warning('Failure prefetching chart file %s: %r', chart.filename, exception)
+
+        for start in range(0, len(filenames), PREFETCH_BATCH_SIZE):
+            charts = await fetch_cached_chart_files(filenames[start:start + PREFETCH_BATCH_SIZE])
+            await asyncio.gather(*[fetch(chart) for chart in charts])
+
+    async def __fetch(self, chart: ChartFile) -> StoredChartFile:
+        http = await open_client()
+        start = time.perf_counter()
+        try:
+            async with http.stream('GET', chart_file_url(chart), timeout=self.timeout) as response:
+                if response.status_code != 200:
+                    raise ChartFileUnavailable(chart.filename, f'the source answered {response.status_code}')
+                stored = await self.store.put(self.__limited(chart, response.aiter_bytes()))
+        except httpx.HTTPError as exception:
+            raise ChartFileUnavailable(chart.filename, type(exception).__name__)
+        finally:
+            CHART_FILE_FETCH_DURATION.observe(time.perf_counter() - start)
+        CHART_FILE_FETCH_BYTES.observe(stored.size)
+
+        await save_chart_file(chart.filename, chart.version, stored.digest, stored.size)
+        return stored
+
+    async def __limited(self, chart: ChartFile, chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        size = 0
+        async for chunk in chunks:
+            size += len(chunk)
+            if size > self.max_file_bytes:
+                raise ChartFileUnavailable(chart.filename, f'the file is larger than {self.max_file_bytes} bytes')
+            yield chunk
+
+
+chart_file_store = ChartFileStore()
+chart_files = ChartFiles(chart_file_store)
@@ -0,0 +1,113 @@
+import logging
+import time
+from datetime import timedelta
+from functools import partial
+
+from helpers.classes import AirportActivity, CoverageRanking, Providers
+from helpers.database import fetch_coverage_ranking, record_coverage
+from helpers.exceptions import InvalidHistoryWindow
+from helpers.poller import CoverageSnapshot, coverage_poller
+from helpers.scheduler import active_airports
+from helpers.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+WINDOW_UNITS = {'h': timedelta(hours=1), 'd': timedelta(days=1)}
+# Rankings kept in memory at once, windows are chosen by clients so the memo is dropped once it grows past this
+MAX_RANKINGS = 256
+
+
+def parse_window(window: str) -> timedelta:
+    """Converts a window such as 12h or 7d into a duration
+
+    Args:
+        window: Number of hours or days followed by h or d
+
+    Returns: timedelta
+    """
+    return int(window[:-1]) * WINDOW_UNITS[window[-1]]
+
+
+class CoverageHistory:
+    """
+    Records every coverage snapshot into the coverage history and ranks the busiest airports over windows of it
+
+    The history only changes once per sampling interval, so every ranking is computed at most once per interval and
+    served from memory in between.
+
+    Attributes:
+        interval (float): Seconds per sampling slot, at most one snapshot per provider is recorded in each
+        hourly_retention_hours (int): Hours kept at an hourly resolution before being rolled up into days
+        daily_retention_days (int): Days kept at a daily resolution, the longest window that can be ranked
+        recorded (int): Number of snapshots this worker recorded
+        flights (SingleFlight): Recordings and rankings in flight, one per snapshot or window at most
+    """
+
+    def __init__(self, interval: float = 60.0, hourly_retention_hours: int = 48, daily_retention_days: int = 90):
+        self.interval = interval
+        self.hourly_retention_hours = hourly_retention_hours
+        self.daily_retention_days = daily_retention_days
+        self.recorded = 0
+        self.flights = SingleFlight('coverage_history')
+        self.__rankings: dict[tuple[Providers, str, int], tuple[float, CoverageRanking]] = {}
+
+    def handle(self, provider: Providers, snapshot: CoverageSnapshot) -> None:
+        """Records a new snapshot in the background, meant to be a coverage poller listener
+
+        Args:
+            provider: The coverage provider
+            snapshot: The new snapshot
+        """
+        self.flights.start(('record', provider, snapshot.fetched_at), partial(self.__record, provider, snapshot))
+
+    async def top(self, provider: Providers, window: str, limit: int) -> CoverageRanking:
+        """Returns the airports that were active in the most snapshots of a provider over a window of time
+
+        Args:
+            provider: The coverage provider
+            window: Number of hours or days followed by h or d, e.g. 7d
+            limit: Maximum number of airports to return
+
+        Returns: CoverageRanking
+        Raises:
+            InvalidHistoryWindow: When the window is longer than the history is kept for
+        """
+        span = parse_window(window)
+        if span > timedelta(days=self.daily_retention_days):
+            raise InvalidHistoryWindow(window, self.daily_retention_days)
+
+        key = (provider, window, limit)
+        cached = self.__rankings.get(key)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+        return await self.flights.do(('top', *key), partial(self.__rank, key, span))
+
+    async def stop(self) -> None:
+        """Cancels every recording and ranking in flight"""
+        await self.flights.cancel()
+
+    async def __rank(self, key: tuple[Providers, str, int], span: timedelta) -> CoverageRanking:
+        provider, window, limit = key
+        polls, airports = await fetch_coverage_ranking(provider, span, limit)
+        ranking = CoverageRanking(provider=provider, window=window, polls=polls,
+                                  airports=[AirportActivity(icao_code=icao_code, samples=samples,
+                                                            share=samples / polls if polls else 0.0)
+                                            for icao_code, samples in airports])
+
+        if len(self.__rankings) >= MAX_RANKINGS:
+            self.__rankings.clear()
+        self.__rankings[key] = (time.monotonic() + self.interval, ranking)
+        return ranking
+
+    async def __record(self, provider: Providers, snapshot: CoverageSnapshot) -> None:
+        try:
+            if await record_coverage(provider, snapshot.fetched_at, int(snapshot.fetched_at // self.interval),
+                                     active_airports(snapshot.statistics), self.hourly_retention_hours,
+                                     self.daily_retention_days):
+                self.recorded += 1
+        except Exception as exception:
+            logger.warning('Failure recording %s coverage history: %r', provider, exception)
+
+
+coverage_history = CoverageHistory()
+coverage_poller.listeners.append(coverage_history.handle)
@@ -0,0 +1,177 @@
+import os
+from typing import BinaryIO, Iterable, Mapping, Optional
+
+import anyio
+from fastapi import Response
+from starlette.types import Receive, Scope, Send
+
+from helpers.exceptions import RangeNotSatisfiable
+
+# ASGI extension servers advertise when they can send a file with sendfile(2) instead of reading it into memory
+# ref: https://asgi.readthedocs.io/en/latest/extensions.html#zero-copy-send
+ZERO_COPY_SEND = 'http.response.zerocopysend'
+
+
+def etag(version: str) -> str:
+    """Returns a strong entity tag for a content version
+
+    Args:
+        version: Content version of the resource
+
+    Returns: str
+    """
+    return f'"{version}"'
+
+
+def is_not_modified(if_none_match: Optional[str], tag: str) -> bool:
+    """Checks if an If-None-Match header matches an entity tag
+
+    Args:
+        if_none_match: Value of the If-None-Match request header
+        tag: Current entity tag of the resource
+
+    Returns: bool
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+
+    # @NOTE(Mauro): If-None-Match uses the weak comparison, W/"x" matches "x"
+    # ref: https://www.rfc-editor.org/rfc/rfc9110#name-if-none-match
+    return any(candidate.strip().removeprefix('W/') == tag for candidate in if_none_match.split(','))
+
+
+def not_modified(tag: str, cache_control: Optional[str] = None) -> Response:
+    """Returns an empty 304 Not Modified response
+
+    Args:
+        tag: Current entity tag of the resource
+        cache_control: Value of the Cache-Control header
+
+    Returns: Response
+    """
+    headers = {'ETag': tag}
+    if cache_control:
+        headers['Cache-Control'] = cache_control
+    return Response(status_code=304, headers=headers)
+
+
+def negotiate_encoding(accept_encoding: Optional[str], codings: Iterable[str]) -> Optional[str]:
+    """Picks the content coding to send a body in from the ones it's available in
+
+    Args:
+        accept_encoding: Value of the Accept-Encoding request header
+        codings: Content codings the body is available in, in order of preference
+
+    Returns: Optional[str] the content coding, None to send the body as is
+    """
+    if not accept_encoding:
+        return None
+
+    # ref: https://www.rfc-editor.org/rfc/rfc9110#name-accept-encoding
+    weights: dict[str, float] = {}
+    for item in accept_encoding.lower().split(','):
+        coding, _, parameters = item.partition(';')
+        weight = 1.0
+        parameter, _, value = parameters.partition('=')
+        if parameter.strip() == 'q':
+            try:
+                weight = float(value)
+            except ValueError:
+                continue
+        weights[coding.strip()] = weight
+
+    best, best_weight = None, 0.0
+    for coding in codings:
+        weight = weights.get(coding, weights.get('*', 0.0))
+        if weight > best_weight:
+            best, best_weight = coding, weight
+    return best
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[tuple[int, int]]:
+    """Parses the Range header of a request for a file
+
+    Only single byte ranges are supported, anything else is ignored and the whole file is served as the RFC allows.
+
+    Args:
+        header: Value of the Range request header
+        size: Size of the file in bytes
+
+    Returns: Optional[tuple[int, int]] first and last byte of the range, both inclusive, None to serve the whole file
+    Raises:
+        RangeNotSatisfiable: When the range starts past the end of the file
+    """
+    # ref: https://www.rfc-editor.org/rfc/rfc9110#name-range
+    if not header or not header.startswith('bytes='):
+        return None
+    first, separator, last = header.removeprefix('bytes=').strip().partition('-')
+    # @NOTE(Mauro): int() also takes signs, underscores and non-ASCII digits, a range is only ever ASCII digits
+    if not separator or not (first or last) or \
+            not all(part.isascii() and part.isdigit() for part in (first, last) if part):
+        return None
+
+    if not first:
+        # @NOTE(Mauro): bytes=-N is a suffix range, the last N bytes of the file
+        length = int(last)
+        if length <= 0 or size == 0:
+            raise RangeNotSatisfiable(size)
+        return max(0, size - length), size - 1
+    start, end = int(first), int(last) if last else None
+
+    if end is not None and start > end:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable(size)
+    return start, size - 1 if end is None else min(end, size - 1)
+
+
+class FileRangeResponse(Response):
+    """
+    Streams an open file, or a single byte range of it, closing it once it's sent
+
+    The file is handed to the server to send with sendfile(2) when it supports the zero-copy send extension, otherwise
+    it's read in chunks off the event loop.
+    """
+
+    chunk_size = 64 * 1024
+
+    def __init__(self, file: BinaryIO, size: int, media_type: str, byte_range: Optional[tuple[int, int]] = None,
+                 headers: Optional[Mapping[str, str]] = None):
+        self.file = file
+        self.media_type = media_type
+        self.background = None
+        if byte_range is None:
+            self.status_code = 200
+            self.offset, self.length = 0, size
+        else:
+            self.status_code = 206
+            self.offset, self.length = byte_range[0], byte_range[1] - byte_range[0] + 1
+        self.init_headers(headers)
+        self.headers['Accept-Ranges'] = 'bytes'
+        self.headers['Content-Length'] = str(self.length)
+        if byte_range is not None:
+            self.headers['Content-Range'] = f'bytes {byte_range[0]}-{byte_range[1]}/{size}'
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await send({'type': 'http.response.start', 'status': self.status_code, 'headers': self.raw_headers})
+            if ZERO_COPY_SEND in scope.get('extensions', {}):
+                await send({'type': ZERO_COPY_SEND, 'file': self.file, 'offset': self.offset, 'count': self.length,
+                            'more_body': False})
+                return
+
+            offset, remaining = self.offset, self.length
+            while True:
+                chunk = b''
+                if remaining:
+                    chunk = await anyio.to_thread.run_sync(os.pread, self.file.fileno(),
+                                                           min(self.chunk_size, remaining), offset)
+                offset += len(chunk)
+                remaining = remaining - len(chunk) if chunk else 0
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': remaining > 0})
+                if not remaining:
+                    break
+        finally:
+            self.file.close()
@@ -0,0 +1,134 @@
+import asyncio
+import logging
+from typing import Optional
+
+import orjson
+import psycopg
+
+from helpers.cache import chart_cache, ChartCache
+from helpers.database import DATABASE_URL, INVALIDATION_CHANNEL, get_dataset_version
+
+logger = logging.getLogger(__name__)
+
+
+class InvalidationBus:
+    """
+    Keeps the worker's chart cache coherent with writes made by any worker
+
+    Writes announce the dataset version and the ICAO codes they changed on INVALIDATION_CHANNEL, the bus listens on a
+    dedicated connection, outside the pool, and evicts those codes. While the connection is down it polls the dataset
+    version instead and drops the whole cache when it changes, since the codes that changed are unknown.
+
+    While listening the version is also read over the listener connection every interval, and the connection uses TCP
+    keepalives and a user timeout, so a half-open connection errors out and falls back to polling instead of leaving
+    the bus waiting for announcements that never arrive.
+
+    Attributes:
+        interval (float): Seconds between version polls, and reconnection attempts, while not listening
+        version (int): Last dataset version the cache is known to be coherent with
+        listening (bool): Whether the listener connection is up
+    """
+
+    def __init__(self, cache: ChartCache, conninfo: str, interval: float = 5.0):
+        self.interval = interval
+        self.version: Optional[int] = None
+        self.listening = False
+        self.__cache = cache
+        self.__conninfo = conninfo
+        self.__task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        """Starts listening in the background"""
+        if self.__task is None:
+            self.__task = asyncio.create_task(self.__run())
+
+    async def stop(self) -> None:
+        """Stops listening and closes the listener connection"""
+        if self.__task is not None:
+            self.__task.cancel()
+            await asyncio.gather(self.__task, return_exceptions=True)
+            self.__task = None
+
+    def catch_up(self, version: int) -> None:
+        """Drops the whole cache if the dataset changed since the last known version
+
+        Args:
+            version: Current dataset version
+        """
+        if self.version is not None and version != self.version:
+            logger.info('Dataset moved from version %s to %s unannounced, clearing the chart cache',
+                        self.version, version)
+            self.__cache.clear()
+        self.version = version
+
+    def handle(self, payload: str) -> None:
+        """Evicts the codes of an announcement from the cache
+
+        Args:
+            payload: JSON announcement with the dataset version and the changed ICAO codes, None codes means all
+        """
+        try:
+            announcement = orjson.loads(payload)
+            version, codes = announcement['version'], announcement['codes']
+        except (orjson.JSONDecodeError, KeyError, TypeError):
+            logger.warning('Ignoring malformed invalidation %r', payload)
+            return
+
+        if codes is None:
+            self.__cache.clear()
+        else:
+            self.__cache.invalidate(codes)
+        self.version = max(version, self.version or 0)
+
+    async def __check_version(self, connection: psycopg.AsyncConnection) -> None:
+        cursor = await connection.execute('SELECT version FROM dataset')
+        self.catch_up((await cursor.fetchone())[0])
+
+    async def __wait_readable(self, connection: psycopg.AsyncConnection) -> None:
+        readable = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        loop.add_reader(connection.fileno(), readable.set)
+        try:
+            await asyncio.wait_for(readable.wait(), self.interval)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            loop.remove_reader(connection.fileno())
+
+    async def __listen(self) -> None:
+        async with await psycopg.AsyncConnection.connect(self.__conninfo, autocommit=True,
+                                                         connect_timeout=max(1, round(self.interval)),
+                                                         keepalives=1, keepalives_idle=30, keepalives_interval=10,
+                                                         keepalives_count=3, tcp_user_timeout=30000) as connection:
+            connection.add_notify_handler(lambda notify: self.handle(notify.payload))
+            await connection.execute(f'LISTEN {INVALIDATION_CHANNEL}')
+
+            # @NOTE(Mauro): The version is read after LISTEN so any write committed after it is announced, the ones
+            #               committed while the bus wasn't listening are caught by the version check
+            await self.__check_version(connection)
+            self.listening = True
+            logger.info('Listening for chart invalidations')
+            # @NOTE(Mauro): A pending notifies() can't be given up on, cancelling it leaves psycopg waiting on the
+            #               socket for the cancelled wait, so the bus waits for the socket itself. Reading the version
+            #               hands any announcements that arrived to the handler before the result
+            while True:
+                await self.__wait_readable(connection)
+                await self.__check_version(connection)
+
+    async def __run(self) -> None:
+        while True:
+            try:
+                await self.__listen()
+            except psycopg.Error as exception:
+                logger.warning('Chart invalidation listener is down, polling the dataset version: %r', exception)
+            finally:
+                self.listening = False
+
+            await asyncio.sleep(self.interval)
+            try:
+                self.catch_up(await get_dataset_version())
+            except psycopg.Error as exception:
+                logger.warning('Failure polling the dataset version: %r', exception)
+
+
+invalidation_bus = InvalidationBus(chart_cache, DATABASE_URL)
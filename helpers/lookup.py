@@ -0,0 +1,39 @@
+from typing import Optional
+
+from helpers.classes import AnyChart
+
+# Runway designator used by charts that apply to every runway of the airport
+ANY_RUNWAY = '*'
+
+
+def normalize_runway(runway: str) -> str:
+    """Normalizes a runway designator so 3, 03 and 03l all compare equal
+
+    Args:
+        runway: Runway designator, e.g. 03 or 21L
+
+    Returns: str
+    """
+    runway = runway.strip().upper()
+    if runway[:1].isdigit() and not runway[1:2].isdigit():
+        runway = '0' + runway
+    return runway
+
+
+def charts_for_runway(charts: list[AnyChart], runway: str, chart_type: Optional[str] = None) -> list[AnyChart]:
+    """Filters an airport's charts down to the ones for a runway, charts for every runway (['*']) included
+
+    Args:
+        charts: Charts of the airport
+        runway: Runway designator to look for
+        chart_type: Only keep charts of this type
+
+    Returns: list[AnyChart]
+    """
+    runway = normalize_runway(runway)
+
+    # @NOTE(Mauro): Only runway charts have runways, and a runway chart without any isn't tied to a specific runway so
+    #               it's left out just like the charts of other types
+    return [chart for chart in charts
+            if (chart_type is None or chart.type == chart_type) and getattr(chart, 'runways', None)
+            and (ANY_RUNWAY in chart.runways or runway in map(normalize_runway, chart.runways))]
@@ -0,0 +1,158 @@
+import asyncio
+import zlib
+from typing import AsyncIterator, Optional
+
+import orjson
+from fastapi import HTTPException
+from pydantic import ValidationError
+
+from helpers.classes import AnyChart
+from helpers.exceptions import InvalidManifestLine, InvalidManifestEncoding, ManifestReadTimedOut
+from helpers.factories import chart_factory
+
+# @NOTE(Mauro): Upper bounds for what's held in memory while reading a streamed manifest, a single chart is well under
+#               a kilobyte so a line over the limit is either garbage or an attempt to exhaust the container's memory
+MAX_LINE_BYTES = 1024 * 1024
+DECOMPRESSED_CHUNK_BYTES = 64 * 1024
+COMPRESSED_ENCODINGS = ('gzip', 'x-gzip', 'deflate')
+
+
+def manifest_encoding(content_encoding: Optional[str]) -> str:
+    """Normalizes the Content-Encoding of a streamed manifest
+
+    Args:
+        content_encoding: Content-Encoding header of the request, if any
+
+    Returns: str identity, or one of COMPRESSED_ENCODINGS
+
+    Raises:
+        HTTPException: 415 if the content encoding isn't supported
+    """
+    encoding = (content_encoding or 'identity').strip().lower()
+    if encoding != 'identity' and encoding not in COMPRESSED_ENCODINGS:
+        raise HTTPException(415, f'Unsupported Content-Encoding {content_encoding}')
+    return encoding
+
+
+async def __read_timeout(chunks: AsyncIterator[bytes], timeout: float) -> AsyncIterator[bytes]:
+    """Fails a stream that goes longer than timeout seconds without a chunk
+
+    Args:
+        chunks: Chunks of the stream
+        timeout: Seconds to wait for each chunk
+
+    Returns: AsyncIterator[bytes] of the same chunks
+
+    Raises:
+        ManifestReadTimedOut: If a chunk takes longer than timeout to arrive
+    """
+    iterator = chunks.__aiter__()
+    while True:
+        try:
+            chunk = await asyncio.wait_for(iterator.__anext__(), timeout)
+        except StopAsyncIteration:
+            return
+        except asyncio.TimeoutError:
+            raise ManifestReadTimedOut(timeout)
+        yield chunk
+
+
+async def __decompress(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Inflates a gzip or zlib stream without ever holding more than DECOMPRESSED_CHUNK_BYTES of its output
+
+    Args:
+        chunks: Compressed chunks
+
+    Returns: AsyncIterator[bytes] of decompressed chunks
+
+    Raises:
+        InvalidManifestEncoding: If the stream is corrupt or ends before the compressed data does
+    """
+
+    # @NOTE(Mauro): wbits 32 + MAX_WBITS detects gzip or zlib headers automatically
+    decompressor = zlib.decompressobj(32 + zlib.MAX_WBITS)
+    try:
+        async for chunk in chunks:
+            while chunk:
+                yield decompressor.decompress(chunk, DECOMPRESSED_CHUNK_BYTES)
+                chunk = decompressor.unconsumed_tail
+        yield decompressor.flush()
+    except zlib.error as e:
+        raise InvalidManifestEncoding(str(e))
+    # @NOTE(Mauro): A body cut short decompresses cleanly up to the cut, only the missing end of stream gives it away
+    if not decompressor.eof:
+        raise InvalidManifestEncoding('the body ends before the compressed stream does')
+
+
+async def __lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Splits a stream of chunks into lines
+
+    Args:
+        chunks: Chunks of the stream
+
+    Returns: AsyncIterator[bytes] of lines without the line break
+
+    Raises:
+        InvalidManifestLine: If a line is longer than MAX_LINE_BYTES
+    """
+    pending = b''
+    number = 0
+    async for chunk in chunks:
+        pending += chunk
+        lines = pending.split(b'\n')
+        pending = lines.pop()
+        for line in lines:
+            number += 1
+            yield line
+        if len(pending) > MAX_LINE_BYTES:
+            raise InvalidManifestLine(number + 1, f'longer than {MAX_LINE_BYTES} bytes')
+    if pending:
+        yield pending
+
+
+async def read_chart_batches(chunks: AsyncIterator[bytes], batch_size: int, content_encoding: Optional[str] = None,
+                             read_timeout: Optional[float] = None) -> AsyncIterator[list[AnyChart]]:
+    """Reads a NDJSON manifest, one chart per line, in batches of validated charts
+
+    Only one batch and one line are held in memory at a time, regardless of the size of the manifest. Blank lines are
+    skipped.
+
+    Args:
+        chunks: Chunks of the request body
+        batch_size: Maximum number of charts per batch
+        content_encoding: Content-Encoding of the request body, gzip and deflate are decompressed on the fly
+        read_timeout: Seconds to wait for each chunk of the body, no limit if None
+
+    Returns: AsyncIterator[list[AnyChart]]
+
+    Raises:
+        InvalidManifestLine: If a line isn't valid JSON or a valid chart
+        InvalidManifestEncoding: If a compressed body is corrupt or truncated
+        ManifestReadTimedOut: If a chunk of the body takes longer than read_timeout to arrive
+        HTTPException: 415 if the content encoding isn't supported
+    """
+    encoding = manifest_encoding(content_encoding)
+    if read_timeout is not None:
+        chunks = __read_timeout(chunks, read_timeout)
+    if encoding in COMPRESSED_ENCODINGS:
+        chunks = __decompress(chunks)
+
+    batch: list[AnyChart] = []
+    number = 0
+    async for line in __lines(chunks):
+        number += 1
+        if not line.strip():
+            continue
+        try:
+            batch.append(chart_factory(orjson.loads(line)))
+        except orjson.JSONDecodeError as e:
+            raise InvalidManifestLine(number, str(e))
+        except KeyError as e:
+            raise InvalidManifestLine(number, f'missing field {e}')
+        except (ValidationError, TypeError) as e:
+            raise InvalidManifestLine(number, str(e).splitlines()[0])
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
@@ -0,0 +1,170 @@
+import time
+from typing import Iterable, TYPE_CHECKING
+
+from prometheus_client import Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from prometheus_client.registry import Collector
+from psycopg_pool import AsyncConnectionPool
+
+from helpers.singleflight import SingleFlight
+
+if TYPE_CHECKING:
+    from helpers.cache import ChartCache
+    from helpers.files import ChartFileStore
+    from helpers.scheduler import CoverageScheduler
+
+# @NOTE(Mauro): Building and serializing an airport's charts takes well under a millisecond, the default buckets
+#               start at 5ms and would put every observation in the first one
+FAST_BUCKETS = (.0001, .00025, .0005, .001, .0025, .005, .01, .025, .05, .1, .25)
+SIZE_BUCKETS = (1e4, 5e4, 1e5, 5e5, 1e6, 5e6, 1e7, 5e7)
+
+REQUEST_DURATION = Histogram('http_request_duration_seconds', 'Time spent handling requests',
+                             ['route', 'method', 'status'])
+DATABASE_FUNCTION_DURATION = Histogram('database_function_duration_seconds',
+                                       'Time spent in database functions, pool wait included', ['function'])
+POOL_WAIT = Histogram('database_pool_wait_seconds', 'Time spent waiting for a connection from the pool',
+                      buckets=FAST_BUCKETS + (.5, 1, 2.5, 5, 10))
+CHART_FACTORY_DURATION = Histogram('chart_factory_duration_seconds', 'Time spent building charts from database rows',
+                                   buckets=FAST_BUCKETS)
+CHART_SERIALIZATION_DURATION = Histogram('chart_serialization_duration_seconds',
+                                         'Time spent serializing the charts of an airport', buckets=FAST_BUCKETS)
+CHART_COMPRESSION_DURATION = Histogram('chart_compression_duration_seconds',
+                                       'Time spent compressing a serialized body of an airport\'s charts',
+                                       buckets=FAST_BUCKETS)
+COVERAGE_FETCH_DURATION = Histogram('coverage_fetch_duration_seconds', 'Time spent fetching coverage feeds',
+                                    ['provider'])
+COVERAGE_FETCH_BYTES = Histogram('coverage_fetch_bytes', 'Size of the fetched coverage feeds', ['provider'],
+                                 buckets=SIZE_BUCKETS)
+CHART_FILE_FETCH_DURATION = Histogram('chart_file_fetch_duration_seconds',
+                                      'Time spent fetching chart files from their sources',
+                                      buckets=(.1, .25, .5, 1, 2.5, 5, 10, 30, 60))
+CHART_FILE_FETCH_BYTES = Histogram('chart_file_fetch_bytes', 'Size of the fetched chart files', buckets=SIZE_BUCKETS)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing every HTTP request by route template, method and status code
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.__routes: dict = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            REQUEST_DURATION.labels(self.__route(scope), scope['method'], status).observe(time.perf_counter() - start)
+
+    def __route(self, scope) -> str:
+        # @NOTE(Mauro): The router leaves the matched endpoint in the scope, its path template is used instead of the
+        #               request path so every airport doesn't get its own series
+        endpoint = scope.get('endpoint')
+        if endpoint not in self.__routes:
+            self.__routes[endpoint] = next((route.path for route in scope['app'].routes
+                                            if getattr(route, 'endpoint', None) is endpoint), 'unmatched')
+        return self.__routes[endpoint]
+
+
+class PoolCollector(Collector):
+    """
+    Reports the size and usage of a connection pool at scrape time
+    """
+
+    def __init__(self, pool: AsyncConnectionPool):
+        self.__pool = pool
+
+    def collect(self) -> Iterable[GaugeMetricFamily]:
+        stats = self.__pool.get_stats()
+        size = stats.get('pool_size', 0)
+        available = stats.get('pool_available', 0)
+        yield GaugeMetricFamily('database_pool_size', 'Connections open in the pool', size)
+        yield GaugeMetricFamily('database_pool_available', 'Idle connections in the pool', available)
+        yield GaugeMetricFamily('database_pool_in_use', 'Connections lent out by the pool', size - available)
+        yield GaugeMetricFamily('database_pool_max_size', 'Maximum connections of the pool', stats.get('pool_max', 0))
+        yield GaugeMetricFamily('database_pool_requests_waiting', 'Requests waiting for a connection',
+                                stats.get('requests_waiting', 0))
+
+
+class ChartCacheCollector(Collector):
+    """
+    Reports the hits, misses, hit ratio and occupancy of a chart cache at scrape time
+    """
+
+    def __init__(self, cache: 'ChartCache'):
+        self.__cache = cache
+
+    def collect(self) -> Iterable[GaugeMetricFamily | CounterMetricFamily]:
+        hits, misses = self.__cache.hits, self.__cache.misses
+        yield CounterMetricFamily('chart_cache_hits', 'Chart cache lookups that found the airport', hits)
+        yield CounterMetricFamily('chart_cache_misses', 'Chart cache lookups that didn\'t find the airport', misses)
+        yield GaugeMetricFamily('chart_cache_hit_ratio', 'Share of chart cache lookups that were hits since start',
+                                hits / (hits + misses) if hits + misses else 0.0)
+        yield GaugeMetricFamily('chart_cache_entries', 'Airports in the chart cache', len(self.__cache))
+        yield GaugeMetricFamily('chart_cache_bytes', 'Estimated size of the chart cache', self.__cache.size)
+
+
+class SingleFlightCollector(Collector):
+    """
+    Reports the originating and coalesced calls of single-flight groups at scrape time
+    """
+
+    def __init__(self, groups: list[SingleFlight]):
+        self.__groups = groups
+
+    def collect(self) -> Iterable[CounterMetricFamily | GaugeMetricFamily]:
+        originating = CounterMetricFamily('singleflight_originating', 'Calls that started a computation',
+                                          labels=['group'])
+        coalesced = CounterMetricFamily('singleflight_coalesced', 'Calls that joined a computation in flight',
+                                        labels=['group'])
+        in_flight = GaugeMetricFamily('singleflight_in_flight', 'Computations in flight', labels=['group'])
+        for group in self.__groups:
+            originating.add_metric([group.name], group.originating)
+            coalesced.add_metric([group.name], group.coalesced)
+            in_flight.add_metric([group.name], len(group))
+        yield from [originating, coalesced, in_flight]
+
+
+class ChartFileStoreCollector(Collector):
+    """
+    Reports the hits, misses and occupancy of a chart file store at scrape time
+    """
+
+    def __init__(self, store: 'ChartFileStore'):
+        self.__store = store
+
+    def collect(self) -> Iterable[GaugeMetricFamily | CounterMetricFamily]:
+        yield CounterMetricFamily('chart_file_store_hits', 'Chart file requests served from the store',
+                                  self.__store.hits)
+        yield CounterMetricFamily('chart_file_store_misses', 'Chart file requests that had to fetch the file',
+                                  self.__store.misses)
+        yield CounterMetricFamily('chart_file_store_evictions', 'Chart files evicted from the store',
+                                  self.__store.evictions)
+        yield GaugeMetricFamily('chart_file_store_bytes', 'Size of the chart files in the store', self.__store.size)
+        yield GaugeMetricFamily('chart_file_store_max_bytes', 'Size cap of the chart file store',
+                                self.__store.max_bytes)
+
+
+class CoverageSchedulerCollector(Collector):
+    """
+    Reports how many airports a coverage scheduler loaded into the chart cache at scrape time
+    """
+
+    def __init__(self, scheduler: 'CoverageScheduler'):
+        self.__scheduler = scheduler
+
+    def collect(self) -> Iterable[CounterMetricFamily]:
+        yield CounterMetricFamily('chart_cache_prewarmed', 'Airports loaded into the chart cache ahead of requests '
+                                  'because they\'re active on a coverage provider', self.__scheduler.prewarmed)
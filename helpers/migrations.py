@@ -0,0 +1,170 @@
+import psycopg
+
+# @NOTE(Mauro): Arbitrary key for the advisory lock held while migrating, every worker runs the migrations on startup
+#               and the lock makes them take turns, the ones that wait find the schema already up to date
+MIGRATION_LOCK = 0x4C434D49
+
+# @NOTE(Mauro): pg_trgm ships with Postgres but isn't always installed or allowed on managed databases, without it the
+#               search only does prefix matching. These run again on every startup so installing it later and
+#               restarting enables the similarity search
+ENABLE_TRIGRAMS = [
+    """DO $$ BEGIN CREATE EXTENSION IF NOT EXISTS pg_trgm;
+       EXCEPTION WHEN undefined_file OR insufficient_privilege OR feature_not_supported THEN
+           RAISE NOTICE 'pg_trgm is not available, chart search only does prefix matching';
+       END $$""",
+    """DO $$ BEGIN IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') THEN
+           CREATE INDEX IF NOT EXISTS charts_search_trgm_idx ON charts
+           USING GIN (chart_search_text(title, icao_code, subtype, sids, stars) gin_trgm_ops);
+       END IF; END $$""",
+]
+
+# Ordered list of migrations, the schema version is the number of migrations applied. Never edit or reorder an
+# existing migration, append a new one instead.
+MIGRATIONS: list[tuple[str, list[str]]] = [
+    ("Create charts table", [
+        """CREATE TABLE IF NOT EXISTS charts(
+           title TEXT NOT NULL,
+           type TEXT NOT NULL,
+           filename TEXT NOT NULL UNIQUE,
+           filetype TEXT NOT NULL,
+           source JSON NOT NULL,
+           icao_code TEXT NOT NULL,
+           subtype TEXT,
+           runways TEXT[],
+           sids TEXT[],
+           stars TEXT[])""",
+    ]),
+    ("Create airport registry", [
+        """CREATE TABLE IF NOT EXISTS airports(
+           icao_code TEXT PRIMARY KEY,
+           chart_count INTEGER NOT NULL,
+           updated_at TIMESTAMPTZ NOT NULL DEFAULT now())""",
+        """INSERT INTO airports(icao_code, chart_count) SELECT icao_code, COUNT(*) FROM charts
+           WHERE NOT EXISTS (SELECT 1 FROM airports) GROUP BY icao_code""",
+    ]),
+    ("Index charts by ICAO code", [
+        "CREATE INDEX IF NOT EXISTS charts_icao_code_idx ON charts (icao_code)",
+    ]),
+    ("Index charts by ICAO code and type", [
+        "CREATE INDEX IF NOT EXISTS charts_icao_code_type_idx ON charts (icao_code, type)",
+    ]),
+    ("Index runways and procedures", [
+        "CREATE INDEX IF NOT EXISTS charts_runways_idx ON charts USING GIN (runways)",
+        "CREATE INDEX IF NOT EXISTS charts_sids_idx ON charts USING GIN (sids)",
+        "CREATE INDEX IF NOT EXISTS charts_stars_idx ON charts USING GIN (stars)",
+    ]),
+    ("Version airports and dataset", [
+        "ALTER TABLE airports ADD COLUMN IF NOT EXISTS version TEXT",
+        """UPDATE airports SET version = hashes.version FROM (
+           SELECT icao_code, md5(string_agg(row_to_json(charts)::text, ',' ORDER BY filename)) AS version
+           FROM charts GROUP BY icao_code) hashes
+           WHERE airports.icao_code = hashes.icao_code""",
+        """CREATE TABLE IF NOT EXISTS dataset(
+           id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+           version BIGINT NOT NULL,
+           updated_at TIMESTAMPTZ NOT NULL DEFAULT now())""",
+        "INSERT INTO dataset(version) VALUES (1) ON CONFLICT DO NOTHING",
+    ]),
+    ("Hash chart contents", [
+        "ALTER TABLE charts ADD COLUMN IF NOT EXISTS hash TEXT",
+        """UPDATE charts SET hash = md5(ROW(title, type, filename, filetype, source::text, icao_code, subtype,
+           runways, sids, stars)::text)""",
+    ]),
+    ("Search charts", [
+        # @NOTE(Mauro): to_tsvector with an explicit configuration is immutable but array_to_string and concat_ws are
+        #               only stable because of their "any" variants, for text they're immutable so the wrapper can be
+        #               declared as such and used in an index. Codes and procedures weigh more than the title
+        """CREATE OR REPLACE FUNCTION chart_search_vector(title TEXT, icao_code TEXT, subtype TEXT, sids TEXT[],
+           stars TEXT[]) RETURNS TSVECTOR LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+           SELECT setweight(to_tsvector('simple', concat_ws(' ', icao_code, array_to_string(sids, ' '),
+                                                            array_to_string(stars, ' '))), 'A')
+               || setweight(to_tsvector('simple', title), 'B')
+               || setweight(to_tsvector('simple', coalesce(subtype, '')), 'C') $$""",
+        """CREATE INDEX IF NOT EXISTS charts_search_idx ON charts
+           USING GIN (chart_search_vector(title, icao_code, subtype, sids, stars))""",
+    ]),
+    ("Store chart files", [
+        # @NOTE(Mauro): version is the hash of the chart row the file was fetched for, when the chart changes the file
+        #               is fetched again. The files themselves live on disk, see helpers/files.py
+        """CREATE TABLE IF NOT EXISTS chart_files(
+           filename TEXT PRIMARY KEY REFERENCES charts (filename) ON DELETE CASCADE ON UPDATE CASCADE,
+           version TEXT NOT NULL,
+           digest TEXT NOT NULL,
+           size BIGINT NOT NULL,
+           fetched_at TIMESTAMPTZ NOT NULL DEFAULT now())""",
+    ]),
+    ("Record coverage history", [
+        # @NOTE(Mauro): ICAO codes are interned so the history only stores integers, samples counts the snapshots of
+        #               a bucket an airport was active in and polls how many snapshots the bucket has
+        """CREATE TABLE IF NOT EXISTS coverage_airports(
+           id SERIAL PRIMARY KEY,
+           icao_code TEXT NOT NULL UNIQUE)""",
+        """CREATE TABLE IF NOT EXISTS coverage_polls(
+           provider TEXT NOT NULL,
+           resolution TEXT NOT NULL CHECK (resolution IN ('hour', 'day')),
+           bucket TIMESTAMPTZ NOT NULL,
+           polls INTEGER NOT NULL,
+           last_slot BIGINT NOT NULL,
+           PRIMARY KEY (provider, resolution, bucket))""",
+        """CREATE TABLE IF NOT EXISTS coverage_history(
+           provider TEXT NOT NULL,
+           resolution TEXT NOT NULL CHECK (resolution IN ('hour', 'day')),
+           bucket TIMESTAMPTZ NOT NULL,
+           airport_id INTEGER NOT NULL REFERENCES coverage_airports (id),
+           samples INTEGER NOT NULL,
+           PRIMARY KEY (provider, resolution, bucket, airport_id))""",
+    ]),
+    ("Search charts by similarity", [
+        # @NOTE(Mauro): Same fields as chart_search_vector as plain lowercase text, for trigram matching
+        """CREATE OR REPLACE FUNCTION chart_search_text(title TEXT, icao_code TEXT, subtype TEXT, sids TEXT[],
+           stars TEXT[]) RETURNS TEXT LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+           SELECT lower(concat_ws(' ', icao_code, array_to_string(sids, ' '), array_to_string(stars, ' '), title,
+                                  subtype)) $$""",
+        *ENABLE_TRIGRAMS,
+    ]),
+]
+
+
+async def get_schema_version(cursor: psycopg.AsyncCursor) -> int:
+    """Returns the schema version of the database
+
+    Returns: int
+    """
+    await cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+    return (await cursor.fetchone())[0]
+
+
+async def enable_trigrams(cursor: psycopg.AsyncCursor) -> bool:
+    """Installs pg_trgm and the trigram search index if they're available and missing
+
+    Must run after migrating, in the same transaction.
+
+    Returns: bool whether pg_trgm is installed
+    """
+    for statement in ENABLE_TRIGRAMS:
+        await cursor.execute(statement)
+    await cursor.execute("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')")
+    return (await cursor.fetchone())[0]
+
+
+async def migrate(cursor: psycopg.AsyncCursor) -> int:
+    """Applies every pending migration in order
+
+    Must run inside a transaction, the advisory lock is released when it commits.
+
+    Returns: int the schema version after migrating
+    """
+    await cursor.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK,))
+    await cursor.execute("""CREATE TABLE IF NOT EXISTS schema_version(
+                            version INTEGER PRIMARY KEY,
+                            description TEXT NOT NULL,
+                            applied_at TIMESTAMPTZ NOT NULL DEFAULT now())""")
+
+    version = await get_schema_version(cursor)
+    for number, (description, statements) in enumerate(MIGRATIONS[version:], start=version + 1):
+        for statement in statements:
+            await cursor.execute(statement)
+        await cursor.execute("INSERT INTO schema_version(version, description) VALUES (%s, %s)",
+                             (number, description))
+
+    return max(version, len(MIGRATIONS))
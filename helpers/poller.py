@@ -0,0 +1,143 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional
+
+from fastapi import HTTPException
+
+from helpers.classes import CoverageStatistics, Providers
+from helpers.coverage import get_poscon_statistics, get_vatsim_statistics, get_stp_statistics
+from helpers.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True, slots=True)
+class CoverageSnapshot:
+    """
+    Represents an immutable snapshot of a provider's coverage statistics
+
+    Attributes:
+        statistics (CoverageStatistics): Statistics built from the upstream feed
+        fetched_at (float): Unix timestamp of when the feed was fetched
+    """
+
+    statistics: CoverageStatistics
+    fetched_at: float
+
+    @property
+    def age(self) -> float:
+        return max(0.0, time.time() - self.fetched_at)
+
+
+class CoveragePoller:
+    """
+    Polls every coverage provider on an interval and publishes the results as snapshots served from memory
+
+    Attributes:
+        interval (float): Seconds between polls, snapshots older than this are considered stale
+        snapshots (dict[Providers, CoverageSnapshot]): Last good snapshot for each provider
+        flights (SingleFlight): Refreshes in flight, one per provider at most
+        listeners (list[Callable[[Providers, CoverageSnapshot], None]]): Called with every new snapshot as soon as
+                                                                          it's published, must not block
+    """
+
+    def __init__(self, fetchers: dict[Providers, Callable[[], Awaitable[CoverageStatistics]]],
+                 interval: float = 60.0):
+        self.interval = interval
+        self.snapshots: dict[Providers, CoverageSnapshot] = {}
+        self.flights = SingleFlight('coverage')
+        self.listeners: list[Callable[[Providers, CoverageSnapshot], None]] = []
+        self.__fetchers = fetchers
+        self.__task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        """Starts the background polling task"""
+        if self.__task is None:
+            self.__task = asyncio.create_task(self.__poll())
+
+    async def stop(self) -> None:
+        """Stops the background polling task and any refresh in flight"""
+        if self.__task is not None:
+            self.__task.cancel()
+            await asyncio.gather(self.__task, return_exceptions=True)
+            self.__task = None
+        await self.flights.cancel()
+
+    async def get(self, provider: Providers) -> CoverageSnapshot:
+        """Returns the latest snapshot for a provider
+
+        Stale snapshots are served as they are while a refresh runs in the background, a provider is only fetched in
+        the foreground when there's no snapshot for it yet.
+
+        Args:
+            provider: The coverage provider
+
+        Returns: CoverageSnapshot
+        Raises:
+            HTTPException: When there's no snapshot yet and the upstream fetch fails
+        """
+        snapshot = self.snapshots.get(provider)
+        if snapshot is None:
+            return await self.refresh(provider)
+        if snapshot.age > self.interval:
+            self.refresh_in_background(provider)
+        return snapshot
+
+    def refresh_in_background(self, provider: Providers) -> asyncio.Task:
+        """Schedules a refresh of a provider unless one is already in flight
+
+        Args:
+            provider: The coverage provider
+
+        Returns: asyncio.Task of the refresh in flight
+        """
+        return self.flights.start(provider, lambda: self.__refresh(provider))
+
+    async def refresh(self, provider: Providers) -> CoverageSnapshot:
+        """Fetches a provider's feed and publishes a new snapshot, joining the refresh in flight if there's one
+
+        If the upstream fails the last good snapshot is kept and returned.
+
+        Args:
+            provider: The coverage provider
+
+        Returns: CoverageSnapshot
+        Raises:
+            HTTPException: When the upstream fetch fails and there's no previous snapshot to fall back to
+        """
+        return await self.flights.do(provider, lambda: self.__refresh(provider))
+
+    async def __refresh(self, provider: Providers) -> CoverageSnapshot:
+        try:
+            statistics = await self.__fetchers[provider]()
+        except Exception as exception:
+            logger.warning('Failure refreshing %s coverage: %r', provider, exception)
+            if provider in self.snapshots:
+                return self.snapshots[provider]
+            if isinstance(exception, HTTPException):
+                raise
+            raise HTTPException(status_code=502, detail=f'Failure fetching {provider} coverage')
+
+        snapshot = CoverageSnapshot(statistics, time.time())
+        self.snapshots[provider] = snapshot
+        for listener in self.listeners:
+            try:
+                listener(provider, snapshot)
+            except Exception as exception:
+                logger.warning('Failure notifying %s coverage snapshot: %r', provider, exception)
+        return snapshot
+
+    async def __poll(self) -> None:
+        while True:
+            for provider in self.__fetchers:
+                self.refresh_in_background(provider)
+            await asyncio.sleep(self.interval)
+
+
+coverage_poller = CoveragePoller({
+    Providers.poscon: get_poscon_statistics,
+    Providers.vatsim: get_vatsim_statistics,
+    Providers.stp: get_stp_statistics,
+})
@@ -0,0 +1,112 @@
+import logging
+from functools import partial
+from typing import Optional
+
+from helpers.cache import chart_cache
+from helpers.classes import CoverageGaps, CoverageStatistics, Providers
+from helpers.database import get_airports_charts, get_dataset_version, get_icao_codes
+from helpers.poller import CoverageSnapshot, coverage_poller
+from helpers.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Airports loaded per query when prewarming
+PREWARM_BATCH_SIZE = 50
+
+
+def active_airports(statistics: CoverageStatistics) -> list[str]:
+    """Returns the airports active on a provider, departures first, then arrivals and then alternates
+
+    Args:
+        statistics: The provider's coverage statistics
+
+    Returns: list[str] of unique ICAO codes
+    """
+    airports = (statistics.departure_airports or []) + (statistics.arrival_airports or []) + \
+        (statistics.alternate_airports or [])
+    return list(dict.fromkeys(airports))
+
+
+class CoverageScheduler:
+    """
+    Acts on every new coverage snapshot, loading the charts of the active airports into the chart cache before anyone
+    asks for them and working out which active airports have no charts at all
+
+    Attributes:
+        budget (int): Most airports loaded per snapshot, 0 disables prewarming
+        prewarmed (int): Number of airports loaded into the chart cache by prewarming
+        flights (SingleFlight): Gap reports and prewarms in flight, one of each per snapshot at most
+    """
+
+    def __init__(self, budget: int = 200):
+        self.budget = budget
+        self.prewarmed = 0
+        self.flights = SingleFlight('coverage_scheduler')
+        self.__gaps: dict[Providers, tuple[CoverageSnapshot, CoverageGaps]] = {}
+        self.__codes: set[str] = set()
+        self.__codes_version: Optional[int] = None
+
+    def handle(self, provider: Providers, snapshot: CoverageSnapshot) -> None:
+        """Prewarms the chart cache for a new snapshot in the background, meant to be a coverage poller listener
+
+        Args:
+            provider: The coverage provider
+            snapshot: The new snapshot
+        """
+        self.flights.start(('prewarm', provider, snapshot.fetched_at), partial(self.__prewarm, provider, snapshot))
+
+    async def gaps(self, provider: Providers, snapshot: CoverageSnapshot) -> CoverageGaps:
+        """Returns the airports active in a snapshot that have no charts, computed once per snapshot
+
+        Args:
+            provider: The coverage provider
+            snapshot: The provider's snapshot
+
+        Returns: CoverageGaps
+        """
+        cached = self.__gaps.get(provider)
+        if cached is not None and cached[0] is snapshot:
+            return cached[1]
+        return await self.flights.do(('gaps', provider, snapshot.fetched_at),
+                                     partial(self.__compute_gaps, provider, snapshot))
+
+    async def stop(self) -> None:
+        """Cancels every gap report and prewarm in flight"""
+        await self.flights.cancel()
+
+    async def __compute_gaps(self, provider: Providers, snapshot: CoverageSnapshot) -> CoverageGaps:
+        active = active_airports(snapshot.statistics)
+        codes = await self.__icao_codes()
+        gaps = CoverageGaps(provider=provider, active=len(active),
+                            airports=sorted(code for code in active if code not in codes))
+        self.__gaps[provider] = (snapshot, gaps)
+        return gaps
+
+    async def __prewarm(self, provider: Providers, snapshot: CoverageSnapshot) -> None:
+        try:
+            await self.gaps(provider, snapshot)
+            if self.budget <= 0:
+                return
+
+            # @NOTE(Mauro): Airports already cached aren't loaded again, loading them would only refresh their place
+            #               in the LRU order at the cost of a query
+            codes = await self.__icao_codes()
+            airports = [code for code in active_airports(snapshot.statistics)
+                        if code in codes and code not in chart_cache][:self.budget]
+            for start in range(0, len(airports), PREWARM_BATCH_SIZE):
+                await get_airports_charts(airports[start:start + PREWARM_BATCH_SIZE])
+            self.prewarmed += len(airports)
+        except Exception as exception:
+            logger.warning('Failure prewarming charts for %s coverage: %r', provider, exception)
+
+    async def __icao_codes(self) -> set[str]:
+        """Returns the ICAO codes with charts, only read again when the dataset changes"""
+        version = await get_dataset_version()
+        if version != self.__codes_version:
+            self.__codes = await get_icao_codes()
+            self.__codes_version = version
+        return self.__codes
+
+
+coverage_scheduler = CoverageScheduler()
+coverage_poller.listeners.append(coverage_scheduler.handle)
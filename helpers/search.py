@@ -0,0 +1,36 @@
+import base64
+from typing import Optional
+
+import orjson
+from fastapi import HTTPException
+
+
+def encode_cursor(score: float, filename: str) -> str:
+    """Encodes the position of the last result of a search page as an opaque cursor
+
+    Args:
+        score: Score of the last result
+        filename: Filename of the last result
+
+    Returns: str
+    """
+    return base64.urlsafe_b64encode(orjson.dumps([score, filename])).decode().rstrip('=')
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[tuple[float, str]]:
+    """Decodes a cursor made by encode_cursor
+
+    Args:
+        cursor: Cursor from the previous page, if any
+
+    Returns: Optional[tuple[float, str]] the score and filename of the last result of the previous page
+    Raises:
+        HTTPException: 400 if the cursor is malformed
+    """
+    if not cursor:
+        return None
+    try:
+        score, filename = orjson.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return float(score), str(filename)
+    except (ValueError, TypeError):
+        raise HTTPException(400, 'Invalid search cursor')
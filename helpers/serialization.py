@@ -0,0 +1,74 @@
+from typing import Any
+
+import orjson
+from pydantic import BaseModel
+
+from helpers.classes import AnyChart
+
+
+def categorize_charts(charts: list[AnyChart]) -> dict[str, list[AnyChart]]:
+    """Groups charts by their type, keeping the order the types first appear in
+
+    Args:
+        charts: Charts to group
+
+    Returns: dict[str, list[AnyChart]]
+    """
+
+    # @NOTE(Mauro): There are more "pythonic" and code golfy style ways of doing this but this is O(n) whereas most of
+    #               those are O(n^2) or require iterating twice
+
+    d: dict[str, list[AnyChart]] = {}
+
+    for chart in charts:
+        if chart.type in d.keys():
+            d[chart.type] += [chart]
+        else:
+            d[chart.type] = [chart]
+
+    return d
+
+
+def __model_fields(model: BaseModel) -> dict[str, Any]:
+    return model.__dict__
+
+
+def serialize_charts(charts: list[AnyChart]) -> bytes:
+    """Serializes a list of charts to JSON, byte for byte the same as FastAPI's list[AnyChart] response
+
+    Args:
+        charts: Charts to serialize
+
+    Returns: bytes
+    """
+
+    # @NOTE(Mauro): Every chart field is a plain JSON type (or the Source model) and the model's __dict__ keeps the
+    #               declaration order, so it dumps to exactly what model_dump(mode='json') would without building a
+    #               copy of every chart
+    return orjson.dumps([chart.__dict__ for chart in charts], default=__model_fields)
+
+
+def serialize_categorized_charts(charts: list[AnyChart]) -> bytes:
+    """Serializes charts grouped by type to JSON, byte for byte the same as FastAPI's dict[str, list[AnyChart]]
+    response
+
+    Args:
+        charts: Charts to serialize
+
+    Returns: bytes
+    """
+    return orjson.dumps({key: [chart.__dict__ for chart in value] for key, value in categorize_charts(charts).items()},
+                        default=__model_fields)
+
+
+def serialize_chart_lines(charts: list[AnyChart]) -> bytes:
+    """Serializes charts to NDJSON, one chart per line in the same shape as the API's responses and /update/stream's
+    manifest
+
+    Args:
+        charts: Charts to serialize
+
+    Returns: bytes
+    """
+    return b''.join(orjson.dumps(chart.__dict__, default=__model_fields, option=orjson.OPT_APPEND_NEWLINE)
+                    for chart in charts)
@@ -0,0 +1,73 @@
+import asyncio
+from functools import partial
+from typing import Awaitable, Callable, Hashable, TypeVar
+
+T = TypeVar('T')
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent computations of the same key into a single one whose result every caller shares
+
+    Attributes:
+        name (str): Name of the group, used when reporting the counters
+        originating (int): Number of calls that started a computation
+        coalesced (int): Number of calls that joined a computation already in flight
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.originating = 0
+        self.coalesced = 0
+        self.__flights: dict[Hashable, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return len(self.__flights)
+
+    def start(self, key: Hashable, function: Callable[[], Awaitable[T]]) -> asyncio.Task:
+        """Starts computing a key unless it's already in flight
+
+        Args:
+            key: Key of the computation
+            function: Starts the computation, only called if the key isn't in flight
+
+        Returns: asyncio.Task of the computation in flight
+        """
+        task = self.__flights.get(key)
+        if task is None:
+            self.originating += 1
+            task = asyncio.create_task(function())
+            task.add_done_callback(partial(self.__landed, key))
+            self.__flights[key] = task
+        else:
+            self.coalesced += 1
+        return task
+
+    async def do(self, key: Hashable, function: Callable[[], Awaitable[T]]) -> T:
+        """Computes a key, or joins its computation if it's already in flight
+
+        The computation is shielded, a caller giving up doesn't cancel it for the others.
+
+        Args:
+            key: Key of the computation
+            function: Starts the computation, only called if the key isn't in flight
+
+        Returns: T the result of the computation
+        Raises:
+            Exception: Whatever the computation raised, every caller gets the same exception
+        """
+        return await asyncio.shield(self.start(key, function))
+
+    async def cancel(self) -> None:
+        """Cancels every computation in flight"""
+        tasks = list(self.__flights.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.__flights.clear()
+
+    def __landed(self, key: Hashable, task: asyncio.Task) -> None:
+        if self.__flights.get(key) is task:
+            del self.__flights[key]
+        if not task.cancelled():
+            task.exception()  # Marks the exception as retrieved, the callers awaiting the task already got it
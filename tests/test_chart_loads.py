@@ -0,0 +1,57 @@
+import asyncio
+
+from helpers import database
+from helpers.cache import chart_cache
+from helpers.factories import chart_factory
+
+CHART = {'icao_code': 'LPPT', 'title': 'LPPT ADC', 'type': 'ground', 'filename': 'lppt_adc.pdf',
+         'filetype': 'application/pdf', 'source': {'name': 'AIP', 'url': 'https://example.com', 'contributor': 'me'}}
+
+
+def __slow_fetch(monkeypatch) -> tuple[list[str], asyncio.Event]:
+    """Replaces the database read with one that waits for an event, returning the calls made and the event"""
+    calls: list[str] = []
+    landed = asyncio.Event()
+
+    async def fetch_charts_by_icao_code(icao_code: str):
+        calls.append(icao_code)
+        version = f'v{len(calls)}'
+        await landed.wait()
+        return [chart_factory(CHART)], version
+
+    monkeypatch.setattr(database, 'fetch_charts_by_icao_code', fetch_charts_by_icao_code)
+    return calls, landed
+
+
+def test_concurrent_loads_are_coalesced(monkeypatch):
+    async def run():
+        chart_cache.clear()
+        calls, landed = __slow_fetch(monkeypatch)
+        loads = [asyncio.create_task(database.get_airport_charts('LPPT')) for _ in range(5)]
+        await asyncio.sleep(0)
+        landed.set()
+        entries = await asyncio.gather(*loads)
+        assert calls == ['LPPT']
+        assert {entry.version for entry in entries} == {'v1'}
+
+    asyncio.run(run())
+
+
+def test_invalidation_during_load_starts_a_fresh_one(monkeypatch):
+    async def run():
+        chart_cache.clear()
+        calls, landed = __slow_fetch(monkeypatch)
+        before = asyncio.create_task(database.get_airport_charts('LPPT'))
+        await asyncio.sleep(0)
+        chart_cache.invalidate(['LPPT'])
+        after = asyncio.create_task(database.get_airport_charts('LPPT'))
+        await asyncio.sleep(0)
+        landed.set()
+
+        assert (await before).version == 'v1'
+        assert (await after).version == 'v2'
+        assert calls == ['LPPT', 'LPPT']
+        # The load that started before the invalidation must not have replaced the fresh entry
+        assert chart_cache.get('LPPT').version == 'v2'
+
+    asyncio.run(run())
@@ -0,0 +1,74 @@
+import json
+
+import ijson
+import pytest
+
+from helpers.classes import CoverageStatistics
+from helpers.coverage import parse_vatsim_json
+from helpers.feeds import VatsimFeedParser
+
+
+def __pilot(cid: int, departure: str, arrival: str, alternate: str = 'NONE', **fields) -> dict:
+    flight_plan = {'flight_rules': 'I', 'aircraft': 'A320', 'departure': departure, 'arrival': arrival,
+                   'alternate': alternate, 'route': 'DCT', 'remarks': '/V/'}
+    return {'cid': cid, 'name': f'Member {cid}', 'callsign': f'TAP{cid}', 'flight_plan': flight_plan, **fields}
+
+
+def __feed(pilots: list[dict], pilots_last: bool = False, indent: int = 1) -> bytes:
+    feed = {'general': {'version': 3, 'connected_clients': len(pilots)}, 'pilots': pilots,
+            'controllers': [{'cid': 1, 'callsign': 'LPPT_TWR'}], 'atis': [], 'servers': [],
+            'prefiles': [__pilot(99, 'KJFK', 'KLAX')], 'facilities': [], 'ratings': []}
+    if pilots_last:
+        feed['pilots'] = feed.pop('pilots')
+    return json.dumps(feed, indent=indent).encode()
+
+
+PILOTS = [__pilot(1, 'LPPT', 'EGLL', 'EGKK'), __pilot(2, 'LPPR', 'LEMD'), {'cid': 3, 'flight_plan': None},
+          __pilot(4, 'EDDF', 'LPPT', 'LPFR'), {'cid': 5, 'callsign': 'N123'}, __pilot(6, 'LEBL', 'LIRF')]
+
+
+def __scan(feed: bytes, chunk_size: int) -> CoverageStatistics:
+    parser = VatsimFeedParser()
+    for i in range(0, len(feed), chunk_size):
+        parser.feed(feed[i:i + chunk_size])
+    return parser.close()
+
+
+def __airports(statistics: CoverageStatistics) -> tuple[set[str], set[str], set[str]]:
+    return set(statistics.departure_airports), set(statistics.arrival_airports), set(statistics.alternate_airports)
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 7, 63, 64, 65, 200, 1 << 20])
+@pytest.mark.parametrize('pilots_last', [False, True])
+@pytest.mark.parametrize('indent', [None, 1, 4])
+def test_chunk_boundaries(chunk_size, pilots_last, indent):
+    feed = __feed(PILOTS, pilots_last, indent)
+    assert __airports(__scan(feed, chunk_size)) == __airports(parse_vatsim_json(json.loads(feed)))
+
+
+def test_prefiles_are_not_counted():
+    departures, arrivals, _ = __airports(__scan(__feed(PILOTS), 64))
+    assert 'KJFK' not in departures and 'KLAX' not in arrivals
+
+
+def test_escaped_strings():
+    # Keys and sections written inside string values are escaped and must not be taken for the real ones
+    remarks = '"departure": "ZZZZ", "arrival":"YYYY" "prefiles": ["pilots": \\ "'
+    pilots = [__pilot(1, 'LPPT', 'EGLL', name=remarks), __pilot(2, 'LEMD', 'LPPR', callsign='"alternate":"XXXX"')]
+    pilots[0]['flight_plan']['remarks'] = remarks
+    feed = __feed(pilots)
+    assert b'\\"departure\\": \\"ZZZZ\\"' in feed
+    for chunk_size in [1, 5, 64, 1 << 20]:
+        assert __airports(__scan(feed, chunk_size)) == ({'LPPT', 'LEMD'}, {'EGLL', 'LPPR'}, set())
+
+
+@pytest.mark.parametrize('pilots_last', [False, True])
+def test_truncated_feeds(pilots_last):
+    feed = __feed(PILOTS, pilots_last)
+    # The pilots array is complete once the section after it has started, or once the feed has ended when it's last
+    complete = len(feed) if pilots_last else feed.index(b'"controllers":') + len(b'"controllers":')
+    for end in range(complete):
+        with pytest.raises(ijson.JSONError):
+            __scan(feed[:end], 64)
+    for end in range(complete, len(feed) + 1):
+        __scan(feed[:end], 64)
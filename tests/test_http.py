@@ -0,0 +1,49 @@
+import pytest
+
+from helpers.exceptions import RangeNotSatisfiable
+from helpers.http import parse_range
+
+
+@pytest.mark.parametrize('header, expected', [
+    ('bytes=0-0', (0, 0)),
+    ('bytes=0-99', (0, 99)),
+    ('bytes=10-', (10, 99)),
+    ('bytes=90-1000', (90, 99)),
+    ('bytes=-10', (90, 99)),
+    ('bytes=-1000', (0, 99)),
+    ('bytes= 5-6', (5, 6)),
+])
+def test_single_ranges(header, expected):
+    assert parse_range(header, 100) == expected
+
+
+@pytest.mark.parametrize('header', [
+    None,
+    '',
+    'items=0-10',
+    'bytes=10',
+    'bytes=0-10,20-30',
+    'bytes=-5,0-1',
+    'bytes=1,-2',
+    'bytes=20-10',
+    'bytes=a-b',
+    'bytes=-1-2',
+    'bytes=5--1',
+    'bytes=+5-10',
+    'bytes=1_0-20',
+])
+def test_ignored_ranges(header):
+    assert parse_range(header, 100) is None
+
+
+@pytest.mark.parametrize('header, size', [
+    ('bytes=100-', 100),
+    ('bytes=100-200', 100),
+    ('bytes=-0', 100),
+    ('bytes=0-', 0),
+    ('bytes=-5', 0),
+])
+def test_unsatisfiable_ranges(header, size):
+    with pytest.raises(RangeNotSatisfiable) as raised:
+        parse_range(header, size)
+    assert raised.value.headers == {'Content-Range': f'bytes */{size}'}
@@ -0,0 +1,55 @@
+import asyncio
+import gzip
+
+import orjson
+import pytest
+
+from helpers.exceptions import InvalidManifestEncoding, ManifestReadTimedOut
+from helpers.manifest import read_chart_batches
+
+CHART = {'icao_code': 'LPPT', 'title': 'LPPT ADC', 'type': 'ground', 'filename': 'lppt_adc.pdf',
+         'filetype': 'application/pdf', 'source': {'name': 'AIP', 'url': 'https://example.com', 'contributor': 'me'}}
+
+
+async def __chunks(*chunks: bytes):
+    for chunk in chunks:
+        yield chunk
+
+
+def __read(*chunks: bytes, content_encoding=None, read_timeout=None) -> list:
+    async def read():
+        return [batch async for batch in read_chart_batches(__chunks(*chunks), 10, content_encoding, read_timeout)]
+
+    return asyncio.run(read())
+
+
+def test_gzip_manifest():
+    body = gzip.compress(orjson.dumps(CHART) + b'\n' + orjson.dumps(CHART))
+    batches = __read(body[:10], body[10:], content_encoding='gzip')
+    assert [len(batch) for batch in batches] == [2]
+
+
+def test_truncated_gzip_manifest():
+    body = gzip.compress(orjson.dumps(CHART) + b'\n')
+    with pytest.raises(InvalidManifestEncoding):
+        __read(body[:-8], content_encoding='gzip')
+
+
+def test_corrupt_gzip_manifest():
+    body = bytearray(gzip.compress(orjson.dumps(CHART) + b'\n'))
+    body[12:16] = b'\xff\xff\xff\xff'
+    with pytest.raises(InvalidManifestEncoding):
+        __read(bytes(body), content_encoding='gzip')
+
+
+def test_stalled_manifest():
+    async def stalled():
+        yield orjson.dumps(CHART) + b'\n'
+        await asyncio.sleep(1)
+        yield orjson.dumps(CHART)
+
+    async def read():
+        return [batch async for batch in read_chart_batches(stalled(), 10, read_timeout=0.05)]
+
+    with pytest.raises(ManifestReadTimedOut):
+        asyncio.run(read())